@@ -214,7 +214,7 @@ export function useControlMappingsBySCF(filters?: {
         .from('external_controls')
         .select('id, ref_code, title, description, metadata, parent_id, display_order')
         .eq('framework_id', scfFramework.id)
-        .order('ref_code')
+        .order('sort_key') // natural ref order (AC-2 before AC-10), served by the (framework_id, sort_key) index
 
       if (filters?.searchQuery) {
         const search = filters.searchQuery.toLowerCase()
@@ -514,6 +514,7 @@ export function useControlMappingsByFrameworkGrouped(
           .from('external_controls')
           .select('id, ref_code, title, description, metadata, parent_id, display_order, risk_count, threat_count')
           .eq('framework_id', frameworkId)
+          .order('sort_key')
 
         const scfControls = await fetchAllData(scfQuery)
         console.log('[useControlMappingsByFrameworkGrouped] Loaded', scfControls.length, 'SCF controls from external_controls')
@@ -549,6 +550,7 @@ export function useControlMappingsByFrameworkGrouped(
           .select('id, ref_code, title, description, metadata, parent_id, hierarchy_level, display_order, risk_count, threat_count')
           .eq('framework_id', frameworkId)
           .order('display_order', { ascending: true })
+          .order('sort_key') // controls inserted since the last renumber
 
         const externalControls = await fetchAllData(externalControlsQuery)
         console.log('[useControlMappingsByFrameworkGrouped] Loaded', externalControls.length, 'external controls')
@@ -1026,6 +1028,7 @@ export function useUnmappedSecondaryControls(
           .select('id, ref_code, title, description, metadata, parent_id, hierarchy_level, display_order')
           .eq('framework_id', secondaryFwId)
           .order('display_order', { ascending: true })
+          .order('sort_key') // controls inserted since the last renumber
 
         if (!allControls || allControls.length === 0) continue
 
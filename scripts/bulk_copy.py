@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+COPY-based bulk loading for psycopg2.
+
+Importers used to send one INSERT ... ON CONFLICT DO NOTHING per row, which
+on a remote Postgres is tens of thousands of round trips per rebuild. Here
+rows are streamed through COPY ... FROM STDIN (cursor.copy_expert) into a
+temporary staging table, then merged into the target with a single
+INSERT ... SELECT ... ON CONFLICT statement.
+
+Usage:
+
+    from bulk_copy import merge_rows, stage_rows
+
+    # Straight merge: staging table mirrors the target's column types
+    inserted = merge_rows(cur, "external_controls",
+                          ["framework_id", "ref_code", "description"], rows,
+                          on_conflict="(framework_id, ref_code) DO NOTHING")
+
+    # Custom merge: stage rows, then join them in your own INSERT ... SELECT
+    stage_rows(cur, "staging_mappings", {"scf_control_id": "uuid", "ref_code": "text"}, rows)
+    cur.execute("INSERT INTO ... SELECT ... FROM staging_mappings s JOIN ...")
+    drop_staging(cur, "staging_mappings")
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence, Union
+
+# COPY text format escapes (https://www.postgresql.org/docs/current/sql-copy.html)
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+COPY_NULL = "\\N"
+READ_CHUNK_ROWS = 1000
+
+
+def copy_value(value: Any) -> str:
+    """Render one value in COPY text format."""
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, default=lambda o: float(o) if isinstance(o, Decimal) else str(o))
+    elif isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    elif not isinstance(value, str):
+        value = str(value)
+    return value.translate(COPY_ESCAPES)
+
+
+class RowStream:
+    """File-like object over an iterable of row tuples, as copy_expert expects."""
+
+    def __init__(self, rows: Iterable[Sequence[Any]]):
+        self._rows = iter(rows)
+        self._buffer = ""
+        self.count = 0
+
+    def _lines(self, limit: int) -> Iterator[str]:
+        for row in self._rows:
+            self.count += 1
+            yield "\t".join(copy_value(value) for value in row) + "\n"
+            limit -= 1
+            if limit == 0:
+                return
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            chunk = "".join(self._lines(READ_CHUNK_ROWS))
+            if not chunk:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def copy_rows(cur, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+    """COPY rows into table(columns); returns the number of rows sent."""
+    stream = RowStream(rows)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", stream)
+    return stream.count
+
+
+def drop_staging(cur, staging: str) -> None:
+    cur.execute(f"DROP TABLE IF EXISTS {staging}")
+
+
+def stage_rows(cur, staging: str, columns: Union[Dict[str, str], Sequence[str]],
+               rows: Iterable[Sequence[Any]], like: Optional[str] = None) -> int:
+    """Create a temp staging table and COPY rows into it.
+
+    columns is either {name: sql_type}, or a list of names whose types are
+    taken from the `like` table.
+    """
+    drop_staging(cur, staging)
+    names = list(columns)
+    if like:
+        cur.execute(f"CREATE TEMP TABLE {staging} AS SELECT {', '.join(names)} FROM {like} WITH NO DATA")
+    else:
+        column_defs = ", ".join(f"{name} {sql_type}" for name, sql_type in columns.items())
+        cur.execute(f"CREATE TEMP TABLE {staging} ({column_defs})")
+    return copy_rows(cur, staging, names, rows)
+
+
+def merge_rows(cur, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]],
+               on_conflict: str = "DO NOTHING", staging: Optional[str] = None) -> int:
+    """Bulk-load rows into table via a staging table; returns rows inserted/updated.
+
+    on_conflict is the ON CONFLICT clause body, e.g.
+    "(framework_id, ref_code) DO NOTHING".
+    """
+    staging = staging or f"staging_{table}"
+    names = ", ".join(columns)
+    sent = stage_rows(cur, staging, columns, rows, like=table)
+    if not sent:
+        drop_staging(cur, staging)
+        return 0
+    cur.execute(f"INSERT INTO {table} ({names}) SELECT {names} FROM {staging} ON CONFLICT {on_conflict}")
+    merged = cur.rowcount
+    drop_staging(cur, staging)
+    return merged
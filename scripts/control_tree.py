@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Derived hierarchy data on external_controls: ltree paths, the ancestor
+closure table, and pre-order numbering. All of it is computed from parent_id.
+
+path is kept current by row triggers for single-row edits (see migration
+20251203000003_maintain_external_control_paths.sql). Bulk hierarchy jobs
+defer those triggers for their transaction and recompute every affected
+framework's paths with one recursive UPDATE at the end:
+
+    control_tree.defer_paths(cur)
+    ... bulk parent_id changes ...
+    control_tree.refresh_paths(cur, framework_ids)
+    conn.commit()
+
+Subtree reads go through `path <@` (GIST-indexed) instead of recursive
+parent_id walks:
+
+    rows = control_tree.fetch_subtree(cur, control_id)
+    counts = control_tree.descendant_counts(cur, framework_id)
+
+external_control_closure holds every (ancestor, descendant, depth) pair, so
+rollups to any tree level are one indexed join (get_control_rollups RPC). It
+is rebuilt per framework from parent_id in one pass after hierarchy changes:
+
+    control_tree.rebuild_closure(conn, framework_ids)
+    control_tree.update_closure(cur, control_ids)   # just the subtrees under a few changed controls
+
+display_order, lft and rgt come from one iterative depth-first walk per
+framework, children in natural ref_code order. display_order is the
+pre-order position; a control's descendants are the controls with lft in
+(lft, rgt):
+
+    control_tree.renumber(conn, framework_ids)
+
+Natural order is the byte order of sort_key(ref_code), which is also stored
+in external_controls.sort_key (indexed per framework, kept by trigger) so
+listings can ORDER BY sort_key without a reorder pass:
+
+    control_tree.refresh_sort_keys(conn, framework_ids)
+"""
+
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import grc_db
+from bulk_copy import copy_rows
+
+CLOSURE_TABLE = "external_control_closure"
+SORT_RUN_RE = re.compile(r"[0-9]+|[^0-9]+")
+DIGITS = "0123456789"
+
+
+def defer_paths(cur) -> None:
+    """Skip the per-row path triggers until the current transaction ends."""
+    cur.execute("SET LOCAL grc.defer_paths = 'on'")
+
+
+def refresh_paths(cur, framework_ids: Optional[Iterable[Any]] = None) -> int:
+    """Recompute path for the given frameworks (None = all); returns rows changed."""
+    ids = None if framework_ids is None else [str(framework_id) for framework_id in framework_ids]
+    cur.execute("SELECT refresh_external_control_paths(%s::uuid[])", (ids,))
+    return cur.fetchone()[0]
+
+
+def fetch_subtree(cur, control_id: Any) -> List[tuple]:
+    """The control and all of its descendants, parents first (get_control_subtree RPC)."""
+    cur.execute("SELECT * FROM get_control_subtree(%s)", (control_id,))
+    return cur.fetchall()
+
+
+def descendant_counts(cur, framework_id: Any) -> Dict[str, int]:
+    """control id -> number of descendants at any depth (get_control_descendant_counts RPC)."""
+    cur.execute("SELECT control_id, descendant_count FROM get_control_descendant_counts(%s)", (framework_id,))
+    return {str(control_id): count for control_id, count in cur.fetchall()}
+
+
+def closure_rows(parents: Dict[Any, Optional[Any]]) -> Iterator[Tuple[Any, Any, int]]:
+    """(ancestor, descendant, depth) for every node, self pair included.
+
+    Each node's ancestor chain is its parent followed by the parent's chain,
+    so chains are built once and shared. Nodes on a parent_id cycle, or
+    below one, get only their self pair.
+    """
+    chains: Dict[Any, Optional[List[Any]]] = {}
+    for node in parents:
+        # Climb until a node whose chain is known (or a root), then unwind
+        pending, seen = [], set()
+        current = node
+        while current not in chains:
+            if current in seen:
+                for member in pending:
+                    chains[member] = None
+                break
+            seen.add(current)
+            pending.append(current)
+            parent = parents.get(current)
+            if parent is None or parent not in parents:
+                chains[current] = []
+                pending.pop()
+                break
+            current = parent
+        for member in reversed(pending):
+            parent_chain = chains[parents[member]]
+            chains[member] = None if parent_chain is None else [parents[member]] + parent_chain
+
+    for node, chain in chains.items():
+        yield node, node, 0
+        for depth, ancestor in enumerate(chain or (), 1):
+            yield ancestor, node, depth
+
+
+def rebuild_closure(conn, framework_ids: Optional[Iterable[Any]] = None) -> int:
+    """Replace the closure rows of the given frameworks (None = all); returns rows written.
+
+    Does not commit, so the caller's hierarchy changes and the closure land together.
+    """
+    ids = None if framework_ids is None else [str(framework_id) for framework_id in framework_ids]
+    parents: Dict[str, Dict[Any, Optional[Any]]] = {}
+    with grc_db.named_cursor(conn) as named:
+        named.execute("SELECT framework_id, id, parent_id FROM external_controls "
+                      "WHERE %(ids)s::uuid[] IS NULL OR framework_id = ANY(%(ids)s::uuid[])", {"ids": ids})
+        for framework_id, control_id, parent_id in named:
+            parents.setdefault(framework_id, {})[control_id] = parent_id
+
+    cur = conn.cursor()
+    if ids is None:
+        cur.execute(f"TRUNCATE {CLOSURE_TABLE}")
+    else:
+        cur.execute(f"DELETE FROM {CLOSURE_TABLE} WHERE framework_id = ANY(%s::uuid[])", (ids,))
+    rows = ((ancestor, descendant, depth, framework_id)
+            for framework_id, framework_parents in parents.items()
+            for ancestor, descendant, depth in closure_rows(framework_parents))
+    return copy_rows(cur, CLOSURE_TABLE, ["ancestor_id", "descendant_id", "depth", "framework_id"], rows)
+
+
+def update_closure(cur, control_ids: Iterable[Any]) -> int:
+    """Rewrite the closure rows of the given controls and everything below them.
+
+    For incremental maintenance after a few inserts or re-parents: the rows
+    are derived from the (trigger-maintained) paths, so the cost follows the
+    size of the touched subtrees, not the framework. Returns rows written.
+    """
+    ids = [str(control_id) for control_id in control_ids]
+    if not ids:
+        return 0
+    cur.execute("""
+        SELECT x.id FROM external_controls x WHERE x.id = ANY(%(ids)s::uuid[])
+        UNION
+        SELECT d.id
+        FROM external_controls x
+        JOIN external_controls d ON d.path <@ x.path
+        WHERE x.id = ANY(%(ids)s::uuid[])
+    """, {"ids": ids})
+    subtree = [row[0] for row in cur.fetchall()]
+    cur.execute(f"DELETE FROM {CLOSURE_TABLE} WHERE descendant_id = ANY(%s::uuid[])", (subtree,))
+    cur.execute(f"""
+        INSERT INTO {CLOSURE_TABLE} (ancestor_id, descendant_id, depth, framework_id)
+        SELECT ltree2text(subpath(p.path, i, 1))::uuid, p.id, nlevel(p.path) - 1 - i, p.framework_id
+        FROM (
+            SELECT id, framework_id, COALESCE(path, external_control_label(id)) AS path
+            FROM external_controls
+            WHERE id = ANY(%s::uuid[])
+        ) p, generate_series(0, nlevel(p.path) - 1) AS i
+        ON CONFLICT (ancestor_id, descendant_id) DO NOTHING
+    """, (subtree,))
+    return cur.rowcount
+
+
+def sort_key(ref_code: str) -> bytes:
+    """Byte-comparable natural sort key: AC-2 < AC-10, 1.2 < 1.10.
+
+    Same encoding as the external_control_sort_key() SQL function: each
+    digit run is 0x01, its length without leading zeros, then the digits;
+    each other run is 0x02 then its UTF-8 text (lower-cased).
+    """
+    key = bytearray()
+    for run in SORT_RUN_RE.findall(ref_code.lower()):
+        if run[0] in DIGITS:
+            digits = run.lstrip("0")
+            key += b"\x01" + bytes([min(len(digits), 255)]) + digits.encode()
+        else:
+            key += b"\x02" + run.encode("utf-8")
+    return bytes(key)
+
+
+def refresh_sort_keys(conn, framework_ids: Optional[Iterable[Any]] = None) -> int:
+    """Recompute external_controls.sort_key for the given frameworks (None = all); returns rows changed.
+
+    New rows are keyed by trigger; this covers rows that bypassed it. Does not commit.
+    """
+    ids = None if framework_ids is None else [str(framework_id) for framework_id in framework_ids]
+    with grc_db.named_cursor(conn) as named:
+        named.execute("SELECT id, ref_code FROM external_controls "
+                      "WHERE %(ids)s::uuid[] IS NULL OR framework_id = ANY(%(ids)s::uuid[])", {"ids": ids})
+        updates = [(control_id, sort_key(ref_code)) for control_id, ref_code in named]
+    return grc_db.bulk_update(conn.cursor(), "external_controls", {"sort_key": "bytea"}, updates)
+
+
+def number_tree(parents: Dict[Any, Optional[Any]], sort_keys: Dict[Any, Any]) -> Dict[Any, Tuple[int, int, int]]:
+    """node -> (display_order, lft, rgt) from an iterative depth-first walk.
+
+    Siblings are visited in sort_keys order. Nodes whose parent is missing
+    are roots; nodes on a parent_id cycle are walked as extra roots after
+    the real ones, so every node gets numbers.
+    """
+    children: Dict[Any, List[Any]] = {}
+    roots = []
+    for node, parent in parents.items():
+        if parent is None or parent not in parents:
+            roots.append(node)
+        else:
+            children.setdefault(parent, []).append(node)
+    for siblings in children.values():
+        siblings.sort(key=sort_keys.__getitem__)
+    roots.sort(key=sort_keys.__getitem__)
+
+    numbers: Dict[Any, Tuple[int, int, int]] = {}
+    lft: Dict[Any, Tuple[int, int]] = {}
+    counter = 0
+
+    def walk(root) -> None:
+        nonlocal counter
+        lft[root] = (len(lft), counter)
+        counter += 1
+        stack = [(root, iter(children.get(root, ())))]
+        while stack:
+            node, pending = stack[-1]
+            child = next(pending, None)
+            if child is None:
+                stack.pop()
+                numbers[node] = (*lft[node], counter)
+                counter += 1
+            elif child not in lft:
+                lft[child] = (len(lft), counter)
+                counter += 1
+                stack.append((child, iter(children.get(child, ()))))
+
+    for root in roots:
+        walk(root)
+    if len(numbers) < len(parents):
+        for node in sorted((node for node in parents if node not in lft), key=sort_keys.__getitem__):
+            if node not in lft:
+                walk(node)
+    return numbers
+
+
+def renumber(conn, framework_ids: Iterable[Any]) -> int:
+    """Reassign display_order, lft and rgt for the given frameworks; returns rows changed.
+
+    Does not commit.
+    """
+    ids = [str(framework_id) for framework_id in framework_ids]
+    trees: Dict[Any, Tuple[Dict[Any, Optional[Any]], Dict[Any, tuple]]] = {}
+    with grc_db.named_cursor(conn) as named:
+        named.execute("SELECT framework_id, id, parent_id, ref_code FROM external_controls "
+                      "WHERE framework_id = ANY(%s::uuid[])", (ids,))
+        for framework_id, control_id, parent_id, ref_code in named:
+            parents, sort_keys = trees.setdefault(framework_id, ({}, {}))
+            parents[control_id] = parent_id
+            sort_keys[control_id] = sort_key(ref_code)
+
+    updates = [(control_id, *numbers)
+               for parents, sort_keys in trees.values()
+               for control_id, numbers in number_tree(parents, sort_keys).items()]
+    return grc_db.bulk_update(conn.cursor(), "external_controls",
+                              {"display_order": "integer", "lft": "integer", "rgt": "integer"}, updates)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Sparse SCF x external-control incidence matrix over framework_crosswalks.
+
+Coverage questions ("how much of PCI DSS v4.0.1 does our ISO 27001:2022
+program cover via SCF?") used to mean ad-hoc joins of framework_crosswalks
+against itself. Here the SCF-origin crosswalks are read once into a
+scipy.sparse CSR matrix:
+
+    rows     SCF controls (source_control_id)
+    columns  external controls (target_control_id), contiguous per framework
+    value    1 where a crosswalk links them
+
+and every framework-level question is a sparse product:
+
+    B = sign(M @ G)          SCF x framework (G: column -> framework indicator)
+    shared = B.T @ B         SCF controls two frameworks both map to
+    reach = sign(B.T @ M)    framework x control: controls reachable from a framework via SCF
+
+The matrix is cached on disk (CROSSWALK_CACHE_DIR) under a fingerprint of
+the crosswalk edge set, so later runs only pay one aggregate query.
+
+Usage:
+    from crosswalk_matrix import load_incidence
+    incidence = load_incidence(conn)
+    overlap = incidence.overlap()                      # all frameworks, both directions
+    covered, total = incidence.control_coverage(iso_id, pci_id)
+
+    python scripts/crosswalk_matrix.py                          # summary + timings
+    python scripts/crosswalk_matrix.py ISO-27001:2022 PCI-DSS:v4.0.1
+    python scripts/crosswalk_matrix.py --refresh                # ignore the cache
+"""
+
+import hashlib
+import os
+import sys
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+import grc_db
+
+CACHE_DIR = os.getenv(
+    "CROSSWALK_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "reference_material", ".crosswalk_cache"),
+)
+FORMAT_VERSION = 1
+
+SCF_CROSSWALKS_WHERE = """
+    fc.mapping_origin = 'SCF'
+    AND fc.source_framework_id = (SELECT id FROM frameworks WHERE code = 'SCF' LIMIT 1)
+    AND fc.source_control_id IS NOT NULL
+    AND fc.target_control_id IS NOT NULL
+"""
+
+# Order-independent checksum of the edge set: any insert, delete, re-point or
+# strength/confidence change alters it. Optionally limited to target frameworks.
+FINGERPRINT_SQL = f"""
+    SELECT COUNT(*),
+           COALESCE(SUM(hashtext(concat_ws('|', fc.source_control_id, fc.target_control_id,
+                                           fc.mapping_strength, fc.confidence))::bigint), 0),
+           COALESCE(MAX(fc.created_at)::text, '')
+    FROM framework_crosswalks fc
+    WHERE {SCF_CROSSWALKS_WHERE}
+      AND (%(framework_ids)s::uuid[] IS NULL OR fc.target_framework_id = ANY(%(framework_ids)s::uuid[]))
+"""
+
+# Same checksum, one row per target framework
+FRAMEWORK_FINGERPRINTS_SQL = f"""
+    SELECT fc.target_framework_id, COUNT(*),
+           COALESCE(SUM(hashtext(concat_ws('|', fc.source_control_id, fc.target_control_id,
+                                           fc.mapping_strength, fc.confidence))::bigint), 0),
+           COALESCE(MAX(fc.created_at)::text, '')
+    FROM framework_crosswalks fc
+    WHERE {SCF_CROSSWALKS_WHERE}
+    GROUP BY fc.target_framework_id
+"""
+
+EDGES_SQL = f"""
+    SELECT fc.source_control_id, fc.target_framework_id, fc.target_control_id
+    FROM framework_crosswalks fc
+    WHERE {SCF_CROSSWALKS_WHERE}
+"""
+
+
+class Overlap(NamedTuple):
+    """Framework x framework arrays, indexed like IncidenceMatrix.framework_ids."""
+    shared: np.ndarray      # SCF controls both frameworks map to
+    jaccard: np.ndarray     # shared / union of the two SCF footprints
+    coverage: np.ndarray    # [i, j]: share of i's SCF footprint that j also maps to
+    controls: np.ndarray    # [i, j]: j's mapped controls reachable from i via SCF
+    mapped: np.ndarray      # per framework: controls with at least one SCF crosswalk
+
+
+class IncidenceMatrix:
+    """SCF x external-control crosswalk incidence, columns grouped by framework."""
+
+    def __init__(self, matrix: sparse.csr_matrix, scf_ids: np.ndarray, control_ids: np.ndarray,
+                 framework_ids: np.ndarray, framework_offsets: np.ndarray, fingerprint: str = ""):
+        self.matrix = matrix
+        self.scf_ids = scf_ids
+        self.control_ids = control_ids
+        self.framework_ids = framework_ids
+        self.framework_offsets = framework_offsets   # columns of framework k: offsets[k]:offsets[k + 1]
+        self.fingerprint = fingerprint
+        self._framework_index = {framework_id: k for k, framework_id in enumerate(framework_ids.tolist())}
+        self._by_framework: Optional[sparse.csc_matrix] = None
+
+    @classmethod
+    def from_edges(cls, edges, fingerprint: str = "") -> "IncidenceMatrix":
+        """Build from (scf control id, target framework id, target control id) rows."""
+        scf_index: Dict[str, int] = {}
+        columns: Dict[str, Dict[str, None]] = {}
+        pairs: List[Tuple[int, str, str]] = []
+        for scf_id, framework_id, control_id in edges:
+            scf_id, framework_id, control_id = str(scf_id), str(framework_id), str(control_id)
+            row = scf_index.setdefault(scf_id, len(scf_index))
+            columns.setdefault(framework_id, {})[control_id] = None
+            pairs.append((row, framework_id, control_id))
+
+        framework_ids = sorted(columns)
+        column_index: Dict[Tuple[str, str], int] = {}
+        offsets = [0]
+        for framework_id in framework_ids:
+            for control_id in sorted(columns[framework_id]):
+                column_index[(framework_id, control_id)] = len(column_index)
+            offsets.append(len(column_index))
+
+        rows = np.fromiter((row for row, _, _ in pairs), dtype=np.int32, count=len(pairs))
+        cols = np.fromiter((column_index[(f, c)] for _, f, c in pairs), dtype=np.int32, count=len(pairs))
+        matrix = sparse.csr_matrix((np.ones(len(pairs), dtype=np.int32), (rows, cols)),
+                                   shape=(len(scf_index), len(column_index)))
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+
+        return cls(matrix, np.array(list(scf_index), dtype="U36"),
+                   np.array([control_id for _, control_id in column_index], dtype="U36"),
+                   np.array(framework_ids, dtype="U36"), np.array(offsets, dtype=np.int64), fingerprint)
+
+    # ---- cache -----------------------------------------------------------
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, version=FORMAT_VERSION, indptr=self.matrix.indptr, indices=self.matrix.indices,
+                 shape=np.array(self.matrix.shape), scf_ids=self.scf_ids, control_ids=self.control_ids,
+                 framework_ids=self.framework_ids, framework_offsets=self.framework_offsets)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, fingerprint: str = "") -> Optional["IncidenceMatrix"]:
+        """The cached matrix at path, or None if missing or from another format version."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data["version"]) != FORMAT_VERSION:
+                    return None
+                indices, indptr = data["indices"], data["indptr"]
+                matrix = sparse.csr_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr),
+                                           shape=tuple(data["shape"]))
+                return cls(matrix, data["scf_ids"], data["control_ids"], data["framework_ids"],
+                           data["framework_offsets"], fingerprint)
+        except (OSError, KeyError, ValueError):
+            return None
+
+    # ---- queries ---------------------------------------------------------
+
+    def framework_index(self, framework_id: Any) -> int:
+        return self._framework_index[str(framework_id)]
+
+    def column_framework(self) -> sparse.csr_matrix:
+        """G: control column -> framework indicator (columns x frameworks)."""
+        counts = np.diff(self.framework_offsets)
+        cols = np.repeat(np.arange(len(self.framework_ids), dtype=np.int32), counts)
+        return sparse.csr_matrix((np.ones(len(cols), dtype=np.int32), (np.arange(len(cols)), cols)),
+                                 shape=(self.matrix.shape[1], len(self.framework_ids)))
+
+    def by_framework(self) -> sparse.csc_matrix:
+        """B: SCF x framework, 1 where the SCF control maps to any control of the framework."""
+        if self._by_framework is None:
+            product = (self.matrix @ self.column_framework()).tocsc()
+            product.data[:] = 1
+            self._by_framework = product
+        return self._by_framework
+
+    def overlap(self) -> Overlap:
+        """All-pairs framework overlap from sparse products."""
+        footprint = self.by_framework()
+        shared = (footprint.T @ footprint).toarray()
+        sizes = np.diag(shared).astype(np.float64)
+        union = sizes[:, None] + sizes[None, :] - shared
+        with np.errstate(divide="ignore", invalid="ignore"):
+            jaccard = np.where(union > 0, shared / union, 0.0)
+            coverage = np.where(sizes[:, None] > 0, shared / sizes[:, None], 0.0)
+
+        # Framework x control reachability, then per-framework column counts
+        reach = (footprint.T.tocsr() @ self.matrix).tocsr()
+        reach.data[:] = 1
+        grouping = self.column_framework()
+        controls = (reach @ grouping).toarray()
+        mapped = np.diff(self.framework_offsets)
+        return Overlap(shared, jaccard, coverage, controls, mapped)
+
+    def control_coverage(self, source_framework_id: Any, target_framework_id: Any) -> Tuple[int, int]:
+        """(target controls reachable from source via SCF, target controls with any SCF crosswalk)."""
+        source = self.framework_index(source_framework_id)
+        target = self.framework_index(target_framework_id)
+        scf_rows = self.by_framework()[:, source].nonzero()[0]
+        start, end = self.framework_offsets[target], self.framework_offsets[target + 1]
+        block = self.matrix[scf_rows][:, start:end]
+        return int(np.count_nonzero(block.getnnz(axis=0))), int(end - start)
+
+
+def fingerprint(cur, framework_ids: Optional[List[Any]] = None) -> str:
+    """Digest of the SCF crosswalks (into framework_ids only, if given)."""
+    ids = None if framework_ids is None else [str(framework_id) for framework_id in framework_ids]
+    cur.execute(FINGERPRINT_SQL, {"framework_ids": ids})
+    count, checksum, newest = cur.fetchone()
+    return hashlib.sha256(f"{FORMAT_VERSION}:{count}:{checksum}:{newest}".encode()).hexdigest()
+
+
+def framework_fingerprints(cur) -> Dict[str, str]:
+    """Per target framework digest of its SCF crosswalks; equal to fingerprint(cur, [framework_id])."""
+    cur.execute(FRAMEWORK_FINGERPRINTS_SQL)
+    return {str(framework_id): hashlib.sha256(f"{FORMAT_VERSION}:{count}:{checksum}:{newest}".encode()).hexdigest()
+            for framework_id, count, checksum, newest in cur.fetchall()}
+
+
+def load_incidence(conn, refresh: bool = False, cache_dir: str = CACHE_DIR) -> IncidenceMatrix:
+    """The incidence matrix for the current crosswalks, from cache when unchanged."""
+    with conn.cursor() as cur:
+        key = fingerprint(cur)
+    path = os.path.join(cache_dir, f"{key}.npz")
+    if not refresh:
+        cached = IncidenceMatrix.load(path, key)
+        if cached is not None:
+            return cached
+
+    with grc_db.named_cursor(conn, itersize=50000) as named:
+        named.execute(EDGES_SQL)
+        incidence = IncidenceMatrix.from_edges(named, key)
+    incidence.save(path)
+    return incidence
+
+
+def load_frameworks(conn) -> Dict[str, Tuple[str, str]]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, code, version FROM frameworks")
+        return {str(framework_id): (code, version) for framework_id, code, version in cur.fetchall()}
+
+
+def find_framework(frameworks: Dict[str, Tuple[str, str]], spec: str) -> str:
+    """Framework id for CODE or CODE:VERSION."""
+    code, _, version = spec.partition(":")
+    matches = [framework_id for framework_id, (fw_code, fw_version) in frameworks.items()
+               if fw_code == code and (not version or fw_version == version)]
+    if len(matches) != 1:
+        raise SystemExit(f"{spec}: {len(matches)} matching frameworks (use CODE:VERSION)")
+    return matches[0]
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    refresh = "--refresh" in sys.argv[1:]
+
+    with grc_db.connection() as conn:
+        start = time.perf_counter()
+        incidence = load_incidence(conn, refresh=refresh)
+        loaded = time.perf_counter() - start
+        frameworks = load_frameworks(conn)
+        conn.rollback()
+
+    print(f"Incidence matrix: {incidence.matrix.shape[0]} SCF controls x {incidence.matrix.shape[1]} "
+          f"controls in {len(incidence.framework_ids)} frameworks, {incidence.matrix.nnz} crosswalks "
+          f"({loaded:.2f}s)")
+
+    start = time.perf_counter()
+    overlap = incidence.overlap()
+    print(f"All-pairs overlap: {len(incidence.framework_ids)}x{len(incidence.framework_ids)} "
+          f"in {time.perf_counter() - start:.3f}s")
+
+    def label(k: int) -> str:
+        code, version = frameworks.get(incidence.framework_ids[k], ("?", "?"))
+        return f"{code} {version}"
+
+    if len(args) == 2:
+        source = incidence.framework_index(find_framework(frameworks, args[0]))
+        target = incidence.framework_index(find_framework(frameworks, args[1]))
+        covered, total = int(overlap.controls[source, target]), int(overlap.mapped[target])
+        print(f"\n{label(source)} -> {label(target)}")
+        print(f"  Shared SCF controls: {int(overlap.shared[source, target])}")
+        print(f"  Jaccard: {overlap.jaccard[source, target]:.3f}")
+        print(f"  SCF footprint of {label(source)} covered by {label(target)}: {overlap.coverage[source, target]:.1%}")
+        print(f"  {label(target)} controls reachable: {covered}/{total} ({covered / total if total else 0:.1%})")
+        return
+
+    pairs = [(overlap.jaccard[i, j], i, j)
+             for i in range(len(incidence.framework_ids)) for j in range(i + 1, len(incidence.framework_ids))]
+    print("\nMost similar framework pairs (Jaccard over SCF controls):")
+    for score, i, j in sorted(pairs, reverse=True)[:10]:
+        print(f"  {label(i)} <-> {label(j)}: {score:.3f} ({int(overlap.shared[i, j])} shared)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Transitive crosswalk resolver through the SCF pivot.
+
+framework_crosswalks only stores SCF -> framework edges. A mapping between
+two other frameworks (ISO 27001 -> NIST 800-53, HIPAA -> CSF) is every
+pair of their controls that share an SCF control:
+
+    ISO A.5.1  <-(SCF)-  GOV-02  -(SCF)->  NIST PM-1
+
+The edges of both frameworks are read into CSR adjacency arrays (rows SCF
+controls, columns the framework's controls, data = edge index) and all
+two-hop paths are expanded per SCF row with numpy, no per-control queries.
+Each path's strength is its weaker hop (exact > partial > related) and its
+confidence the product of the hop confidences. Paths for the same control
+pair are merged by keeping the best ones, and via_scf_count counts the
+pivots.
+
+Results are materialized into derived_crosswalks (mapping_origin =
+'derived') on demand. derived_crosswalk_pairs remembers the fingerprint of
+the crosswalks each pair was built from, and an unchanged pair is not
+recomputed:
+
+    from crosswalk_resolver import derived_crosswalks, materialize_pair
+    rows = derived_crosswalks(conn, iso_id, nist_id)     # materializes if stale, then reads
+    count = materialize_pair(conn, iso_id, nist_id)      # materialize only (caller commits)
+
+    python scripts/crosswalk_resolver.py ISO-27001:2022 NIST-800-53:rev5
+    python scripts/crosswalk_resolver.py ISO-27001:2022 NIST-800-53:rev5 --refresh
+"""
+
+import sys
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+from scipy import sparse
+
+import grc_db
+from bulk_copy import copy_rows
+from crosswalk_matrix import SCF_CROSSWALKS_WHERE, find_framework, fingerprint, load_frameworks
+
+# Lower rank = stronger; scf_control_mappings used "full" for exact
+STRENGTH_RANK = {"exact": 0, "full": 0, "partial": 1, "related": 2}
+STRENGTHS = ["exact", "partial", "related"]
+DEFAULT_STRENGTH = "exact"
+DEFAULT_CONFIDENCE = 95
+
+EDGES_SQL = f"""
+    SELECT fc.source_control_id, fc.target_framework_id, fc.target_control_id, fc.target_ref,
+           fc.mapping_strength, fc.confidence
+    FROM framework_crosswalks fc
+    WHERE {SCF_CROSSWALKS_WHERE}
+      AND fc.target_framework_id = ANY(%s::uuid[])
+"""
+
+
+class DerivedCrosswalks(NamedTuple):
+    """Composed control pairs for one ordered framework pair (parallel arrays)."""
+    source_control_ids: np.ndarray
+    source_refs: np.ndarray
+    target_control_ids: np.ndarray
+    target_refs: np.ndarray
+    strength_ranks: np.ndarray
+    confidences: np.ndarray
+    via_scf_counts: np.ndarray
+
+    def rows(self):
+        for i in range(len(self.source_control_ids)):
+            yield (self.source_control_ids[i], self.source_refs[i], self.target_control_ids[i],
+                   self.target_refs[i], STRENGTHS[self.strength_ranks[i]], int(self.confidences[i]),
+                   int(self.via_scf_counts[i]))
+
+
+class FrameworkEdges(NamedTuple):
+    """One framework's SCF crosswalks as CSR adjacency: SCF row -> (control column, strength, confidence)."""
+    adjacency: sparse.csr_matrix   # data = edge index + 1
+    control_ids: np.ndarray
+    refs: np.ndarray
+    strength_ranks: np.ndarray     # per edge
+    confidences: np.ndarray        # per edge, 0-100
+
+
+class CrosswalkGraph:
+    """SCF-pivot graph over the crosswalks of a set of frameworks."""
+
+    def __init__(self, edges):
+        """edges: (scf control id, framework id, control id, ref, strength, confidence) rows."""
+        self.scf_index: Dict[str, int] = {}
+        grouped: Dict[str, List[Tuple[int, str, str, int, int]]] = {}
+        for scf_id, framework_id, control_id, ref, strength, confidence in edges:
+            row = self.scf_index.setdefault(str(scf_id), len(self.scf_index))
+            rank = STRENGTH_RANK.get((strength or DEFAULT_STRENGTH).lower(), STRENGTH_RANK["related"])
+            grouped.setdefault(str(framework_id), []).append(
+                (row, str(control_id), ref, rank, DEFAULT_CONFIDENCE if confidence is None else confidence))
+        self.frameworks = {framework_id: self._framework_edges(rows) for framework_id, rows in grouped.items()}
+
+    def _framework_edges(self, rows) -> FrameworkEdges:
+        # One edge per (SCF, control), keeping the strongest
+        best: Dict[Tuple[int, str], Tuple[int, int, str]] = {}
+        for row, control_id, ref, rank, confidence in rows:
+            key = (row, control_id)
+            if key not in best or (rank, -confidence) < (best[key][0], -best[key][1]):
+                best[key] = (rank, confidence, ref)
+        columns: Dict[str, int] = {}
+        refs: List[str] = []
+        for (_, control_id), (_, _, ref) in best.items():
+            if control_id not in columns:
+                columns[control_id] = len(columns)
+                refs.append(ref)
+
+        keys = list(best)
+        scf_rows = np.fromiter((row for row, _ in keys), dtype=np.int32, count=len(keys))
+        cols = np.fromiter((columns[control_id] for _, control_id in keys), dtype=np.int32, count=len(keys))
+        adjacency = sparse.csr_matrix((np.arange(1, len(keys) + 1, dtype=np.int64), (scf_rows, cols)),
+                                      shape=(len(self.scf_index), len(columns)))
+        adjacency.sort_indices()
+        return FrameworkEdges(
+            adjacency,
+            np.array(list(columns), dtype=object),
+            np.array(refs, dtype=object),
+            np.fromiter((best[key][0] for key in keys), dtype=np.int8, count=len(keys)),
+            np.fromiter((best[key][1] for key in keys), dtype=np.int16, count=len(keys)),
+        )
+
+    @classmethod
+    def load(cls, conn, framework_ids: List[Any]) -> "CrosswalkGraph":
+        with grc_db.named_cursor(conn, itersize=50000) as named:
+            named.execute(EDGES_SQL, ([str(framework_id) for framework_id in framework_ids],))
+            return cls(named)
+
+    def compose(self, source_framework_id: Any, target_framework_id: Any) -> DerivedCrosswalks:
+        """Every source -> target control pair sharing an SCF control, best path per pair."""
+        source = self.frameworks.get(str(source_framework_id))
+        target = self.frameworks.get(str(target_framework_id))
+        empty = np.array([], dtype=object)
+        nothing = DerivedCrosswalks(empty, empty, empty, empty, np.array([], dtype=np.int8),
+                                    np.array([], dtype=np.int16), np.array([], dtype=np.int64))
+        if source is None or target is None:
+            return nothing
+
+        s_ptr, t_ptr = source.adjacency.indptr, target.adjacency.indptr
+        s_counts, t_counts = np.diff(s_ptr), np.diff(t_ptr)
+
+        # Expand paths per SCF row: each source entry pairs with every target entry of its row
+        s_entry_row = np.repeat(np.arange(len(s_counts)), s_counts)
+        fan_out = t_counts[s_entry_row]
+        s_entry = np.repeat(np.arange(len(s_entry_row)), fan_out)
+        group_start = np.repeat(np.cumsum(fan_out) - fan_out, fan_out)
+        t_entry = t_ptr[s_entry_row[s_entry]] + (np.arange(len(s_entry)) - group_start)
+
+        s_edge = source.adjacency.data[s_entry] - 1
+        t_edge = target.adjacency.data[t_entry] - 1
+        s_col = source.adjacency.indices[s_entry].astype(np.int64)
+        t_col = target.adjacency.indices[t_entry].astype(np.int64)
+        ranks = np.maximum(source.strength_ranks[s_edge], target.strength_ranks[t_edge])
+        confidences = (source.confidences[s_edge].astype(np.int32) * target.confidences[t_edge]) // 100
+
+        # Best path per (source, target) pair: strongest rank, then highest confidence
+        pair = s_col * max(len(target.control_ids), 1) + t_col
+        if not len(pair):
+            return nothing   # no shared SCF control
+        order = np.lexsort((-confidences, ranks, pair))
+        pair, ranks, confidences = pair[order], ranks[order], confidences[order]
+        first = np.flatnonzero(np.r_[True, pair[1:] != pair[:-1]])
+        via = np.diff(np.r_[first, len(pair)])
+
+        s_cols, t_cols = s_col[order][first], t_col[order][first]
+        return DerivedCrosswalks(source.control_ids[s_cols], source.refs[s_cols],
+                                 target.control_ids[t_cols], target.refs[t_cols],
+                                 ranks[first], confidences[first], via)
+
+
+def materialize_pair(conn, source_framework_id: Any, target_framework_id: Any, refresh: bool = False) -> int:
+    """Make derived_crosswalks current for one ordered framework pair; returns its row count.
+
+    Skipped when the pair was built from the same crosswalks. Does not commit.
+    """
+    source, target = str(source_framework_id), str(target_framework_id)
+    cur = conn.cursor()
+    key = fingerprint(cur, [source, target])
+    cur.execute("""
+        SELECT fingerprint, crosswalk_count FROM derived_crosswalk_pairs
+        WHERE source_framework_id = %s AND target_framework_id = %s
+    """, (source, target))
+    stored = cur.fetchone()
+    if stored and stored[0] == key and not refresh:
+        return stored[1]
+
+    derived = CrosswalkGraph.load(conn, [source, target]).compose(source, target)
+    cur.execute("DELETE FROM derived_crosswalks WHERE source_framework_id = %s AND target_framework_id = %s",
+                (source, target))
+    count = copy_rows(cur, "derived_crosswalks", [
+        "source_framework_id", "source_control_id", "source_ref", "target_framework_id", "target_control_id",
+        "target_ref", "mapping_strength", "confidence", "via_scf_count",
+    ], ((source, s_id, s_ref, target, t_id, t_ref, strength, confidence, via)
+        for s_id, s_ref, t_id, t_ref, strength, confidence, via in derived.rows()))
+    cur.execute("""
+        INSERT INTO derived_crosswalk_pairs (source_framework_id, target_framework_id, fingerprint, crosswalk_count)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (source_framework_id, target_framework_id) DO UPDATE
+        SET fingerprint = EXCLUDED.fingerprint,
+            crosswalk_count = EXCLUDED.crosswalk_count,
+            computed_at = NOW()
+    """, (source, target, key, count))
+    return count
+
+
+def derived_crosswalks(conn, source_framework_id: Any, target_framework_id: Any,
+                       refresh: bool = False) -> List[tuple]:
+    """Derived mappings for a pair, materializing them first if stale. Commits."""
+    materialize_pair(conn, source_framework_id, target_framework_id, refresh=refresh)
+    conn.commit()
+    with conn.cursor() as cur:
+        cur.execute("SELECT * FROM get_derived_crosswalks(%s, %s)", (str(source_framework_id), str(target_framework_id)))
+        return cur.fetchall()
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(args) != 2:
+        raise SystemExit("Usage: crosswalk_resolver.py SOURCE[:VERSION] TARGET[:VERSION] [--refresh]")
+    refresh = "--refresh" in sys.argv[1:]
+
+    with grc_db.connection() as conn:
+        frameworks = load_frameworks(conn)
+        source, target = find_framework(frameworks, args[0]), find_framework(frameworks, args[1])
+        rows = derived_crosswalks(conn, source, target, refresh=refresh)
+
+    print(f"{args[0]} -> {args[1]}: {len(rows)} derived crosswalks")
+    for _, source_ref, _, target_ref, strength, confidence, via in rows[:20]:
+        print(f"  {source_ref} -> {target_ref}  {strength}, confidence {confidence}, via {via} SCF control(s)")
+    if len(rows) > 20:
+        print(f"  ... {len(rows) - 20} more")
+
+
+if __name__ == "__main__":
+    main()
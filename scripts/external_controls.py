@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Set-based get-or-create for external_controls.
+
+Importers used to resolve refs one at a time (SELECT, then INSERT ...
+RETURNING on a miss), costing one or two round trips per ref_code.
+resolve_external_controls takes the whole batch, inserts every missing row
+with a single INSERT ... SELECT FROM unnest(...) ON CONFLICT DO NOTHING
+RETURNING, reads back the rows that already existed in the same statement,
+and returns a complete (framework_id, ref_code) -> id dict.
+
+Usage:
+    from external_controls import resolve_external_controls
+    ids = resolve_external_controls(cur, [
+        (framework_id, "A.5.1", "Control: A.5.1", {"hierarchy_level": "control"}),
+        (framework_id, "A.5.2", "Control: A.5.2", None),
+    ])
+    ids[(framework_id, "A.5.1")]
+"""
+
+import json
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+BATCH_SIZE = 5000
+
+# Rows that already existed come from the outer SELECT (the statement's
+# snapshot predates the insert); new rows come from RETURNING.
+RESOLVE_SQL = """
+    WITH input AS (
+        SELECT *
+        FROM unnest(%s::uuid[], %s::text[], %s::text[], %s::jsonb[])
+            AS t(framework_id, ref_code, description, metadata)
+    ),
+    inserted AS (
+        INSERT INTO {table} (framework_id, ref_code, description, metadata)
+        SELECT DISTINCT ON (framework_id, ref_code)
+               framework_id, ref_code, description, COALESCE(metadata, '{{}}'::jsonb)
+        FROM input
+        ON CONFLICT (framework_id, ref_code) DO NOTHING
+        RETURNING framework_id, ref_code, id
+    )
+    SELECT framework_id, ref_code, id, true FROM inserted
+    UNION ALL
+    SELECT ec.framework_id, ec.ref_code, ec.id, false
+    FROM {table} ec
+    JOIN input i ON i.framework_id = ec.framework_id AND i.ref_code = ec.ref_code
+"""
+
+ControlKey = Tuple[str, str]
+
+
+def resolve_external_controls(cur, controls: Iterable[Tuple[Any, str, Optional[str], Optional[Dict]]],
+                              batch_size: int = BATCH_SIZE,
+                              table: str = "external_controls",
+                              created: Optional[Set[str]] = None) -> Dict[ControlKey, str]:
+    """Get or create external controls in bulk.
+
+    controls yields (framework_id, ref_code, description, metadata) tuples;
+    description defaults to "External control <ref>" and metadata to {}.
+    Only the first description/metadata seen for a key is used. Returns
+    (str(framework_id), ref_code) -> external_controls.id for every key.
+    table names a table shaped like external_controls, e.g. its shadow
+    external_controls_next during a swap rebuild. If created is given, the
+    ids of rows this call inserted are added to it.
+    """
+    sql = RESOLVE_SQL.format(table=table)
+    pending: Dict[ControlKey, Tuple[str, Optional[str]]] = {}
+    for framework_id, ref_code, description, metadata in controls:
+        key = (str(framework_id), ref_code)
+        if key not in pending:
+            pending[key] = (
+                description or f"External control {ref_code}",
+                json.dumps(metadata) if metadata is not None else None,
+            )
+
+    resolved: Dict[ControlKey, str] = {}
+    keys = list(pending)
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        cur.execute(sql, (
+            [framework_id for framework_id, _ in batch],
+            [ref_code for _, ref_code in batch],
+            [pending[key][0] for key in batch],
+            [pending[key][1] for key in batch],
+        ))
+        for framework_id, ref_code, control_id, inserted in cur.fetchall():
+            resolved[(str(framework_id), ref_code)] = control_id
+            if inserted and created is not None:
+                created.add(control_id)
+    return resolved
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Materialized framework-pair overlap (framework_pair_overlap).
+
+Framework comparison views read one precomputed row per ordered pair
+instead of joining raw crosswalks: shared SCF controls, Jaccard, the share
+of the source's SCF footprint the target also maps, target controls
+reachable through SCF, and the same counts per SCF domain.
+
+Everything comes from the crosswalk incidence matrix (crosswalk_matrix):
+
+    Bk = B[:, changed]                      SCF x changed frameworks
+    shared = Bk.T @ B                       changed x all frameworks
+    per domain: D[rows of c].T @ B[rows of c]  (D: SCF x domain indicator)
+
+framework_overlap_state holds each framework's crosswalk fingerprint from
+the last refresh. Only frameworks whose fingerprint changed (or which
+gained or lost all their crosswalks) are recomputed, in both directions,
+so an import touching one framework rewrites a few hundred rows:
+
+    from framework_overlap import refresh_overlap
+    stats = refresh_overlap(conn)          # caller commits
+
+    python scripts/framework_overlap.py            # refresh changed frameworks
+    python scripts/framework_overlap.py --force    # recompute every pair
+"""
+
+import sys
+from typing import Dict, List
+
+import numpy as np
+from scipy import sparse
+
+import grc_db
+from bulk_copy import copy_rows
+from crosswalk_matrix import IncidenceMatrix, framework_fingerprints, load_incidence
+
+UNASSIGNED_DOMAIN = "Unassigned"
+
+COLUMNS = [
+    "source_framework_id", "target_framework_id", "shared_scf_count", "source_scf_count", "target_scf_count",
+    "jaccard", "coverage", "covered_target_controls", "target_mapped_controls", "domains",
+]
+
+
+def load_scf_domains(conn, incidence: IncidenceMatrix):
+    """(D: SCF row x domain indicator, domain names) for the incidence matrix rows."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT ec.id, ec.metadata->>'domain'
+            FROM external_controls ec
+            WHERE ec.framework_id = (SELECT id FROM frameworks WHERE code = 'SCF' LIMIT 1)
+        """)
+        by_control = {str(control_id): domain for control_id, domain in cur.fetchall()}
+
+    names: Dict[str, int] = {}
+    cols = np.fromiter((names.setdefault(by_control.get(scf_id) or UNASSIGNED_DOMAIN, len(names))
+                        for scf_id in incidence.scf_ids.tolist()), dtype=np.int32, count=len(incidence.scf_ids))
+    indicator = sparse.csr_matrix((np.ones(len(cols), dtype=np.int32), (np.arange(len(cols)), cols)),
+                                  shape=(len(cols), len(names)))
+    return indicator, list(names)
+
+
+def overlap_rows(incidence: IncidenceMatrix, domains: sparse.csr_matrix, domain_names: List[str],
+                 changed: List[str]):
+    """framework_pair_overlap rows for every pair with shared SCF controls that involves a changed framework."""
+    present = set(incidence.framework_ids.tolist())
+    ks = [incidence.framework_index(framework_id) for framework_id in changed if framework_id in present]
+    if not ks:
+        return
+    footprint = incidence.by_framework()                     # B: SCF x framework
+    sizes = np.asarray(footprint.sum(axis=0)).ravel()
+    mapped = np.diff(incidence.framework_offsets)
+    grouping = incidence.column_framework()
+    changed_set = set(ks)
+
+    footprint_k = footprint[:, ks]
+    shared = (footprint_k.T @ footprint).toarray()           # [a, j]: changed ks[a] vs framework j
+
+    # Controls of j reachable from each changed framework (forward)
+    reach = (footprint_k.T.tocsr() @ incidence.matrix).tocsr()
+    reach.data[:] = 1
+    forward_controls = (reach @ grouping).toarray()          # [a, j]
+
+    # Controls of each changed framework reachable from j (reverse)
+    columns = np.concatenate([np.arange(incidence.framework_offsets[k], incidence.framework_offsets[k + 1])
+                              for k in ks])
+    reach_back = (footprint.T.tocsr() @ incidence.matrix[:, columns]).tocsr()
+    reach_back.data[:] = 1
+    reverse_controls = (reach_back @ grouping[columns][:, ks]).toarray()   # [j, a]
+
+    domain_sizes = (domains.T @ footprint).toarray()         # [d, j]
+    framework_ids = incidence.framework_ids.tolist()
+
+    def breakdown(per_domain, source, target):
+        return {domain_names[d]: {"shared": int(per_domain[d]), "source": int(domain_sizes[d, source]),
+                                  "target": int(domain_sizes[d, target])}
+                for d in range(len(domain_names)) if domain_sizes[d, source] or domain_sizes[d, target]}
+
+    def row(source, target, count, covered, per_domain):
+        union = sizes[source] + sizes[target] - count
+        return (framework_ids[source], framework_ids[target], count, int(sizes[source]), int(sizes[target]),
+                count / union if union else 0.0, count / sizes[source] if sizes[source] else 0.0,
+                int(covered), int(mapped[target]), breakdown(per_domain, source, target))
+
+    for a, k in enumerate(ks):
+        scf_rows = footprint_k[:, a].nonzero()[0]
+        shared_by_domain = (domains[scf_rows].T @ footprint[scf_rows]).toarray()   # [d, j]
+        for j in np.flatnonzero(shared[a]):
+            if j == k:
+                continue
+            count = int(shared[a, j])
+            yield row(k, j, count, forward_controls[a, j], shared_by_domain[:, j])
+            # Pairs between two changed frameworks come from the forward pass of each
+            if j not in changed_set:
+                yield row(j, k, count, reverse_controls[j, a], shared_by_domain[:, j])
+
+
+def refresh_overlap(conn, force: bool = False) -> Dict[str, int]:
+    """Recompute framework_pair_overlap for frameworks whose SCF crosswalks changed. Does not commit.
+
+    Returns {"frameworks": recomputed frameworks, "pairs": rows written}.
+    """
+    cur = conn.cursor()
+    current = framework_fingerprints(cur)
+    cur.execute("SELECT framework_id, fingerprint FROM framework_overlap_state")
+    stored = {str(framework_id): key for framework_id, key in cur.fetchall()}
+
+    if force:
+        changed = sorted(set(current) | set(stored))
+        cur.execute("DELETE FROM framework_pair_overlap")
+    else:
+        changed = sorted(framework_id for framework_id in set(current) | set(stored)
+                         if current.get(framework_id) != stored.get(framework_id))
+        if not changed:
+            return {"frameworks": 0, "pairs": 0}
+        cur.execute("""
+            DELETE FROM framework_pair_overlap
+            WHERE source_framework_id = ANY(%(ids)s::uuid[]) OR target_framework_id = ANY(%(ids)s::uuid[])
+        """, {"ids": changed})
+
+    pairs = 0
+    if current:
+        incidence = load_incidence(conn)
+        domains, domain_names = load_scf_domains(conn, incidence)
+        pairs = copy_rows(cur, "framework_pair_overlap", COLUMNS,
+                          overlap_rows(incidence, domains, domain_names, changed))
+
+    removed = [framework_id for framework_id in changed if framework_id not in current]
+    if removed:
+        cur.execute("DELETE FROM framework_overlap_state WHERE framework_id = ANY(%s::uuid[])", (removed,))
+    cur.executemany("""
+        INSERT INTO framework_overlap_state (framework_id, fingerprint)
+        VALUES (%s, %s)
+        ON CONFLICT (framework_id) DO UPDATE
+        SET fingerprint = EXCLUDED.fingerprint,
+            computed_at = NOW()
+    """, [(framework_id, current[framework_id]) for framework_id in changed if framework_id in current])
+    return {"frameworks": len(changed), "pairs": pairs}
+
+
+def main():
+    force = "--force" in sys.argv[1:]
+    with grc_db.connection() as conn:
+        stats = refresh_overlap(conn, force=force)
+    if stats["frameworks"]:
+        print(f"Framework overlap: recomputed {stats['frameworks']} framework(s), {stats['pairs']} pair rows")
+    else:
+        print("Framework overlap: up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Shared database layer for the import and maintenance scripts.
+
+Every script used to build its own connection (a hardcoded DB_URL, a
+DB_CONFIG dict, or env vars in get_db_connection()). grc_db resolves one
+DSN from the environment, keeps a process-wide psycopg2 connection pool,
+prepares hot statements once per server session, and offers server-side
+cursors for large reads and batched writers for bulk writes. Full rebuilds
+can load shadow tables and swap them in atomically (grc_db.shadow), and
+long imports checkpoint their progress in import_runs (grc_db.journal).
+
+Usage:
+
+    import grc_db
+
+    conn = grc_db.connect()                 # one-shot script connection
+
+    with grc_db.connection() as conn:       # pooled; commit on success
+        with conn.cursor() as cur:
+            framework_id = grc_db.fetch_value(cur, "framework_id", ("SCF",))
+
+    with grc_db.named_cursor(conn) as cur:  # server-side, streamed in itersize chunks
+        cur.execute("SELECT ... FROM external_controls")
+        for row in cur: ...
+
+    with grc_db.BatchWriter(cur, "INSERT INTO t (a, b) VALUES %s") as writer:
+        for row in rows:
+            writer.add(row)
+
+    grc_db.bulk_update(cur, "external_controls", {"display_order": "integer"},
+                       [(control_id, position), ...])   # one UPDATE ... FROM (VALUES ...)
+
+    run = grc_db.ImportRun.start(conn, "my_importer", wb.sha256)
+    for batch in run.batches("load", sorted(keys)):   # resumes after a failure
+        ...
+
+    grc_db.create_shadow(cur, "external_controls")   # load external_controls_next ...
+    pending = grc_db.swap_shadows(cur, ["external_controls"])
+"""
+
+from grc_db.config import describe, dsn
+from grc_db.cursors import BatchWriter, bulk_update, named_cursor
+from grc_db.journal import ImportRun
+from grc_db.pool import GrcConnection, acquire, close_pool, connect, connection, get_pool, release
+from grc_db.shadow import (
+    build_shadow_indexes, create_shadow, finish_swap, pending_validations, shadow_name, swap_shadows,
+)
+from grc_db.statements import STATEMENTS, execute_prepared, fetch_all, fetch_value, register
+
+__all__ = [
+    "BatchWriter",
+    "GrcConnection",
+    "ImportRun",
+    "STATEMENTS",
+    "acquire",
+    "build_shadow_indexes",
+    "bulk_update",
+    "close_pool",
+    "connect",
+    "connection",
+    "create_shadow",
+    "describe",
+    "dsn",
+    "execute_prepared",
+    "fetch_all",
+    "fetch_value",
+    "finish_swap",
+    "get_pool",
+    "named_cursor",
+    "pending_validations",
+    "register",
+    "release",
+    "shadow_name",
+    "swap_shadows",
+]
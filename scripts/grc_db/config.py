@@ -0,0 +1,45 @@
+"""Connection settings, resolved once from the environment."""
+
+import os
+import sys
+from typing import Dict
+
+# Supabase local exposes Postgres on 54322 by default
+DEFAULTS = {
+    "dbname": ("SUPABASE_DB_NAME", "postgres"),
+    "user": ("SUPABASE_DB_USER", "postgres"),
+    "password": ("SUPABASE_DB_PASSWORD", "postgres"),
+    "host": ("SUPABASE_DB_HOST", "127.0.0.1"),
+    "port": ("SUPABASE_DB_PORT", "54322"),
+}
+
+# Fail fast and detect dead peers when the database is remote
+CONNECT_OPTIONS = {
+    "connect_timeout": int(os.getenv("GRC_DB_CONNECT_TIMEOUT", "10")),
+    "keepalives": 1,
+    "keepalives_idle": 30,
+    "keepalives_interval": 10,
+    "keepalives_count": 3,
+}
+
+
+def dsn() -> str:
+    """DATABASE_URL if set, else a DSN built from the SUPABASE_DB_* variables."""
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url
+    return " ".join(f"{key}={os.getenv(env, default)}" for key, (env, default) in DEFAULTS.items())
+
+
+def connect_kwargs() -> Dict[str, object]:
+    application_name = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "grc_db"
+    return {**CONNECT_OPTIONS, "application_name": application_name}
+
+
+def describe() -> str:
+    """Printable target without credentials, e.g. 127.0.0.1:54322/postgres."""
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url.rsplit("@", 1)[-1]
+    settings = {key: os.getenv(env, default) for key, (env, default) in DEFAULTS.items()}
+    return f"{settings['host']}:{settings['port']}/{settings['dbname']}"
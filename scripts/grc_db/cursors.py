@@ -0,0 +1,105 @@
+"""Cursor helpers: server-side cursors for large reads, batched writers and updaters for bulk writes."""
+
+import itertools
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from psycopg2.extras import execute_values
+
+DEFAULT_ITERSIZE = 2000
+DEFAULT_PAGE_SIZE = 1000
+# Big enough that reordering a whole framework is a single statement
+DEFAULT_UPDATE_PAGE_SIZE = 10000
+
+_cursor_ids = itertools.count(1)
+
+
+@contextmanager
+def named_cursor(conn, name: Optional[str] = None, itersize: int = DEFAULT_ITERSIZE,
+                 cursor_factory=None) -> Iterator[Any]:
+    """Server-side cursor: rows are fetched itersize at a time instead of all at once.
+
+    Must be used inside a transaction (autocommit off), like any named cursor.
+    """
+    cur = conn.cursor(name or f"grc_cursor_{next(_cursor_ids)}", cursor_factory=cursor_factory)
+    cur.itersize = itersize
+    try:
+        yield cur
+    finally:
+        cur.close()
+
+
+class BatchWriter:
+    """Buffer rows and write them with execute_values, page_size rows per statement.
+
+    sql contains a single VALUES %s placeholder. Rows are flushed when the
+    buffer fills and when the with-block exits cleanly.
+    """
+
+    def __init__(self, cur, sql: str, template: Optional[str] = None,
+                 page_size: int = DEFAULT_PAGE_SIZE, fetch: bool = False):
+        self.cur = cur
+        self.sql = sql
+        self.template = template
+        self.page_size = page_size
+        self.fetch = fetch
+        self.results: List[tuple] = []
+        self.count = 0
+        self._rows: List[Sequence[Any]] = []
+
+    def add(self, row: Sequence[Any]) -> None:
+        self._rows.append(row)
+        if len(self._rows) >= self.page_size:
+            self.flush()
+
+    def extend(self, rows) -> None:
+        for row in rows:
+            self.add(row)
+
+    def flush(self) -> None:
+        if not self._rows:
+            return
+        result = execute_values(self.cur, self.sql, self._rows, template=self.template,
+                                page_size=self.page_size, fetch=self.fetch)
+        if self.fetch:
+            self.results.extend(result)
+        self.count += len(self._rows)
+        self._rows = []
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.flush()
+
+
+def bulk_update(cur, table: str, columns: Dict[str, str], rows: Iterable[Sequence[Any]],
+                key: str = "id", key_type: str = "uuid", page_size: int = DEFAULT_UPDATE_PAGE_SIZE,
+                only_changed: bool = True) -> int:
+    """Update many rows by key with one UPDATE ... FROM (VALUES ...) per page.
+
+    columns is {name: sql_type} for the columns being set; each row is
+    (key, value, ...) in that order. With only_changed, rows whose values
+    already match are skipped instead of rewritten. Returns rows updated.
+
+        bulk_update(cur, "external_controls", {"display_order": "integer"},
+                    [(control_id, position), ...])
+    """
+    names = list(columns)
+    assignments = ", ".join(f"{name} = v.{name}" for name in names)
+    sql = (f"UPDATE {table} AS t SET {assignments} "
+           f"FROM (VALUES %s) AS v({key}, {', '.join(names)}) "
+           f"WHERE t.{key} = v.{key}")
+    if only_changed:
+        sql += (f" AND ROW({', '.join(f't.{name}' for name in names)})"
+                f" IS DISTINCT FROM ROW({', '.join(f'v.{name}' for name in names)})")
+    template = "(" + ", ".join(f"%s::{sql_type}" for sql_type in [key_type, *columns.values()]) + ")"
+
+    rows = list(rows)
+    updated = 0
+    for start in range(0, len(rows), page_size):
+        page = rows[start:start + page_size]
+        execute_values(cur, sql, page, template=template, page_size=len(page))
+        updated += cur.rowcount
+    return updated
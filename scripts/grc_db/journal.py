@@ -0,0 +1,183 @@
+"""Import-run journal: resumable, checkpointed imports.
+
+A run is one importer working through one workbook (by sha256). The
+importer commits in bounded batches, and every commit also records the
+stage and the last key done in import_runs, in the same transaction as the
+batch. After a failure, ImportRun.start picks the unfinished run back up and
+the importer skips whatever is already durable:
+
+    run = grc_db.ImportRun.start(conn, "rebuild_all_framework_mappings:full", wb.sha256)
+    if not run.done("create"):
+        ...
+        run.complete("create")                     # commits the stage's work
+    for batch in run.batches("load", sorted(keys), 500):
+        ...                                        # committed with the checkpoint
+    run.finish()
+
+A run for a different workbook hash starts over and the stale one is marked
+abandoned; its pending import_run_prune_candidates move to the run that
+replaces it, since the batches that recorded them are already committed. A
+session advisory lock keeps two processes off the same importer.
+"""
+
+from typing import Iterator, List, Optional, Sequence
+
+RUNNING = "running"
+FAILED = "failed"
+COMPLETED = "completed"
+ABANDONED = "abandoned"
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class ImportRun:
+    """One import_runs row; all checkpoints commit the caller's connection."""
+
+    def __init__(self, conn, run_id: str, importer: str, workbook_sha256: Optional[str],
+                 stage: Optional[str] = None, batch_cursor: Optional[str] = None,
+                 completed_stages: Sequence[str] = (), resumed: bool = False):
+        self.conn = conn
+        self.id = run_id
+        self.importer = importer
+        self.workbook_sha256 = workbook_sha256
+        self.stage = stage
+        self.batch_cursor = batch_cursor
+        self.completed_stages: List[str] = list(completed_stages)
+        self.resumed = resumed
+
+    @classmethod
+    def start(cls, conn, importer: str, workbook_sha256: Optional[str] = None,
+              restart: bool = False) -> "ImportRun":
+        """Resume the importer's unfinished run for this workbook, or begin a new one."""
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (f"import_runs:{importer}",))
+            if not cur.fetchone()[0]:
+                raise RuntimeError(f"Another {importer} run is in progress")
+
+            cur.execute(
+                """
+                SELECT id, workbook_sha256, stage, batch_cursor, completed_stages
+                FROM import_runs
+                WHERE importer = %s AND status IN (%s, %s)
+                ORDER BY started_at DESC
+                """,
+                (importer, RUNNING, FAILED),
+            )
+            resume, stale = None, []
+            for row in cur.fetchall():
+                if resume is None and not restart and row[1] == workbook_sha256:
+                    resume = row
+                else:
+                    stale.append(row[0])
+
+            if stale:
+                cur.execute(
+                    "UPDATE import_runs SET status = %s, finished_at = NOW() WHERE id = ANY(%s::uuid[])",
+                    (ABANDONED, stale),
+                )
+            if resume:
+                run_id, _, stage, batch_cursor, completed_stages = resume
+                cur.execute(
+                    """
+                    UPDATE import_runs
+                    SET status = %s, error = NULL, attempts = attempts + 1, updated_at = NOW()
+                    WHERE id = %s
+                    """,
+                    (RUNNING, run_id),
+                )
+                run = cls(conn, run_id, importer, workbook_sha256, stage, batch_cursor,
+                          completed_stages or (), resumed=True)
+            else:
+                cur.execute(
+                    "INSERT INTO import_runs (importer, workbook_sha256) VALUES (%s, %s) RETURNING id",
+                    (importer, workbook_sha256),
+                )
+                run = cls(conn, cur.fetchone()[0], importer, workbook_sha256)
+
+            if stale:
+                cur.execute(
+                    """
+                    INSERT INTO import_run_prune_candidates (run_id, external_control_id)
+                    SELECT %s, external_control_id FROM import_run_prune_candidates WHERE run_id = ANY(%s::uuid[])
+                    ON CONFLICT DO NOTHING
+                    """,
+                    (run.id, stale),
+                )
+                cur.execute("DELETE FROM import_run_prune_candidates WHERE run_id = ANY(%s::uuid[])", (stale,))
+        conn.commit()
+        return run
+
+    def describe(self) -> str:
+        if not self.resumed:
+            return f"Import run {self.id} started"
+        where = f"{self.stage} after {self.batch_cursor}" if self.batch_cursor else self.stage or "the beginning"
+        return (f"Resuming import run {self.id} from {where} "
+                f"({len(self.completed_stages)} stage(s) already complete)")
+
+    def done(self, stage: str) -> bool:
+        return stage in self.completed_stages
+
+    def resume_cursor(self, stage: str) -> Optional[str]:
+        """Last key committed in stage by an earlier attempt, if it stopped there."""
+        return self.batch_cursor if self.stage == stage else None
+
+    def checkpoint(self, stage: str, batch_cursor: Optional[str]) -> None:
+        """Record progress and commit it together with the current transaction's work."""
+        with self.conn.cursor() as cur:
+            cur.execute(
+                "UPDATE import_runs SET stage = %s, batch_cursor = %s, updated_at = NOW() WHERE id = %s",
+                (stage, batch_cursor, self.id),
+            )
+        self.conn.commit()
+        self.stage, self.batch_cursor = stage, batch_cursor
+
+    def complete(self, stage: str) -> None:
+        """Mark stage finished and commit it together with the current transaction's work."""
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE import_runs
+                SET stage = %s, batch_cursor = NULL, updated_at = NOW(),
+                    completed_stages = array_append(completed_stages, %s)
+                WHERE id = %s
+                """,
+                (stage, stage, self.id),
+            )
+        self.conn.commit()
+        self.stage, self.batch_cursor = stage, None
+        self.completed_stages.append(stage)
+
+    def batches(self, stage: str, keys: Sequence[str], size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[str]]:
+        """Yield the stage's keys (ascending strings) in batches, skipping committed ones.
+
+        Each batch is checkpointed and committed when the loop asks for the
+        next one; the stage is completed after the last. If the loop body
+        raises, that batch is not checkpointed.
+        """
+        if self.done(stage):
+            return
+        after = self.resume_cursor(stage)
+        pending = [key for key in keys if after is None or key > after]
+        for start in range(0, len(pending), size):
+            batch = pending[start:start + size]
+            yield batch
+            self.checkpoint(stage, batch[-1])
+        self.complete(stage)
+
+    def finish(self) -> None:
+        with self.conn.cursor() as cur:
+            cur.execute(
+                "UPDATE import_runs SET status = %s, finished_at = NOW(), updated_at = NOW() WHERE id = %s",
+                (COMPLETED, self.id),
+            )
+        self.conn.commit()
+
+    def fail(self, error: BaseException) -> None:
+        """Roll back the uncommitted batch and mark the run resumable."""
+        self.conn.rollback()
+        with self.conn.cursor() as cur:
+            cur.execute(
+                "UPDATE import_runs SET status = %s, error = %s, updated_at = NOW() WHERE id = %s",
+                (FAILED, str(error), self.id),
+            )
+        self.conn.commit()
@@ -0,0 +1,81 @@
+"""Process-wide connection pool."""
+
+import atexit
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional, Set
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+from grc_db.config import connect_kwargs, dsn
+
+POOL_MIN = int(os.getenv("GRC_DB_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("GRC_DB_POOL_MAX", "8"))
+
+_pool: Optional[pool.ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+class GrcConnection(extensions.connection):
+    """psycopg2 connection that remembers which statements its session has prepared."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared: Set[str] = set()
+
+
+def connect(**kwargs) -> GrcConnection:
+    """Open a dedicated (unpooled) connection; extra kwargs go to psycopg2.connect."""
+    return psycopg2.connect(dsn(), connection_factory=GrcConnection, **{**connect_kwargs(), **kwargs})
+
+
+def get_pool(minconn: int = POOL_MIN, maxconn: int = POOL_MAX) -> pool.ThreadedConnectionPool:
+    """Create the shared pool on first use; later calls return the same pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = pool.ThreadedConnectionPool(
+                minconn, maxconn, dsn(), connection_factory=GrcConnection, **connect_kwargs()
+            )
+    return _pool
+
+
+def acquire() -> GrcConnection:
+    """Borrow a pooled connection (autocommit off); hand it back with release()."""
+    return get_pool().getconn()
+
+
+def release(conn: GrcConnection) -> None:
+    """Return a connection to the pool, rolling back anything left open."""
+    if not conn.closed:
+        if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        conn.autocommit = False
+    get_pool().putconn(conn)
+
+
+@contextmanager
+def connection() -> Iterator[GrcConnection]:
+    """Pooled connection scoped to a block: commit on success, rollback on error."""
+    conn = acquire()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release(conn)
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+
+
+atexit.register(close_pool)
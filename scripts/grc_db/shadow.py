@@ -0,0 +1,262 @@
+"""Shadow tables with an atomic rename swap.
+
+A full rebuild used to DELETE and reinsert the live tables inside one long
+transaction, so concurrent readers either waited on locks or inherited the
+dead-tuple bloat afterwards. Here the new data is loaded into
+<table>_next, indexed there, and swapped in with a short transaction that
+only renames tables and re-points dependents:
+
+    create_shadow(cur, "external_controls")        # same columns, PK/unique only
+    ... load external_controls_next ...
+    build_shadow_indexes(cur, "external_controls") # secondary indexes, after the load
+    conn.commit()
+
+    pending = swap_shadows(cur, ["external_controls", "scf_control_mappings"])
+    conn.commit()                                   # readers now see the new tables
+    finish_swap(cur, pending, ["external_controls", "scf_control_mappings"])
+    conn.commit()
+
+During the swap, foreign keys from other tables, views, RLS policies,
+grants and triggers are recreated against the new tables. Foreign keys are
+added NOT VALID so the swap does not scan them; finish_swap validates them
+afterwards under a lock that does not block readers or writers.
+
+Writes made to a live table between create_shadow and the swap are not
+carried over, so run full rebuilds while no other importer is writing.
+"""
+
+import re
+from typing import Dict, Iterable, List, Tuple
+
+SHADOW_SUFFIX = "_next"
+OLD_SUFFIX = "_old"
+SWAP_LOCK_TIMEOUT = "5s"
+
+INDEX_DEF_RE = re.compile(r"^(CREATE (?:UNIQUE )?INDEX )(\S+)( ON )(\S+)( .*)$", re.DOTALL)
+
+
+def _role(name: str) -> str:
+    return "PUBLIC" if name.lower() == "public" else f'"{name}"'
+
+
+def shadow_name(table: str) -> str:
+    return table + SHADOW_SUFFIX
+
+
+def old_name(table: str) -> str:
+    return table + OLD_SUFFIX
+
+
+def _key_constraints(cur, table: str) -> List[Tuple[str, str]]:
+    """(name, definition) of the table's primary key, unique and exclusion constraints."""
+    cur.execute("""
+        SELECT conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'x')
+        ORDER BY contype, conname
+    """, (table,))
+    return cur.fetchall()
+
+
+def _secondary_indexes(cur, table: str) -> List[Tuple[str, str]]:
+    """(name, CREATE INDEX statement) for indexes not backing a constraint."""
+    cur.execute("""
+        SELECT ic.relname, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        JOIN pg_class ic ON ic.oid = i.indexrelid
+        WHERE i.indrelid = %s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+        ORDER BY ic.relname
+    """, (table,))
+    return cur.fetchall()
+
+
+def create_shadow(cur, table: str, copy_rows: bool = False) -> str:
+    """Create <table>_next with the live table's columns, defaults, checks and keys.
+
+    Key constraints are created up front so ON CONFLICT works while loading;
+    secondary indexes wait for build_shadow_indexes(). With copy_rows the
+    live rows (and their ids) are copied in first.
+    """
+    shadow = shadow_name(table)
+    cur.execute(f"DROP TABLE IF EXISTS {shadow}")
+    cur.execute(f"""
+        CREATE TABLE {shadow} (LIKE {table}
+            INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED
+            INCLUDING IDENTITY INCLUDING STORAGE INCLUDING COMMENTS)
+    """)
+    for name, definition in _key_constraints(cur, table):
+        cur.execute(f"ALTER TABLE {shadow} ADD CONSTRAINT {name}{SHADOW_SUFFIX} {definition}")
+    if copy_rows:
+        cur.execute(f"INSERT INTO {shadow} SELECT * FROM {table}")
+    return shadow
+
+
+def build_shadow_indexes(cur, table: str) -> int:
+    """Create the live table's secondary indexes on <table>_next; returns how many."""
+    shadow = shadow_name(table)
+    indexes = _secondary_indexes(cur, table)
+    for name, definition in indexes:
+        match = INDEX_DEF_RE.match(definition)
+        if not match:
+            raise RuntimeError(f"Unrecognized index definition for {name}: {definition}")
+        head, _, on, _, tail = match.groups()
+        cur.execute(f"{head}{name}{SHADOW_SUFFIX}{on}{shadow}{tail}")
+    cur.execute(f"ANALYZE {shadow}")
+    return len(indexes)
+
+
+def _dependents(cur, table: str) -> Dict[str, list]:
+    """Everything bound to the live table's OID that must follow the swap."""
+    deps: Dict[str, list] = {}
+
+    cur.execute("""
+        SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE contype = 'f' AND (conrelid = %s::regclass OR confrelid = %s::regclass)
+    """, (table, table))
+    deps["foreign_keys"] = cur.fetchall()
+
+    cur.execute("""
+        SELECT DISTINCT v.oid::regclass::text, v.relkind, pg_get_viewdef(v.oid)
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        JOIN pg_class v ON v.oid = r.ev_class
+        WHERE d.classid = 'pg_rewrite'::regclass
+          AND d.refobjid = %s::regclass
+          AND v.oid <> %s::regclass
+    """, (table, table))
+    deps["views"] = cur.fetchall()
+
+    cur.execute("""
+        SELECT policyname, permissive, roles::text[], cmd, qual, with_check
+        FROM pg_policies
+        WHERE schemaname = current_schema() AND tablename = %s
+    """, (table,))
+    deps["policies"] = cur.fetchall()
+
+    cur.execute("SELECT relrowsecurity, relforcerowsecurity FROM pg_class WHERE oid = %s::regclass", (table,))
+    deps["row_security"] = cur.fetchone()
+
+    cur.execute("""
+        SELECT grantee, privilege_type
+        FROM information_schema.role_table_grants
+        WHERE table_schema = current_schema() AND table_name = %s
+    """, (table,))
+    deps["grants"] = cur.fetchall()
+
+    cur.execute("""
+        SELECT pg_get_triggerdef(oid)
+        FROM pg_trigger
+        WHERE tgrelid = %s::regclass AND NOT tgisinternal
+    """, (table,))
+    deps["triggers"] = [row[0] for row in cur.fetchall()]
+
+    # Functions taking or returning the table's row type are bound to the old type
+    cur.execute("""
+        SELECT p.oid::regprocedure::text
+        FROM pg_proc p, pg_class c
+        WHERE c.oid = %s::regclass AND (p.prorettype = c.reltype OR c.reltype = ANY(p.proargtypes))
+    """, (table,))
+    deps["functions"] = [row[0] for row in cur.fetchall()]
+    return deps
+
+
+def swap_shadows(cur, tables: Iterable[str]) -> List[Tuple[str, str]]:
+    """Swap every <table>_next in for <table> in the current transaction.
+
+    Returns the (table, constraint) foreign keys added NOT VALID, for
+    finish_swap() to validate after commit.
+    """
+    tables = list(tables)
+    cur.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+
+    deps = {table: _dependents(cur, table) for table in tables}
+    for table, table_deps in deps.items():
+        if table_deps["functions"]:
+            raise RuntimeError(
+                f"Cannot swap {table}: functions use its row type: {', '.join(table_deps['functions'])}"
+            )
+        for view, relkind, _ in table_deps["views"]:
+            if relkind != "v":
+                raise RuntimeError(f"Cannot swap {table}: materialized view {view} depends on it")
+
+    # Foreign keys, deduplicated (an FK between two swapped tables shows up twice)
+    foreign_keys = {}
+    for table_deps in deps.values():
+        for child, name, definition in table_deps["foreign_keys"]:
+            foreign_keys[(child, name)] = definition
+
+    # Drop FKs on tables that stay in place; the swapped tables' own FKs go with <table>_old
+    for child, name in foreign_keys:
+        if child not in tables:
+            cur.execute(f"ALTER TABLE {child} DROP CONSTRAINT {name}")
+
+    # Leftovers of an earlier swap that never reached finish_swap
+    cur.execute(f"DROP TABLE IF EXISTS {', '.join(old_name(table) for table in tables)}")
+
+    for table in tables:
+        cur.execute(f"ALTER TABLE {table} RENAME TO {old_name(table)}")
+        for name, _ in _key_constraints(cur, old_name(table)):
+            cur.execute(f"ALTER TABLE {old_name(table)} RENAME CONSTRAINT {name} TO {name}{OLD_SUFFIX}")
+        for name, _ in _secondary_indexes(cur, old_name(table)):
+            cur.execute(f"ALTER INDEX {name} RENAME TO {name}{OLD_SUFFIX}")
+
+        cur.execute(f"ALTER TABLE {shadow_name(table)} RENAME TO {table}")
+        for name, _ in _key_constraints(cur, table):
+            if name.endswith(SHADOW_SUFFIX):
+                cur.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {name} TO {name[:-len(SHADOW_SUFFIX)]}")
+        for name, _ in _secondary_indexes(cur, table):
+            if name.endswith(SHADOW_SUFFIX):
+                cur.execute(f"ALTER INDEX {name} RENAME TO {name[:-len(SHADOW_SUFFIX)]}")
+
+    # Definitions were captured under the live names, which now resolve to the new tables
+    pending = []
+    for (child, name), definition in foreign_keys.items():
+        cur.execute(f"ALTER TABLE {child} ADD CONSTRAINT {name} {definition} NOT VALID")
+        pending.append((child, name))
+
+    for table, table_deps in deps.items():
+        for view, _, definition in table_deps["views"]:
+            cur.execute(f"CREATE OR REPLACE VIEW {view} AS {definition}")
+
+        row_security, force_row_security = table_deps["row_security"]
+        if row_security:
+            cur.execute(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY")
+        if force_row_security:
+            cur.execute(f"ALTER TABLE {table} FORCE ROW LEVEL SECURITY")
+        for name, permissive, roles, cmd, qual, with_check in table_deps["policies"]:
+            statement = f'CREATE POLICY "{name}" ON {table} AS {permissive} FOR {cmd} TO {", ".join(map(_role, roles))}'
+            if qual:
+                statement += f" USING ({qual})"
+            if with_check:
+                statement += f" WITH CHECK ({with_check})"
+            cur.execute(statement)
+
+        for grantee, privilege in table_deps["grants"]:
+            cur.execute(f"GRANT {privilege} ON {table} TO {_role(grantee)}")
+
+        for definition in table_deps["triggers"]:
+            cur.execute(definition)
+
+    return pending
+
+
+def pending_validations(cur, tables: Iterable[str]) -> List[Tuple[str, str]]:
+    """NOT VALID foreign keys on or referencing tables, for a finish_swap() after a restart."""
+    tables = list(tables)
+    cur.execute("""
+        SELECT conrelid::regclass::text, conname
+        FROM pg_constraint
+        WHERE contype = 'f' AND NOT convalidated
+          AND (conrelid = ANY(%s::regclass[]) OR confrelid = ANY(%s::regclass[]))
+    """, (tables, tables))
+    return cur.fetchall()
+
+
+def finish_swap(cur, pending: List[Tuple[str, str]], tables: Iterable[str]) -> None:
+    """After the swap commits: validate the NOT VALID foreign keys and drop <table>_old."""
+    for child, name in pending:
+        cur.execute(f"ALTER TABLE {child} VALIDATE CONSTRAINT {name}")
+    # One statement, so FKs between the old tables don't block each other's drop
+    cur.execute(f"DROP TABLE IF EXISTS {', '.join(old_name(table) for table in tables)}")
@@ -0,0 +1,59 @@
+"""Server-side prepared statements for hot queries.
+
+Statements are registered once by name with $n placeholders. The first
+execute_prepared() on a connection issues PREPARE; later calls only send
+EXECUTE, so the server skips parsing and planning.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+PLACEHOLDER_RE = re.compile(r"\$\d+")
+
+STATEMENTS: Dict[str, str] = {
+    "framework_id": "SELECT id FROM frameworks WHERE code = $1 ORDER BY version DESC LIMIT 1",
+    "framework_id_by_version": "SELECT id FROM frameworks WHERE code = $1 AND version = $2",
+    "framework_mapping_header": """
+        SELECT mapping_column_header FROM frameworks
+        WHERE code = $1 AND version = $2 AND mapping_column_header IS NOT NULL
+    """,
+    "framework_mapping_count": "SELECT COUNT(*) FROM scf_control_mappings WHERE framework_id = $1",
+    "external_control_id": "SELECT id FROM external_controls WHERE framework_id = $1 AND ref_code = $2",
+    "external_controls_by_framework": """
+        SELECT id, ref_code, parent_id, display_order FROM external_controls
+        WHERE framework_id = $1
+    """,
+}
+
+
+def register(name: str, sql: str) -> None:
+    """Add (or replace) a named statement; sql uses $1, $2, ... placeholders."""
+    STATEMENTS[name] = sql
+
+
+def execute_prepared(cur, name: str, params: Sequence[Any] = ()) -> None:
+    """EXECUTE a registered statement, preparing it on this connection first if needed."""
+    prepared = getattr(cur.connection, "prepared", None)
+    if prepared is None:
+        # Plain psycopg2 connection: nothing tracks the session, run the statement directly
+        cur.execute(PLACEHOLDER_RE.sub("%s", STATEMENTS[name].replace("%", "%%")), tuple(params))
+        return
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} AS {STATEMENTS[name]}")
+        prepared.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", tuple(params))
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+
+def fetch_value(cur, name: str, params: Sequence[Any] = ()) -> Optional[Any]:
+    """First column of the first row, or None."""
+    execute_prepared(cur, name, params)
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def fetch_all(cur, name: str, params: Sequence[Any] = ()) -> List[tuple]:
+    execute_prepared(cur, name, params)
+    return cur.fetchall()
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+Declarative parent-derivation rules for external_controls.
+
+Parent refs used to be derived by a get_parent_ref_* function per framework
+(fix_all_framework_parent_hierarchy.py) and by near-copies in the ISO, HIPAA
+and NIST CSF scripts, each calling re.match with uncompiled patterns for
+every row. Here every framework is one FrameworkRules entry in RULE_TABLE:
+
+    framework code/version -> ordered Rule(pattern, parent template, level)
+
+A Rule's pattern must match the whole ref_code. Its parent template uses
+\\1-style group references, and None marks a root. Its level is the
+hierarchy_level of refs of that shape, and is given to groups created for
+them. Each entry's rules are compiled once into a single alternation; the
+first rule that matches wins, as the old if/elif chains did.
+
+apply_hierarchy_rules loads the controls of every selected framework in one
+query and walks each ref's full ancestor chain. It creates any missing groups
+in one statement when the entry allows it. Then it writes all parent_ids with
+one bulk UPDATE, and recomputes the ltree paths and closure rows of those
+frameworks.
+
+maintain_hierarchy is the incremental counterpart for importers. Given the
+ids of controls that were just inserted or changed, it resolves only their
+ancestor chains and the existing controls that belong below them, and
+updates only those rows and their old and new parents.
+
+Usage:
+    from hierarchy_rules import RULE_TABLE, apply_hierarchy_rules, maintain_hierarchy, rules_for
+    stats = apply_hierarchy_rules(conn, rules_for("HIPAA"))
+    stats = maintain_hierarchy(conn, new_control_ids)
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import control_tree
+import grc_db
+
+GROUP_REF_RE = re.compile(r"\\(\d+)")
+MAX_DEPTH = 32
+
+
+class Rule(NamedTuple):
+    pattern: str            # Full-match regex for a ref_code
+    parent: Optional[str]   # Parent ref template (\1 = first group); None = root
+    level: str              # hierarchy_level for refs of this shape
+
+
+class FrameworkRules(NamedTuple):
+    code: str
+    version: Optional[str]               # None = every version of the code
+    rules: Tuple[Rule, ...]
+    create_groups: bool = False          # Create missing ancestors as groups
+    default_level: str = "domain"        # Level for created groups no rule describes
+    group_description: str = "Group: {ref}"
+
+
+# Shared rule sets
+
+NIST_800_53 = (
+    Rule(r"([A-Z]{2}-\d+)\(\d+\)", r"\1", "enhancement"),
+)
+
+NIST_800_171_REV3 = (
+    Rule(r"(\d{2}\.\d{2}\.\d{2}\.[a-z])\.\d{2}", r"\1", "control"),
+    Rule(r"(\d{2}\.\d{2}\.\d{2})\.[a-z]", r"\1", "control"),
+)
+
+# N.N.N -> N.N (NIST 800-171 rev2, PCI-DSS)
+DOTTED_THREE = (
+    Rule(r"(\d+\.\d+)\.\d+", r"\1", "control"),
+)
+
+CIS_CSC = (
+    Rule(r"(\d+)\.\d+", r"\1", "control"),
+)
+
+HIPAA = (
+    Rule(r"(.+)\(\d+\)", r"\1", "section"),
+    Rule(r"(.+)\([A-Z]\)", r"\1", "section"),
+    Rule(r"(.+)\([ivx]+\)", r"\1", "section"),
+    Rule(r"(.+\([a-z]\))\(\d+\)", r"\1", "section"),
+    Rule(r"(\d+\.\d+)\([a-z]\)", r"\1", "section"),
+)
+
+# NN.N(x) -> NN.N (GDPR)
+LETTERED_ARTICLE = (
+    Rule(r"(\d+\.\d+)\([a-z]\)", r"\1", "control"),
+)
+
+# NNN.NN(x) -> NNN.NN, then (x)(N) -> (x) (NYDFS, CCPA)
+LETTERED_THEN_NUMBERED = (
+    Rule(r"(\d+\.\d+)\([a-z]\)", r"\1", "control"),
+    Rule(r"(.+)\(\d+\)", r"\1", "control"),
+)
+
+SOC2_TSC = (
+    Rule(r"([A-Z]\d+\.\d+)-POF\d+", r"\1", "control"),
+)
+
+# Function.Category-NN -> Function.Category -> Function (CSF v1.1, Privacy Framework)
+CSF_V1 = (
+    Rule(r"([A-Z]{2}\.[A-Z]{2})-\d+", r"\1", "domain"),
+    Rule(r"([A-Z]{2})\.[A-Z]{2}", r"\1", "domain"),
+)
+
+CSF_V2 = (
+    Rule(r"([A-Z]{2}\.[A-Z]{2,})-\d+", r"\1", "control"),
+    Rule(r"([A-Z]{2})\.[A-Z]{2,}", r"\1", "category"),
+    Rule(r"[A-Z]{2}", None, "function"),
+)
+
+COBIT = (
+    Rule(r"([A-Z]{3}\d{2})\.\d{2}", r"\1", "control"),
+)
+
+CSA_CCM = (
+    Rule(r"([A-Z&]+)-\d{2}", r"\1", "control"),
+)
+
+# Clauses (5), sections (5.1, A.5), subsections (5.1.2, 5.1(a), A.5.1)
+ISO = (
+    Rule(r"(.+)\(\d+\)", r"\1", "subsection"),
+    Rule(r"(.+)\([a-z]\)", r"\1", "subsection"),
+    Rule(r"(\d+\.\d+(?:\.\d+)*)\.\d+", r"\1", "subsection"),
+    Rule(r"(\d+)\.\d+", r"\1", "section"),
+    Rule(r"(A)\.\d+", r"\1", "section"),
+    Rule(r"(A\.\d+(?:\.\d+)*)\.\d+", r"\1", "subsection"),
+    Rule(r"\d+", None, "clause"),
+    Rule(r"A", None, "annex"),
+)
+
+RULE_TABLE: List[FrameworkRules] = [
+    FrameworkRules("NIST-800-53", "rev5", NIST_800_53),
+    FrameworkRules("NIST-800-53", "rev4", NIST_800_53),
+    FrameworkRules("FedRAMP", "R5-High", NIST_800_53),
+    FrameworkRules("FedRAMP", "R5-Moderate", NIST_800_53),
+    FrameworkRules("FedRAMP", "R5-Low", NIST_800_53),
+    FrameworkRules("CMMC", "2.0", NIST_800_53),
+    FrameworkRules("NIST-800-171", "rev3", NIST_800_171_REV3),
+    FrameworkRules("NIST-800-171", "rev2", DOTTED_THREE, create_groups=True),
+    FrameworkRules("CIS-CSC", "v8.1", CIS_CSC, create_groups=True),
+    FrameworkRules("CIS-CSC-IG1", "v8.1", CIS_CSC, create_groups=True),
+    FrameworkRules("CIS-CSC-IG2", "v8.1", CIS_CSC, create_groups=True),
+    FrameworkRules("CIS-CSC-IG3", "v8.1", CIS_CSC, create_groups=True),
+    FrameworkRules("PCI-DSS", "v4.0.1", DOTTED_THREE),
+    FrameworkRules("PCI-DSS", "v3.2", DOTTED_THREE),
+    FrameworkRules("HIPAA", None, HIPAA, create_groups=True, default_level="section",
+                   group_description="HIPAA Section {ref}"),
+    FrameworkRules("GDPR", "2016", LETTERED_ARTICLE),
+    FrameworkRules("SOC2-TSC", "2017-2022", SOC2_TSC),
+    FrameworkRules("NIST-CSF", "v1.1", CSF_V1, create_groups=True),
+    FrameworkRules("NIST-CSF", "2.0", CSF_V2, create_groups=True, default_level="function"),
+    FrameworkRules("NIST-PF", "v1.0", CSF_V1, create_groups=True),
+    FrameworkRules("COBIT", "2019", COBIT, create_groups=True),
+    FrameworkRules("CSA-CCM", "v4", CSA_CCM, create_groups=True),
+    FrameworkRules("NYDFS", "2023", LETTERED_THEN_NUMBERED),
+    FrameworkRules("CCPA", "2022", LETTERED_THEN_NUMBERED),
+] + [
+    FrameworkRules(code, None, ISO, create_groups=True, default_level="subsection",
+                   group_description="{level} {ref}")
+    for code in ("ISO-27001", "ISO-27002", "ISO-27017", "ISO-27018", "ISO-27701", "ISO-42001")
+]
+
+
+class CompiledRules:
+    """One FrameworkRules entry compiled into a single full-match alternation."""
+
+    def __init__(self, rules: Sequence[Rule], default_level: str):
+        self.default_level = default_level
+        self._by_group: Dict[str, Tuple[Optional[str], str]] = {}
+        alternatives = []
+        offset = 0
+        for i, rule in enumerate(rules):
+            name = f"r{i}"
+            alternatives.append(f"(?P<{name}>{rule.pattern})")
+            # \N in the template -> the N-th group inside this alternative
+            template = None
+            if rule.parent is not None:
+                template = GROUP_REF_RE.sub(lambda m, base=offset + 1: f"\\g<{base + int(m.group(1))}>", rule.parent)
+            self._by_group[name] = (template, rule.level)
+            offset += 1 + re.compile(rule.pattern).groups
+        self._regex = re.compile("|".join(alternatives))
+        self._parents: Dict[str, Tuple[bool, Optional[str]]] = {}
+
+    def _match(self, ref_code: str) -> Tuple[bool, Optional[str], Optional[str]]:
+        """(matched, parent ref or None, level or None)."""
+        match = self._regex.fullmatch(ref_code)
+        if not match:
+            return False, None, None
+        template, level = self._by_group[match.lastgroup]
+        return True, match.expand(template) if template else None, level
+
+    def parent(self, ref_code: str) -> Optional[str]:
+        return self.resolve(ref_code)[1]
+
+    def resolve(self, ref_code: str) -> Tuple[bool, Optional[str]]:
+        """(is an explicit root, parent ref), memoized per ref."""
+        if ref_code not in self._parents:
+            matched, parent, _ = self._match(ref_code)
+            self._parents[ref_code] = (matched and parent is None, parent if parent != ref_code else None)
+        return self._parents[ref_code]
+
+    def level(self, ref_code: str) -> str:
+        return self._match(ref_code)[2] or self.default_level
+
+    def ancestors(self, ref_code: str) -> List[str]:
+        """Ancestor refs from the immediate parent up to the root."""
+        chain: List[str] = []
+        current = ref_code
+        while len(chain) < MAX_DEPTH:
+            parent = self.resolve(current)[1]
+            if parent is None or parent in chain or parent == ref_code:
+                break
+            chain.append(parent)
+            current = parent
+        return chain
+
+
+@lru_cache(maxsize=None)
+def compile_rules(framework_rules: FrameworkRules) -> CompiledRules:
+    return CompiledRules(framework_rules.rules, framework_rules.default_level)
+
+
+def rules_for(*codes: str) -> List[FrameworkRules]:
+    """RULE_TABLE entries for the given framework codes."""
+    return [entry for entry in RULE_TABLE if entry.code in codes]
+
+
+def select_frameworks(cur, rule_sets: Iterable[FrameworkRules]) -> List[Tuple[str, str, str, FrameworkRules]]:
+    """(framework_id, code, version, rules) for every framework row a rule set covers."""
+    rule_sets = list(rule_sets)
+    cur.execute("SELECT id, code, version FROM frameworks WHERE code = ANY(%s)",
+                (sorted({entry.code for entry in rule_sets}),))
+    selected = []
+    for framework_id, code, version in cur.fetchall():
+        for entry in rule_sets:
+            if entry.code == code and entry.version in (None, version):
+                selected.append((framework_id, code, version, entry))
+                break
+    return selected
+
+
+CREATE_GROUPS_SQL = """
+    INSERT INTO external_controls (framework_id, ref_code, description, is_group, hierarchy_level)
+    SELECT framework_id, ref_code, description, true, hierarchy_level
+    FROM unnest(%s::uuid[], %s::text[], %s::text[], %s::text[])
+        AS t(framework_id, ref_code, description, hierarchy_level)
+    ON CONFLICT (framework_id, ref_code) DO NOTHING
+    RETURNING framework_id, ref_code, id
+"""
+
+
+def apply_hierarchy_rules(conn, rule_sets: Iterable[FrameworkRules] = RULE_TABLE,
+                          parent_id_source: Optional[str] = None) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """Set parent_id for every control the rule sets cover, creating missing groups.
+
+    A control gets its nearest existing ancestor (its immediate parent when
+    groups are created); explicit roots get NULL. Controls no rule resolves
+    keep their parent_id. With parent_id_source, that column is set on every
+    row written. Paths and closure rows of the selected frameworks are
+    recomputed. Commits; returns (code, version) -> {"controls", "groups_created", "updated"}.
+    """
+    cur = conn.cursor()
+    frameworks = select_frameworks(cur, rule_sets)
+    if not frameworks:
+        return {}
+    by_id = {str(framework_id): (code, version, entry) for framework_id, code, version, entry in frameworks}
+
+    controls: Dict[str, Dict[str, Tuple[str, Optional[str]]]] = {framework_id: {} for framework_id in by_id}
+    with grc_db.named_cursor(conn) as named:
+        named.execute("SELECT framework_id, ref_code, id, parent_id FROM external_controls "
+                      "WHERE framework_id = ANY(%s::uuid[])", (list(by_id),))
+        for framework_id, ref_code, control_id, parent_id in named:
+            controls[str(framework_id)][ref_code] = (control_id, parent_id)
+
+    stats = {(code, version): {"controls": len(controls[framework_id]), "groups_created": 0, "updated": 0}
+             for framework_id, (code, version, _) in by_id.items()}
+
+    # Paths are recomputed once at the end instead of per row
+    control_tree.defer_paths(cur)
+
+    # Missing ancestors, all frameworks in one statement
+    missing: Dict[Tuple[str, str], Tuple[str, str]] = {}
+    for framework_id, refs in controls.items():
+        _, _, entry = by_id[framework_id]
+        if not entry.create_groups:
+            continue
+        compiled = compile_rules(entry)
+        for ref_code in list(refs):
+            for ancestor in compiled.ancestors(ref_code):
+                if ancestor not in refs and (framework_id, ancestor) not in missing:
+                    level = compiled.level(ancestor)
+                    description = entry.group_description.format(ref=ancestor, level=level.title())
+                    missing[(framework_id, ancestor)] = (description, level)
+    if missing:
+        keys = sorted(missing)
+        cur.execute(CREATE_GROUPS_SQL, (
+            [framework_id for framework_id, _ in keys],
+            [ref_code for _, ref_code in keys],
+            [missing[key][0] for key in keys],
+            [missing[key][1] for key in keys],
+        ))
+        for framework_id, ref_code, control_id in cur.fetchall():
+            controls[str(framework_id)][ref_code] = (control_id, None)
+            code, version, _ = by_id[str(framework_id)]
+            stats[(code, version)]["groups_created"] += 1
+
+    updates = []
+    for framework_id, refs in controls.items():
+        code, version, entry = by_id[framework_id]
+        compiled = compile_rules(entry)
+        for ref_code, (control_id, current_parent) in refs.items():
+            is_root, _ = compiled.resolve(ref_code)
+            if is_root:
+                parent_id = None
+            else:
+                parent_id = next((refs[a][0] for a in compiled.ancestors(ref_code) if a in refs), None)
+                if parent_id is None:
+                    continue
+            if parent_id != current_parent or parent_id_source:
+                updates.append((control_id, parent_id) + ((parent_id_source,) if parent_id_source else ()))
+                stats[(code, version)]["updated"] += 1
+
+    columns = {"parent_id": "uuid"}
+    if parent_id_source:
+        columns["parent_id_source"] = "varchar(32)"
+    grc_db.bulk_update(cur, "external_controls", columns, updates)
+    control_tree.refresh_paths(cur, by_id)
+    control_tree.rebuild_closure(conn, by_id)
+    conn.commit()
+    return stats
+
+
+def rules_for_framework(code: str, version: Optional[str]) -> Optional[FrameworkRules]:
+    """The RULE_TABLE entry covering one framework row, if any."""
+    return next((entry for entry in RULE_TABLE if entry.code == code and entry.version in (None, version)), None)
+
+
+MAINTAIN_LEVELS_SQL = """
+    UPDATE external_controls ec
+    SET is_group = x.has_children,
+        hierarchy_level = COALESCE(ec.hierarchy_level, CASE WHEN x.has_children THEN 'section' ELSE 'control' END)
+    FROM (
+        SELECT e.id, EXISTS (SELECT 1 FROM external_controls c WHERE c.parent_id = e.id) AS has_children
+        FROM external_controls e
+        WHERE e.id = ANY(%s::uuid[])
+    ) x
+    WHERE ec.id = x.id
+      AND (ec.is_group IS DISTINCT FROM x.has_children OR ec.hierarchy_level IS NULL)
+"""
+
+
+def maintain_hierarchy(conn, control_ids: Iterable[Any], parent_id_source: Optional[str] = None,
+                       reorder: bool = True) -> Dict[str, int]:
+    """Incrementally place newly inserted or changed controls in their hierarchy.
+
+    Only the given controls, their ancestor chains, existing controls the
+    rules place below them, and their old and new parents are read or
+    written: parent_id is resolved as apply_hierarchy_rules
+    would (creating missing groups), is_group and hierarchy_level are
+    recomputed as set_hierarchy_levels would, and closure rows are rewritten
+    for the moved subtrees (paths and sort keys follow by trigger). With
+    reorder, display_order/lft/rgt are renumbered for the touched frameworks,
+    since an insert shifts the intervals after it. Does not commit; returns
+    {"controls", "groups_created", "reparented", "levels", "reordered"}.
+    """
+    ids = sorted({str(control_id) for control_id in control_ids})
+    stats = {"controls": len(ids), "groups_created": 0, "reparented": 0, "levels": 0, "reordered": 0}
+    if not ids:
+        return stats
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT ec.id, ec.framework_id, ec.ref_code, ec.parent_id, f.code, f.version
+        FROM external_controls ec
+        JOIN frameworks f ON f.id = ec.framework_id
+        WHERE ec.id = ANY(%s::uuid[])
+    """, (ids,))
+    changed = cur.fetchall()
+
+    # Ancestor refs of every changed control, per framework with rules
+    entries: Dict[str, FrameworkRules] = {}
+    wanted: Dict[Tuple[str, str], None] = {}
+    for control_id, framework_id, ref_code, _, code, version in changed:
+        entry = rules_for_framework(code, version)
+        if entry is None:
+            continue
+        entries[str(framework_id)] = entry
+        for ancestor in compile_rules(entry).ancestors(ref_code):
+            wanted[(str(framework_id), ancestor)] = None
+
+    existing: Dict[Tuple[str, str], Any] = {}
+    if wanted:
+        keys = sorted(wanted)
+        cur.execute("""
+            SELECT ec.framework_id, ec.ref_code, ec.id
+            FROM external_controls ec
+            JOIN unnest(%s::uuid[], %s::text[]) AS t(framework_id, ref_code)
+              ON ec.framework_id = t.framework_id AND ec.ref_code = t.ref_code
+        """, ([framework_id for framework_id, _ in keys], [ref_code for _, ref_code in keys]))
+        existing = {(str(framework_id), ref_code): control_id for framework_id, ref_code, control_id in cur.fetchall()}
+
+    # Missing ancestors become groups, and are placed along with the changed rows
+    placing = [(control_id, str(framework_id), ref_code, parent_id)
+               for control_id, framework_id, ref_code, parent_id, _, _ in changed if str(framework_id) in entries]
+    missing = sorted(key for key in wanted if key not in existing and entries[key[0]].create_groups)
+    if missing:
+        descriptions, levels = [], []
+        for framework_id, ancestor in missing:
+            entry = entries[framework_id]
+            level = compile_rules(entry).level(ancestor)
+            descriptions.append(entry.group_description.format(ref=ancestor, level=level.title()))
+            levels.append(level)
+        cur.execute(CREATE_GROUPS_SQL, ([framework_id for framework_id, _ in missing],
+                                        [ref_code for _, ref_code in missing], descriptions, levels))
+        for framework_id, ref_code, control_id in cur.fetchall():
+            existing[(str(framework_id), ref_code)] = control_id
+            placing.append((control_id, str(framework_id), ref_code, None))
+            stats["groups_created"] += 1
+
+    # Existing controls whose rule ancestors include a new ref move under it.
+    # A child ref is its parent ref plus a suffix starting with a non-digit,
+    # so its sort_key starts with the parent's: one (framework_id, sort_key)
+    # index range per new ref (UTF-8 text never contains 0xff).
+    new_refs = sorted({(framework_id, ref_code) for _, framework_id, ref_code, _ in placing})
+    if new_refs:
+        cur.execute("""
+            SELECT DISTINCT ec.id, ec.framework_id, ec.ref_code, ec.parent_id
+            FROM unnest(%s::uuid[], %s::bytea[]) AS t(framework_id, prefix)
+            JOIN external_controls ec
+              ON ec.framework_id = t.framework_id
+             AND ec.sort_key > t.prefix
+             AND ec.sort_key < t.prefix || '\\xff'::bytea
+        """, ([framework_id for framework_id, _ in new_refs],
+              [control_tree.sort_key(ref_code) for _, ref_code in new_refs]))
+        queued = {str(control_id) for control_id, _, _, _ in placing}
+        new_by_framework: Dict[str, Set[str]] = {}
+        for framework_id, ref_code in new_refs:
+            new_by_framework.setdefault(framework_id, set()).add(ref_code)
+        for control_id, framework_id, ref_code, parent_id in cur.fetchall():
+            framework_id = str(framework_id)
+            if str(control_id) in queued:
+                continue
+            if new_by_framework[framework_id].intersection(compile_rules(entries[framework_id]).ancestors(ref_code)):
+                placing.append((control_id, framework_id, ref_code, parent_id))
+                queued.add(str(control_id))
+        # Everything being placed is a candidate parent for the rest
+        existing.update(((framework_id, ref_code), control_id) for control_id, framework_id, ref_code, _ in placing)
+
+    updates = []
+    touched_parents = set()
+    for control_id, framework_id, ref_code, current_parent in placing:
+        compiled = compile_rules(entries[framework_id])
+        is_root, _ = compiled.resolve(ref_code)
+        if is_root:
+            parent_id = None
+        else:
+            parent_id = next((existing[(framework_id, a)] for a in compiled.ancestors(ref_code)
+                              if (framework_id, a) in existing), None)
+            if parent_id is None:
+                continue
+        if parent_id != current_parent or parent_id_source:
+            updates.append((control_id, parent_id) + ((parent_id_source,) if parent_id_source else ()))
+            touched_parents.update(p for p in (parent_id, current_parent) if p is not None)
+
+    columns = {"parent_id": "uuid"}
+    if parent_id_source:
+        columns["parent_id_source"] = "varchar(32)"
+    stats["reparented"] = grc_db.bulk_update(cur, "external_controls", columns, updates)
+
+    # Only these rows can have gained or lost children
+    placed = {str(control_id) for control_id, _, _, _ in placing}
+    cur.execute(MAINTAIN_LEVELS_SQL, (sorted(placed | set(ids) | {str(p) for p in touched_parents}),))
+    stats["levels"] = cur.rowcount
+
+    control_tree.update_closure(cur, placed | set(ids))
+    if reorder:
+        stats["reordered"] = control_tree.renumber(conn, {str(framework_id) for _, framework_id, _, _, _, _ in changed})
+    return stats
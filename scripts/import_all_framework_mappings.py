@@ -4,25 +4,20 @@ Import all SCF control mappings from the Excel file to the database.
 Handles multiple frameworks with hierarchy tracking.
 """
 
-import openpyxl
-import psycopg2
 import psycopg2.extras
-import json
 import sys
 import re
 from typing import Dict, List, Tuple, Optional
 
-# Database connection
-DB_CONFIG = {
-    'host': '127.0.0.1',
-    'port': 54322,
-    'database': 'postgres',
-    'user': 'postgres',
-    'password': 'postgres'
-}
+import grc_db
+import scf_snapshot
+from scf_headers import load_header_index
+from external_controls import resolve_external_controls
 
 # Major framework definitions
 # Format: 'Framework Name': (column_index, code, version, name)
+# column_index is only a fallback: resolve_framework_columns() locates the
+# column by header so inserted SCF columns don't shift mappings silently.
 FRAMEWORKS = {
     # Already imported
     # 'NIST CSF v2.0': (93, 'NIST-CSF', '2.0', 'NIST Cybersecurity Framework'),
@@ -89,8 +84,8 @@ FRAMEWORKS = {
 }
 
 def connect_db():
-    """Create database connection with autocommit."""
-    conn = psycopg2.connect(**DB_CONFIG)
+    """Borrow a pooled connection with autocommit; hand it back with grc_db.release()."""
+    conn = grc_db.acquire()
     conn.autocommit = True
     return conn
 
@@ -161,14 +156,9 @@ def parse_control_reference(ref_code: str) -> Dict[str, str]:
 def get_or_create_framework(cur, code: str, version: str, name: str) -> str:
     """Get existing framework or create new one."""
     # Check if exists
-    cur.execute("""
-        SELECT id FROM frameworks 
-        WHERE code = %s AND version = %s;
-    """, (code, version))
-    
-    result = cur.fetchone()
-    if result:
-        return result[0]
+    framework_id = grc_db.fetch_value(cur, "framework_id_by_version", (code, version))
+    if framework_id:
+        return framework_id
     
     # Create new framework
     cur.execute("""
@@ -179,18 +169,8 @@ def get_or_create_framework(cur, code: str, version: str, name: str) -> str:
     
     return cur.fetchone()[0]
 
-def get_or_create_external_control(cur, framework_id: str, ref_code: str, hierarchy: Dict) -> str:
-    """Get or create an external control entry (including categories/subcategories)."""
-    # Check if exists
-    cur.execute("""
-        SELECT id FROM external_controls
-        WHERE framework_id = %s AND ref_code = %s;
-    """, (framework_id, ref_code))
-    
-    result = cur.fetchone()
-    if result:
-        return result[0]
-    
+def external_control_fields(ref_code: str, hierarchy: Dict) -> Tuple[str, Dict]:
+    """Description and metadata for a new external control (including categories/subcategories)."""
     # Create description based on level
     level = hierarchy['level']
     if level == 'category':
@@ -207,14 +187,7 @@ def get_or_create_external_control(cur, framework_id: str, ref_code: str, hierar
     }
     metadata.update({k: v for k, v in hierarchy.items() if k not in ['level', 'full_ref'] and v is not None})
     
-    # Insert
-    cur.execute("""
-        INSERT INTO external_controls (framework_id, ref_code, description, metadata)
-        VALUES (%s, %s, %s, %s::jsonb)
-        RETURNING id;
-    """, (framework_id, ref_code, description, json.dumps(metadata)))
-    
-    return cur.fetchone()[0]
+    return description, metadata
 
 def determine_mapping_strength(framework_name: str) -> str:
     """Determine mapping strength based on framework name."""
@@ -222,9 +195,60 @@ def determine_mapping_strength(framework_name: str) -> str:
         return 'partial'
     return 'exact'
 
-def import_framework(ws, framework_display_name: str, column_index: int, 
+def resolve_framework_columns(cur, header_index, frameworks: Dict[str, Tuple]) -> Dict[str, Tuple]:
+    """
+    Resolve each framework's column by header instead of trusting the hardcoded index.
+
+    Tries frameworks.mapping_column_header for (code, version) first, then the
+    display name (exact/normalized only). Falls back to the hardcoded column
+    with a warning when neither resolves; a fuzzy candidate is only reported,
+    since near-miss headers usually name a sibling framework's column.
+    """
+    resolved = {}
+    for display_name, (col_idx, code, version, name) in frameworks.items():
+        mapping_header = grc_db.fetch_value(cur, "framework_mapping_header", (code, version))
+
+        column, method = header_index.lookup(mapping_header, fuzzy=False) if mapping_header else (None, None)
+        if column is None:
+            column, method = header_index.lookup(display_name, fuzzy=False)
+
+        if column is None:
+            print(f"  ⚠ {display_name}: no matching header, using hardcoded column {col_idx} "
+                  f"('{header_index.header(col_idx)}')")
+            candidate, _ = header_index.lookup(mapping_header or display_name)
+            if candidate is not None and candidate != col_idx:
+                print(f"    closest header is column {candidate} ('{header_index.header(candidate)}'); "
+                      f"not used without an exact mapping_column_header")
+            column = col_idx
+        elif column != col_idx:
+            print(f"  {display_name}: column {col_idx} -> {column} ({method} match on '{header_index.header(column)}')")
+
+        resolved[display_name] = (column, code, version, name)
+    return resolved
+
+def collect_framework_cells(ws, frameworks: Dict[str, Tuple]) -> Dict[str, List[Tuple[int, str, object]]]:
+    """
+    Stream the SCF sheet once and route each selected column to its framework.
+
+    Returns display name -> [(row_num, scf_control_ref, cell_value), ...] for every
+    row with an SCF # (column 3), replacing one random-access scan per framework.
+    """
+    accumulators = {display_name: [] for display_name in frameworks}
+    routes = [(display_name, col_idx - 1) for display_name, (col_idx, *_) in frameworks.items()]
+
+    for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+        scf_control_ref = row[2] if len(row) > 2 else None  # Column 3: SCF #
+        if not scf_control_ref:
+            continue
+        for display_name, offset in routes:
+            value = row[offset] if offset < len(row) else None
+            accumulators[display_name].append((row_num, scf_control_ref, value))
+
+    return accumulators
+
+def import_framework(cells: List[Tuple[int, str, object]], framework_display_name: str, column_index: int,
                      framework_code: str, framework_version: str, framework_name: str):
-    """Import mappings for a specific framework."""
+    """Import mappings for a specific framework from its pre-routed column cells."""
     
     print(f"\n{'='*70}")
     print(f"Importing: {framework_display_name}")
@@ -239,12 +263,7 @@ def import_framework(ws, framework_display_name: str, column_index: int,
         print(f"Framework ID: {framework_id}")
         
         # Check if already imported
-        cur.execute("""
-            SELECT COUNT(*) FROM scf_control_mappings
-            WHERE framework_id = %s;
-        """, (framework_id,))
-        
-        existing_count = cur.fetchone()[0]
+        existing_count = grc_db.fetch_value(cur, "framework_mapping_count", (framework_id,))
         if existing_count > 0:
             print(f"⚠ Already has {existing_count} mappings, skipping...")
             return
@@ -252,9 +271,6 @@ def import_framework(ws, framework_display_name: str, column_index: int,
         # Determine mapping strength
         default_strength = determine_mapping_strength(framework_display_name)
         
-        # Cache for external control IDs
-        external_control_cache = {}
-        
         # Statistics
         stats = {
             'scf_controls_processed': 0,
@@ -268,27 +284,19 @@ def import_framework(ws, framework_display_name: str, column_index: int,
         
         print("Processing mappings...")
         
-        # Process each SCF control
-        for row_num in range(2, ws.max_row + 1):
-            scf_control_ref = ws.cell(row_num, 3).value  # Column 3: SCF #
-            framework_mappings = ws.cell(row_num, column_index).value
-            
-            if not scf_control_ref:
-                continue
-            
+        # SCF control IDs, loaded once instead of one SELECT per row
+        cur.execute("SELECT control_id, id FROM scf_controls;")
+        scf_control_ids = {row[0]: row[1] for row in cur.fetchall()}
+        
+        # Parse every ref first: (scf_control_id, mapping_ref, hierarchy)
+        parsed = []
+        for row_num, scf_control_ref, framework_mappings in cells:
             stats['scf_controls_processed'] += 1
             
-            # Get SCF control ID
-            cur.execute("""
-                SELECT id FROM scf_controls WHERE control_id = %s;
-            """, (scf_control_ref,))
-            
-            scf_result = cur.fetchone()
-            if not scf_result:
+            scf_control_id = scf_control_ids.get(scf_control_ref)
+            if not scf_control_id:
                 continue
             
-            scf_control_id = scf_result[0]
-            
             # Skip if no mappings
             if not framework_mappings:
                 continue
@@ -304,59 +312,52 @@ def import_framework(ws, framework_display_name: str, column_index: int,
                     continue
                 
                 try:
-                    # Parse the reference
-                    hierarchy = parse_control_reference(mapping_ref)
-                    
-                    # Get or create external control
-                    if mapping_ref in external_control_cache:
-                        external_control_id = external_control_cache[mapping_ref]
-                    else:
-                        external_control_id = get_or_create_external_control(
-                            cur, framework_id, mapping_ref, hierarchy
-                        )
-                        external_control_cache[mapping_ref] = external_control_id
-                    
-                    # Create mapping notes
-                    notes = f"Mapping Level: {hierarchy['level']}"
-                    for key, value in hierarchy.items():
-                        if key not in ['level', 'full_ref'] and value is not None:
-                            notes += f" | {key}: {value}"
-                    
-                    # Check if mapping already exists
-                    cur.execute("""
-                        SELECT id FROM scf_control_mappings
-                        WHERE scf_control_id = %s AND external_control_id = %s;
-                    """, (scf_control_id, external_control_id))
-                    
-                    if cur.fetchone():
-                        continue
-                    
-                    # Insert mapping
-                    cur.execute("""
-                        INSERT INTO scf_control_mappings 
-                        (scf_control_id, external_control_id, framework_id, mapping_strength, confidence, notes)
-                        VALUES (%s, %s, %s, %s, 95, %s);
-                    """, (scf_control_id, external_control_id, framework_id, default_strength, notes))
-                    
-                    stats['total_mappings_created'] += 1
-                    
-                    # Track by level
-                    if hierarchy['level'] == 'category':
-                        stats['category_mappings'] += 1
-                    elif hierarchy['level'] == 'subcategory':
-                        stats['subcategory_mappings'] += 1
-                    else:
-                        stats['control_mappings'] += 1
-                    
+                    parsed.append((scf_control_id, mapping_ref, parse_control_reference(mapping_ref)))
                 except Exception as e:
                     stats['errors'] += 1
                     if stats['errors'] <= 5:  # Only print first 5 errors
                         print(f"  ERROR: {scf_control_ref} -> {mapping_ref}: {e}")
-                    continue
+        
+        # Get or create all external controls in one batch
+        external_control_ids = resolve_external_controls(cur, (
+            (framework_id, mapping_ref, *external_control_fields(mapping_ref, hierarchy))
+            for _, mapping_ref, hierarchy in parsed
+        ))
+        
+        rows = []
+        level_by_control = {}
+        for scf_control_id, mapping_ref, hierarchy in parsed:
+            external_control_id = external_control_ids[(str(framework_id), mapping_ref)]
+            level_by_control[external_control_id] = hierarchy['level']
+            
+            # Create mapping notes
+            notes = f"Mapping Level: {hierarchy['level']}"
+            for key, value in hierarchy.items():
+                if key not in ['level', 'full_ref'] and value is not None:
+                    notes += f" | {key}: {value}"
+            
+            rows.append((scf_control_id, external_control_id, framework_id, default_strength, notes))
+        
+        # Insert mappings; existing (scf_control_id, external_control_id) pairs are skipped
+        created = psycopg2.extras.execute_values(cur, """
+            INSERT INTO scf_control_mappings 
+            (scf_control_id, external_control_id, framework_id, mapping_strength, confidence, notes)
+            VALUES %s
+            ON CONFLICT (scf_control_id, external_control_id) DO NOTHING
+            RETURNING external_control_id;
+        """, rows, template="(%s, %s, %s, %s, 95, %s)", fetch=True)
+        
+        for (external_control_id,) in created:
+            stats['total_mappings_created'] += 1
             
-            # Progress indicator
-            if row_num % 500 == 0:
-                print(f"  Processed {row_num - 1} rows...")
+            # Track by level
+            level = level_by_control[external_control_id]
+            if level == 'category':
+                stats['category_mappings'] += 1
+            elif level == 'subcategory':
+                stats['subcategory_mappings'] += 1
+            else:
+                stats['control_mappings'] += 1
         
         # Print statistics
         print(f"\n{'Results:':40}")
@@ -375,7 +376,7 @@ def import_framework(ws, framework_display_name: str, column_index: int,
         print(f"✗ FAILED: {e}")
     finally:
         cur.close()
-        conn.close()
+        grc_db.release(conn)
 
 def main():
     """Import all frameworks."""
@@ -386,16 +387,26 @@ def main():
     print("="*70)
     print(f"\nLoading Excel file: {excel_path}")
     
-    wb = openpyxl.load_workbook(excel_path, data_only=True)
+    wb = scf_snapshot.load_workbook(excel_path)
     ws = wb['SCF 2025.3.1']
     
-    print(f"Found {len(FRAMEWORKS)} frameworks to import\n")
+    print(f"Found {len(FRAMEWORKS)} frameworks to import")
     
-    # Import each framework
-    for display_name, (col_idx, code, version, name) in FRAMEWORKS.items():
-        import_framework(ws, display_name, col_idx, code, version, name)
+    # Resolve columns by header so SCF column insertions don't break mappings
+    conn = connect_db()
+    cur = conn.cursor()
+    frameworks = resolve_framework_columns(cur, load_header_index(excel_path), FRAMEWORKS)
+    cur.close()
+    grc_db.release(conn)
     
+    # One sequential scan fans every framework column out to its accumulator
+    cells_by_framework = collect_framework_cells(ws, frameworks)
     wb.close()
+    print(f"Routed {len(frameworks)} framework columns in a single pass\n")
+    
+    # Import each framework
+    for display_name, (col_idx, code, version, name) in frameworks.items():
+        import_framework(cells_by_framework[display_name], display_name, col_idx, code, version, name)
     
     print("\n" + "="*70)
     print("ALL IMPORTS COMPLETE")
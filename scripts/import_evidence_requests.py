@@ -5,19 +5,10 @@ Import Evidence Request List from SCF Excel file into GRC Platform database.
 """
 
 import openpyxl
-import psycopg2
+import grc_db
 from psycopg2.extras import execute_values
 import sys
 
-# Database connection
-DB_CONFIG = {
-    'host': 'localhost',
-    'port': 54322,
-    'database': 'postgres',
-    'user': 'postgres',
-    'password': 'postgres'
-}
-
 EXCEL_PATH = '/app/reference_material/secure-controls-framework-scf-2025-3-1 (1).xlsx'
 SHEET_NAME = 'Evidence Request List 2025.3.1'
 
@@ -52,7 +43,7 @@ def import_evidence_requests():
     ws = wb[SHEET_NAME]
 
     print("Connecting to database...")
-    conn = psycopg2.connect(**DB_CONFIG)
+    conn = grc_db.connect()
     cursor = conn.cursor()
 
     try:
@@ -1,34 +1,19 @@
 import os
 from typing import Any, Dict, List, Tuple
 
-import openpyxl
-import psycopg2
+import grc_db
+from psycopg2.extras import execute_values
+
+import scf_snapshot
+from external_controls import resolve_external_controls
+from hierarchy_rules import maintain_hierarchy
+from scf_headers import load_header_index, normalize_header
 
 
 EXCEL_PATH = os.path.join(os.path.dirname(__file__), "..", "reference_material", "secure-controls-framework-scf-2025-3-1 (1).xlsx")
 SCF_SHEET_NAME = "SCF 2025.3.1"
 
 
-def normalize_header(value: Any) -> str:
-    if value is None:
-        return ""
-    if not isinstance(value, str):
-        value = str(value)
-    value = value.replace("\n", " ").replace("\r", " ").replace("\t", " ")
-    value = " ".join(value.split())
-    return value.strip()
-
-
-def get_db_connection():
-    return psycopg2.connect(
-        dbname=os.getenv("SUPABASE_DB_NAME", "postgres"),
-        user=os.getenv("SUPABASE_DB_USER", "postgres"),
-        password=os.getenv("SUPABASE_DB_PASSWORD", "postgres"),
-        host=os.getenv("SUPABASE_DB_HOST", "127.0.0.1"),
-        port=int(os.getenv("SUPABASE_DB_PORT", "54322")),
-    )
-
-
 def load_scf_controls(conn) -> Dict[int, str]:
     """Return mapping of SCF Excel row index -> scf_controls.id via SCF # (column C).
 
@@ -40,12 +25,12 @@ def load_scf_controls(conn) -> Dict[int, str]:
         rows = cur.fetchall()
     by_control_id = {control_id: scf_id for scf_id, control_id in rows}
 
-    wb = openpyxl.load_workbook(EXCEL_PATH, read_only=True, data_only=True)
+    wb = scf_snapshot.load_workbook(EXCEL_PATH)
     sheet = wb[SCF_SHEET_NAME]
     mapping: Dict[int, str] = {}
-    for row_idx in range(2, sheet.max_row + 1):
-        control_cell = sheet.cell(row=row_idx, column=3)  # column C: SCF #
-        control_id = (control_cell.value or "").strip() if isinstance(control_cell.value, str) else control_cell.value
+    for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
+        value = row[2] if len(row) > 2 else None  # column C: SCF #
+        control_id = (value or "").strip() if isinstance(value, str) else value
         if not control_id:
             continue
         scf_id = by_control_id.get(control_id)
@@ -58,18 +43,12 @@ def load_scf_controls(conn) -> Dict[int, str]:
 def load_frameworks_needing_mappings(conn) -> List[Tuple[str, str, int]]:
     """Return list of (framework_id, mapping_column_header, column_index) for frameworks with 0 mappings.
 
-    Column index is determined by matching normalized mapping_column_header against Excel headers.
+    Column index is resolved from mapping_column_header via the cached header index
+    (exact or normalized match only). A fuzzy candidate is reported but not
+    imported: near-miss headers (CMMC Level 1 vs Level 2) belong to sibling
+    frameworks.
     """
-    # First, collect Excel headers by normalized text -> column index
-    wb = openpyxl.load_workbook(EXCEL_PATH, read_only=True, data_only=True)
-    sheet = wb[SCF_SHEET_NAME]
-    excel_headers: Dict[str, int] = {}
-    for col_idx in range(29, 274):
-        cell = sheet.cell(row=1, column=col_idx)
-        norm = normalize_header(cell.value)
-        if norm and norm not in excel_headers:
-            excel_headers[norm] = col_idx
-    wb.close()
+    header_index = load_header_index(EXCEL_PATH, SCF_SHEET_NAME)
 
     with conn.cursor() as cur:
         cur.execute(
@@ -88,78 +67,86 @@ def load_frameworks_needing_mappings(conn) -> List[Tuple[str, str, int]]:
         if mapping_count > 0:
             continue
         norm_header = normalize_header(header)
-        col_idx = excel_headers.get(norm_header)
+        col_idx, _ = header_index.lookup(header, fuzzy=False)
         if not col_idx:
             # No corresponding Excel column; skip
+            candidate, _ = header_index.lookup(header)
+            if candidate:
+                print(f"  No Excel column for framework header '{norm_header}' (closest: column {candidate} "
+                      f"'{header_index.header(candidate)}'; update mapping_column_header to import it)")
+            else:
+                print(f"  No Excel column for framework header '{norm_header}'")
             continue
         result.append((framework_id, norm_header, col_idx))
     return result
 
 
-def ensure_external_control(conn, framework_id: str, ref_code: str) -> str:
-    """Get or create an external_controls row and return its id."""
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT id FROM external_controls
-            WHERE framework_id = %s AND ref_code = %s
-            """,
-            (framework_id, ref_code),
-        )
-        row = cur.fetchone()
-        if row:
-            return row[0]
+def collect_framework_columns(col_indices: List[int], scf_row_to_id: Dict[int, str]) -> Dict[int, Dict[int, Any]]:
+    """Stream the SCF sheet once and fan the selected columns out per framework.
 
-        cur.execute(
-            """
-            INSERT INTO external_controls (framework_id, ref_code, description)
-            VALUES (%s, %s, %s)
-            RETURNING id
-            """,
-            (framework_id, ref_code, f"External control {ref_code}"),
-        )
-        new_id = cur.fetchone()[0]
-        return new_id
+    Returns column index -> {Excel row index -> cell value} for the rows that
+    map to an scf_controls record, so each framework import reads from memory
+    instead of reopening the workbook and doing random-access cell() lookups.
+    """
+    accumulators: Dict[int, Dict[int, Any]] = {col_idx: {} for col_idx in col_indices}
+    wb = scf_snapshot.load_workbook(EXCEL_PATH)
+    sheet = wb[SCF_SHEET_NAME]
+    for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
+        if row_idx not in scf_row_to_id:
+            continue
+        for col_idx, values in accumulators.items():
+            if col_idx <= len(row):
+                values[row_idx] = row[col_idx - 1]
+    wb.close()
+    return accumulators
 
 
-def import_mappings_for_framework(conn, framework_id: str, header: str, col_idx: int, scf_row_to_id: Dict[int, str]) -> int:
-    wb = openpyxl.load_workbook(EXCEL_PATH, read_only=True, data_only=True)
-    sheet = wb[SCF_SHEET_NAME]
+def import_mappings_for_framework(conn, framework_id: str, header: str, column_values: Dict[int, Any], scf_row_to_id: Dict[int, str]) -> int:
+    pairs: List[Tuple[str, str]] = []
+    for row_idx, scf_id in scf_row_to_id.items():
+        value = column_values.get(row_idx)
+        if not value:
+            continue
+        if isinstance(value, str):
+            ref = value.strip()
+        else:
+            ref = str(value).strip()
+        if not ref:
+            continue
+        pairs.append((scf_id, ref))
+
+    if not pairs:
+        return 0
 
-    created_mappings = 0
     with conn.cursor() as cur:
-        for row_idx, scf_id in scf_row_to_id.items():
-            cell = sheet.cell(row=row_idx, column=col_idx)
-            value = cell.value
-            if not value:
-                continue
-            if isinstance(value, str):
-                ref = value.strip()
-            else:
-                ref = str(value).strip()
-            if not ref:
-                continue
-
-            external_id = ensure_external_control(conn, framework_id, ref)
-
-            cur.execute(
-                """
-                INSERT INTO scf_control_mappings (scf_control_id, external_control_id, framework_id)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (scf_control_id, external_control_id, framework_id) DO NOTHING
-                """,
-                (scf_id, external_id, framework_id),
-            )
-            if cur.rowcount > 0:
-                created_mappings += 1
+        # One round trip resolves (and creates) every external control in the column
+        new_controls = set()
+        external_ids = resolve_external_controls(cur, ((framework_id, ref, None, None) for _, ref in pairs),
+                                                 created=new_controls)
+        key_framework = str(framework_id)
+        created = execute_values(
+            cur,
+            """
+            INSERT INTO scf_control_mappings (scf_control_id, external_control_id, framework_id)
+            VALUES %s
+            ON CONFLICT (scf_control_id, external_control_id, framework_id) DO NOTHING
+            RETURNING id
+            """,
+            [(scf_id, external_ids[(key_framework, ref)], framework_id) for scf_id, ref in pairs],
+            fetch=True,
+        )
 
-    wb.close()
-    return created_mappings
+    if new_controls:
+        # Place only the new controls instead of rerunning the full hierarchy fix
+        hierarchy = maintain_hierarchy(conn, new_controls)
+        print(f"Placed {len(new_controls)} new external controls "
+              f"({hierarchy['groups_created']} groups created, {hierarchy['reparented']} parents set).")
+    return len(created)
 
 
 def main() -> None:
     print("Connecting to database...")
-    conn = get_db_connection()
+    conn = grc_db.connect()
     conn.autocommit = False
     try:
         print("Loading SCF control row mapping (Excel row -> scf_controls.id)...")
@@ -170,10 +157,13 @@ def main() -> None:
         frameworks = load_frameworks_needing_mappings(conn)
         print(f"Frameworks with zero mappings and a matching Excel column: {len(frameworks)}")
 
+        print("Streaming SCF sheet once for all selected framework columns...")
+        columns = collect_framework_columns([col_idx for _, _, col_idx in frameworks], scf_row_to_id)
+
         total_created = 0
         for framework_id, header, col_idx in frameworks:
             print(f"\nImporting mappings for framework header '{header}' (column {col_idx})...")
-            created = import_mappings_for_framework(conn, framework_id, header, col_idx, scf_row_to_id)
+            created = import_mappings_for_framework(conn, framework_id, header, columns[col_idx], scf_row_to_id)
             print(f"Created {created} new scf_control_mappings rows for '{header}'.")
             total_created += created
 
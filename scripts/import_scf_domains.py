@@ -19,7 +19,7 @@ from pathlib import Path
 
 try:
     import openpyxl
-    import psycopg2
+    import grc_db
     from psycopg2.extras import execute_values
 except ImportError as e:
     print(f"Missing dependency: {e}")
@@ -27,15 +27,6 @@ except ImportError as e:
     exit(1)
 
 
-# Database connection settings (Supabase local dev)
-DB_CONFIG = {
-    "host": "127.0.0.1",
-    "port": 54322,
-    "database": "postgres",
-    "user": "postgres",
-    "password": "postgres"
-}
-
 # Excel file path
 EXCEL_FILE = Path(__file__).parent.parent / "reference_material" / "secure-controls-framework-scf-2025-3-1 (1).xlsx"
 SHEET_NAME = "SCF Domains & Principles"
@@ -166,8 +157,8 @@ def main():
         print(f"  ... and {len(domains) - 5} more")
 
     # Connect to database
-    print(f"\nConnecting to database at {DB_CONFIG['host']}:{DB_CONFIG['port']}...")
-    conn = psycopg2.connect(**DB_CONFIG)
+    print(f"\nConnecting to database at {grc_db.describe()}...")
+    conn = grc_db.connect()
     cursor = conn.cursor()
 
     try:
@@ -5,22 +5,12 @@ Handles both category-level and control-level mappings with hierarchy tracking.
 """
 
 import openpyxl
-import psycopg2
-import psycopg2.extras
+import grc_db
 import json
 import sys
 import re
 from typing import Dict, List, Tuple, Optional
 
-# Database connection
-DB_CONFIG = {
-    'host': '127.0.0.1',
-    'port': 54322,
-    'database': 'postgres',
-    'user': 'postgres',
-    'password': 'postgres'
-}
-
 # Framework column mappings in Excel
 FRAMEWORK_COLUMNS = {
     'NIST CSF v2.0': 93,
@@ -29,7 +19,7 @@ FRAMEWORK_COLUMNS = {
 
 def connect_db():
     """Create database connection with autocommit."""
-    conn = psycopg2.connect(**DB_CONFIG)
+    conn = grc_db.connect()
     conn.autocommit = True
     return conn
 
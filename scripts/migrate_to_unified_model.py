@@ -6,32 +6,23 @@ This script:
 1. Copies SCF controls from scf_controls to external_controls
 2. Migrates mappings from scf_control_mappings to framework_crosswalks
 3. Optionally imports NIST CSF v2.0 mappings
+4. Repoints risk/threat control links at external_controls
+5. Refreshes framework_pair_overlap for frameworks whose crosswalks changed
+
+Steps 1, 2 and 4 are single set-based statements; steps 2 and 4 join
+through the scf_id_map temp table (scf_controls.id -> external_controls.id).
+Each step commits with its checkpoint in import_runs, so rerunning after a
+failure resumes at the first unfinished step (--restart runs them all).
 """
 
-import psycopg2
-import json
+import grc_db
 import sys
+from framework_overlap import refresh_overlap
 from datetime import datetime
-from decimal import Decimal
-
-class DecimalEncoder(json.JSONEncoder):
-    """JSON encoder that handles Decimal objects."""
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        return super().default(obj)
-
-DB_CONFIG = {
-    'host': '127.0.0.1',
-    'port': 54322,
-    'database': 'postgres',
-    'user': 'postgres',
-    'password': 'postgres'
-}
 
 def connect_db():
     """Create database connection."""
-    conn = psycopg2.connect(**DB_CONFIG)
+    conn = grc_db.connect()
     conn.autocommit = False  # Use transactions
     return conn
 
@@ -63,134 +54,77 @@ def step1_migrate_scf_to_external_controls(conn):
         print("Skipping - already migrated")
         return True
 
-    # Get all SCF controls from scf_controls table
+    # Domain parent entries first, ordered by name
     cur.execute("""
-        SELECT id, control_id, title, description, domain, weight,
-               applicability_people, applicability_processes, applicability_technology,
-               applicability_data, applicability_facilities,
-               nist_csf, nist_800_53, iso_27001, iso_27002, pci_dss,
-               hipaa, gdpr, sox, cobit, cis_controls, ccm,
-               scrm_tier1, scrm_tier2, scrm_tier3, errata_notes
-        FROM scf_controls
-        ORDER BY control_id
-    """)
-    scf_controls = cur.fetchall()
-    print(f"Found {len(scf_controls)} SCF controls to migrate")
-
-    # Group controls by domain for parent hierarchy
-    domains = {}
-    controls_by_parent = {}
-
-    for row in scf_controls:
-        (id, control_id, title, description, domain, weight,
-         people, processes, technology, data, facilities,
-         nist_csf, nist_800_53, iso_27001, iso_27002, pci_dss,
-         hipaa, gdpr, sox, cobit, cis_controls, ccm,
-         scrm_tier1, scrm_tier2, scrm_tier3, errata_notes) = row
-
-        if domain not in domains:
-            domains[domain] = []
-        domains[domain].append(row)
-
-        # Check if this is a sub-control (e.g., AST-01.1)
-        if '.' in control_id:
-            parent_id = control_id.rsplit('.', 1)[0]
-            if parent_id not in controls_by_parent:
-                controls_by_parent[parent_id] = []
-            controls_by_parent[parent_id].append(row)
-
-    print(f"Found {len(domains)} domains")
-
-    # Create domain parent entries first
-    domain_ids = {}
-    display_order = 0
-
-    for domain_name in sorted(domains.keys()):
-        cur.execute("""
-            INSERT INTO external_controls
-            (framework_id, ref_code, title, description, metadata, is_group, hierarchy_level, display_order)
-            VALUES (%s, %s, %s, %s, %s::jsonb, true, 'domain', %s)
-            RETURNING id
-        """, (
-            scf_framework_id,
-            domain_name,
-            domain_name,
-            f"SCF Domain: {domain_name}",
-            json.dumps({'type': 'domain'}),
-            display_order
-        ))
-        domain_ids[domain_name] = cur.fetchone()[0]
-        display_order += 1
-
-    print(f"Created {len(domain_ids)} domain entries")
-
-    # Insert all controls with their domain parent
-    inserted = 0
-    control_id_map = {}  # Maps scf_controls.id -> external_controls.id
-
-    for row in scf_controls:
-        (id, control_id, title, description, domain, weight,
-         people, processes, technology, data, facilities,
-         nist_csf, nist_800_53, iso_27001, iso_27002, pci_dss,
-         hipaa, gdpr, sox, cobit, cis_controls, ccm,
-         scrm_tier1, scrm_tier2, scrm_tier3, errata_notes) = row
-
-        # Build metadata
-        metadata = {
-            'domain': domain,
-            'weight': weight,
-            'applicability': {
-                'people': people,
-                'processes': processes,
-                'technology': technology,
-                'data': data,
-                'facilities': facilities
-            },
-            'scrm': {
-                'tier1': scrm_tier1 or False,
-                'tier2': scrm_tier2 or False,
-                'tier3': scrm_tier3 or False
-            }
-        }
-        if errata_notes:
-            metadata['errata'] = errata_notes
-
-        # Determine parent - domain for now, could add parent control logic
-        parent_id = domain_ids.get(domain)
-
-        # Calculate display order within domain
-        domain_controls = domains.get(domain, [])
-        order_in_domain = next((i for i, c in enumerate(domain_controls) if c[1] == control_id), 0)
+        INSERT INTO external_controls
+        (framework_id, ref_code, title, description, metadata, is_group, hierarchy_level, display_order)
+        SELECT %s, domain, domain, 'SCF Domain: ' || domain, '{"type": "domain"}'::jsonb, true, 'domain',
+               ROW_NUMBER() OVER (ORDER BY domain) - 1
+        FROM (SELECT DISTINCT domain FROM scf_controls WHERE domain IS NOT NULL) d
+    """, (scf_framework_id,))
+    domain_count = cur.rowcount
+    print(f"Created {domain_count} domain entries")
 
-        cur.execute("""
-            INSERT INTO external_controls
-            (framework_id, ref_code, title, description, metadata, parent_id, hierarchy_level, display_order)
-            VALUES (%s, %s, %s, %s, %s::jsonb, %s, 'control', %s)
-            RETURNING id
-        """, (
-            scf_framework_id,
-            control_id,
-            title,
-            description,
-            json.dumps(metadata, cls=DecimalEncoder),
-            parent_id,
-            display_order + order_in_domain
-        ))
-
-        new_id = cur.fetchone()[0]
-        control_id_map[str(id)] = new_id
-        inserted += 1
-
-        if inserted % 200 == 0:
-            print(f"  Inserted {inserted} controls...")
+    # All controls in one statement: parent is the domain entry, display order
+    # follows the domain entries and counts up by control_id within each domain
+    cur.execute("""
+        INSERT INTO external_controls
+        (framework_id, ref_code, title, description, metadata, parent_id, hierarchy_level, display_order)
+        SELECT %(fw)s, sc.control_id, sc.title, sc.description,
+               jsonb_build_object(
+                   'domain', sc.domain,
+                   'weight', sc.weight,
+                   'applicability', jsonb_build_object(
+                       'people', sc.applicability_people,
+                       'processes', sc.applicability_processes,
+                       'technology', sc.applicability_technology,
+                       'data', sc.applicability_data,
+                       'facilities', sc.applicability_facilities
+                   ),
+                   'scrm', jsonb_build_object(
+                       'tier1', COALESCE(sc.scrm_tier1, false),
+                       'tier2', COALESCE(sc.scrm_tier2, false),
+                       'tier3', COALESCE(sc.scrm_tier3, false)
+                   )
+               ) || CASE WHEN NULLIF(sc.errata_notes, '') IS NOT NULL
+                         THEN jsonb_build_object('errata', sc.errata_notes)
+                         ELSE '{}'::jsonb END,
+               d.id, 'control',
+               %(domains)s + ROW_NUMBER() OVER (PARTITION BY sc.domain ORDER BY sc.control_id) - 1
+        FROM scf_controls sc
+        LEFT JOIN external_controls d
+          ON d.framework_id = %(fw)s AND d.ref_code = sc.domain AND d.hierarchy_level = 'domain'
+    """, {"fw": scf_framework_id, "domains": domain_count})
+    inserted = cur.rowcount
 
     conn.commit()
     print(f"✓ Migrated {inserted} SCF controls to external_controls")
+    return True
 
-    # Store mapping for step 2
-    return control_id_map
+def build_scf_id_map(conn):
+    """Temp table scf_id_map: scf_controls.id -> the SCF row in external_controls.
+
+    Steps 2 and 4 join against it instead of looking ids up per row. It is
+    a session temp table, so it survives the steps' commits.
+    """
+    cur = conn.cursor()
+    cur.execute("DROP TABLE IF EXISTS scf_id_map")
+    cur.execute("""
+        CREATE TEMP TABLE scf_id_map AS
+        SELECT DISTINCT ON (sc.id) sc.id AS scf_control_id, ec.id AS external_control_id
+        FROM scf_controls sc
+        JOIN frameworks f ON f.code = 'SCF'
+        JOIN external_controls ec ON ec.framework_id = f.id AND ec.ref_code = sc.control_id
+        ORDER BY sc.id
+    """)
+    count = cur.rowcount
+    cur.execute("ALTER TABLE scf_id_map ADD PRIMARY KEY (scf_control_id)")
+    cur.execute("ANALYZE scf_id_map")
+    conn.commit()
+    print(f"Mapped {count} SCF controls to external_controls")
+    return count
 
-def step2_migrate_mappings_to_crosswalks(conn, scf_control_map):
+def step2_migrate_mappings_to_crosswalks(conn):
     """Migrate scf_control_mappings to framework_crosswalks."""
     print("\n" + "=" * 70)
     print("STEP 2: Migrating mappings to framework_crosswalks")
@@ -211,90 +145,41 @@ def step2_migrate_mappings_to_crosswalks(conn, scf_control_map):
     cur.execute("SELECT id FROM frameworks WHERE code = 'SCF'")
     scf_framework_id = cur.fetchone()[0]
 
-    # Get all existing mappings from scf_control_mappings
     cur.execute("""
-        SELECT
-            m.id,
-            m.scf_control_id,
-            m.external_control_id,
-            m.framework_id,
-            m.mapping_strength,
-            m.confidence,
-            m.notes,
-            s.control_id as scf_ref,
-            e.ref_code as ext_ref
+        SELECT COUNT(*), COUNT(*) FILTER (WHERE map.scf_control_id IS NULL)
         FROM scf_control_mappings m
         JOIN scf_controls s ON m.scf_control_id = s.id
         JOIN external_controls e ON m.external_control_id = e.id
+        LEFT JOIN scf_id_map map ON map.scf_control_id = m.scf_control_id
     """)
-    mappings = cur.fetchall()
-    print(f"Found {len(mappings)} mappings to migrate")
+    total, errors = cur.fetchone()
+    print(f"Found {total} mappings to migrate")
 
-    if not mappings:
+    if not total:
         print("No mappings to migrate")
         return True
 
-    # Insert into framework_crosswalks
-    inserted = 0
-    errors = 0
-
-    for row in mappings:
-        (id, scf_control_id, ext_control_id, framework_id,
-         mapping_strength, confidence, notes, scf_ref, ext_ref) = row
-
-        # Get the new SCF control ID from external_controls
-        source_control_id = scf_control_map.get(str(scf_control_id))
-
-        if not source_control_id:
-            # Try to find by ref_code
-            cur.execute("""
-                SELECT id FROM external_controls
-                WHERE framework_id = %s AND ref_code = %s
-            """, (scf_framework_id, scf_ref))
-            result = cur.fetchone()
-            if result:
-                source_control_id = result[0]
-
-        if not source_control_id:
-            errors += 1
-            if errors <= 5:
-                print(f"  WARNING: Could not find SCF control {scf_ref}")
-            continue
-
-        try:
-            cur.execute("""
-                INSERT INTO framework_crosswalks
-                (source_framework_id, source_ref, source_control_id,
-                 target_framework_id, target_ref, target_control_id,
-                 mapping_strength, confidence, notes, mapping_origin)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'SCF')
-                ON CONFLICT (source_framework_id, source_ref, target_framework_id, target_ref)
-                DO NOTHING
-            """, (
-                scf_framework_id,
-                scf_ref,
-                source_control_id,
-                framework_id,
-                ext_ref,
-                ext_control_id,
-                mapping_strength or 'exact',
-                confidence or 95,
-                notes
-            ))
-            inserted += 1
-
-            if inserted % 2000 == 0:
-                print(f"  Inserted {inserted} crosswalks...")
-                conn.commit()
-        except Exception as e:
-            errors += 1
-            if errors <= 5:
-                print(f"  ERROR inserting crosswalk: {e}")
+    # One INSERT ... SELECT, joined through the id map
+    cur.execute("""
+        INSERT INTO framework_crosswalks
+        (source_framework_id, source_ref, source_control_id,
+         target_framework_id, target_ref, target_control_id,
+         mapping_strength, confidence, notes, mapping_origin)
+        SELECT %s, s.control_id, map.external_control_id,
+               m.framework_id, e.ref_code, m.external_control_id,
+               COALESCE(m.mapping_strength, 'exact'), COALESCE(m.confidence, 95), m.notes, 'SCF'
+        FROM scf_control_mappings m
+        JOIN scf_controls s ON m.scf_control_id = s.id
+        JOIN external_controls e ON m.external_control_id = e.id
+        JOIN scf_id_map map ON map.scf_control_id = m.scf_control_id
+        ON CONFLICT (source_framework_id, source_ref, target_framework_id, target_ref) DO NOTHING
+    """, (scf_framework_id,))
+    inserted = cur.rowcount
 
     conn.commit()
     print(f"✓ Migrated {inserted} mappings to framework_crosswalks")
     if errors > 0:
-        print(f"  Skipped {errors} mappings due to errors")
+        print(f"  Skipped {errors} mappings with no SCF control")
 
     return True
 
@@ -402,47 +287,19 @@ def step4_update_risk_threat_links(conn):
     print(f"Threat controls linked to external_controls: {threat_ec_count}")
     print(f"Threat controls linked to scf_controls: {threat_scf_count}")
 
-    # If links are to scf_controls, we need to update them
+    # If links are to scf_controls, repoint them with one UPDATE per table
     if risk_scf_count > 0 or threat_scf_count > 0:
         print("Need to update control links...")
 
-        # Get SCF framework ID
-        cur.execute("SELECT id FROM frameworks WHERE code = 'SCF'")
-        scf_framework_id = cur.fetchone()[0]
-
-        # Build mapping from scf_controls.control_id to external_controls.id
-        cur.execute("""
-            SELECT sc.id as scf_uuid, ec.id as ec_uuid
-            FROM scf_controls sc
-            JOIN external_controls ec ON ec.ref_code = sc.control_id AND ec.framework_id = %s
-        """, (scf_framework_id,))
-        control_map = {str(row[0]): row[1] for row in cur.fetchall()}
-
-        # Update risk_controls
-        if risk_scf_count > 0:
-            updated = 0
-            cur.execute("SELECT id, control_id FROM risk_controls")
-            for rc_id, ctrl_id in cur.fetchall():
-                new_ctrl_id = control_map.get(str(ctrl_id))
-                if new_ctrl_id:
-                    cur.execute("""
-                        UPDATE risk_controls SET control_id = %s WHERE id = %s
-                    """, (new_ctrl_id, rc_id))
-                    updated += 1
-            print(f"  Updated {updated} risk_controls links")
-
-        # Update threat_controls
-        if threat_scf_count > 0:
-            updated = 0
-            cur.execute("SELECT id, control_id FROM threat_controls")
-            for tc_id, ctrl_id in cur.fetchall():
-                new_ctrl_id = control_map.get(str(ctrl_id))
-                if new_ctrl_id:
-                    cur.execute("""
-                        UPDATE threat_controls SET control_id = %s WHERE id = %s
-                    """, (new_ctrl_id, tc_id))
-                    updated += 1
-            print(f"  Updated {updated} threat_controls links")
+        for table, count in (("risk_controls", risk_scf_count), ("threat_controls", threat_scf_count)):
+            if count > 0:
+                cur.execute(f"""
+                    UPDATE {table} t
+                    SET control_id = map.external_control_id
+                    FROM scf_id_map map
+                    WHERE t.control_id = map.scf_control_id
+                """)
+                print(f"  Updated {cur.rowcount} {table} links")
 
         conn.commit()
 
@@ -455,35 +312,40 @@ def main():
     print("=" * 70)
     print(f"Started: {datetime.now().isoformat()}")
 
+    run = None
     try:
         conn = connect_db()
 
-        # Step 1: Migrate SCF controls
-        scf_control_map = step1_migrate_scf_to_external_controls(conn)
-
-        if isinstance(scf_control_map, bool):
-            # Already migrated, need to rebuild map
-            cur = conn.cursor()
-            cur.execute("SELECT id FROM frameworks WHERE code = 'SCF'")
-            scf_framework_id = cur.fetchone()[0]
-
-            cur.execute("""
-                SELECT sc.id, ec.id
-                FROM scf_controls sc
-                JOIN external_controls ec ON ec.ref_code = sc.control_id
-                    AND ec.framework_id = %s
-            """, (scf_framework_id,))
-            scf_control_map = {str(row[0]): row[1] for row in cur.fetchall()}
-
-        # Step 2: Migrate mappings
-        step2_migrate_mappings_to_crosswalks(conn, scf_control_map)
-
-        # Step 3: Create NIST CSF v2.0
-        step3_import_nist_csf_v2(conn)
-
-        # Step 4: Update risk/threat links
-        step4_update_risk_threat_links(conn)
+        # Completed steps are recorded in import_runs; a rerun after a failure skips them
+        run = grc_db.ImportRun.start(conn, "migrate_to_unified_model", restart="--restart" in sys.argv[1:])
+        print(run.describe())
 
+        # Step 1: Migrate SCF controls
+        if not run.done("step1") and step1_migrate_scf_to_external_controls(conn):
+            run.complete("step1")
+
+        # scf_controls.id -> external_controls.id, shared by steps 2 and 4
+        build_scf_id_map(conn)
+
+        steps = [
+            ("step2", step2_migrate_mappings_to_crosswalks),  # Step 2: Migrate mappings
+            ("step3", step3_import_nist_csf_v2),              # Step 3: Create NIST CSF v2.0
+            ("step4", step4_update_risk_threat_links),        # Step 4: Update risk/threat links
+        ]
+        for stage, step in steps:
+            if run.done(stage):
+                print(f"\n{stage}: already completed by an earlier attempt")
+                continue
+            step(conn)
+            run.complete(stage)
+
+        # Recompute framework_pair_overlap for frameworks whose crosswalks changed
+        if not run.done("overlap"):
+            overlap = refresh_overlap(conn)
+            print(f"\nFramework overlap: {overlap['frameworks']} framework(s), {overlap['pairs']} pair rows")
+            run.complete("overlap")
+
+        run.finish()
         conn.close()
 
         print("\n" + "=" * 70)
@@ -495,6 +357,8 @@ def main():
         print(f"\nERROR: {e}")
         import traceback
         traceback.print_exc()
+        if run is not None:
+            run.fail(e)
         sys.exit(1)
 
 if __name__ == '__main__':
@@ -1,54 +1,59 @@
+"""
+Rebuild scf_control_mappings from the SCF workbook's framework mapping columns.
+
+By default the rebuild is incremental: every SCF row's parsed refs are hashed
+(see row_digest) and compared with the digests stored in scf_row_digests by
+the previous run. Only added, changed and removed rows have their mappings
+synced; unchanged rows are not touched at all. External controls left with
+no mappings (and no children) by a changed row are pruned once every row
+is synced, so a ref moving between rows keeps its control.
+
+--full rebuilds every mapping without blocking readers: external_controls
+is copied to external_controls_next (keeping ids), the workbook's mappings
+are loaded into an empty scf_control_mappings_next, both shadows are
+indexed, and then swapped in with a short rename transaction (see
+grc_db.shadow). Mappings for frameworks without a workbook column are
+carried over unchanged.
+
+Both modes commit in batches of BATCH_ROWS SCF rows and checkpoint in
+import_runs (grc_db.journal); after a failure, rerunning against the same
+workbook resumes from the last committed batch.
+
+Usage:
+    python scripts/rebuild_all_framework_mappings.py             # delta against last run
+    python scripts/rebuild_all_framework_mappings.py --full      # reimport into shadow tables and swap
+    python scripts/rebuild_all_framework_mappings.py --restart   # ignore an unfinished run's checkpoint
+"""
+
+import hashlib
 import os
-from typing import Any, Dict, List, Set
-import openpyxl
-import psycopg2
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import control_tree
+import grc_db
+from grc_db.shadow import old_name
+
+import scf_snapshot
+from scf_headers import load_header_index, normalize_header
+from scf_refs import split_column
+from bulk_copy import merge_rows
+from external_controls import resolve_external_controls
+from hierarchy_rules import maintain_hierarchy
 
 EXCEL_PATH = os.path.join(os.path.dirname(__file__), "..", "reference_material", "secure-controls-framework-scf-2025-3-1 (1).xlsx")
 SCF_SHEET_NAME = "SCF 2025.3.1"
 
+# Swapped together by --full; mappings reference external controls
+SWAP_TABLES = ["external_controls", "scf_control_mappings"]
+# SCF rows per committed, checkpointed batch
+BATCH_ROWS = 200
+
 # Columns: C = SCF # (control_id), mapping columns = AC (29) to NJ (274)
 SCF_ID_COL = 3
 MAPPING_COL_START = 29
 MAPPING_COL_END = 274
 
 
-def normalize_header(value: Any) -> str:
-    if value is None:
-        return ""
-    if not isinstance(value, str):
-        value = str(value)
-    value = value.replace("\n", " ").replace("\r", " ").replace("\t", " ")
-    value = " ".join(value.split())
-    return value.strip()
-
-
-def parse_refs(cell_value: Any) -> List[str]:
-    """Split a cell value into individual external control refs."""
-    if not cell_value:
-        return []
-    if isinstance(cell_value, str):
-        # Split on newlines, semicolons, and (optionally) commas
-        refs = []
-        for part in cell_value.replace("\r", "").split("\n"):
-            for subpart in part.split(";"):
-                for ref in subpart.split(","):
-                    ref = ref.strip()
-                    if ref:
-                        refs.append(ref)
-        return refs
-    return [str(cell_value).strip()]
-
-
-def get_db_connection():
-    return psycopg2.connect(
-        dbname=os.getenv("SUPABASE_DB_NAME", "postgres"),
-        user=os.getenv("SUPABASE_DB_USER", "postgres"),
-        password=os.getenv("SUPABASE_DB_PASSWORD", "postgres"),
-        host=os.getenv("SUPABASE_DB_HOST", "127.0.0.1"),
-        port=int(os.getenv("SUPABASE_DB_PORT", "54322")),
-    )
-
-
 def load_scf_controls(conn) -> Dict[str, str]:
     with conn.cursor() as cur:
         cur.execute("SELECT id, control_id FROM scf_controls;")
@@ -81,19 +86,280 @@ def load_frameworks_by_header(conn) -> Dict[str, Dict[str, Any]]:
     return result
 
 
+def collect_row_refs(sheet, col_to_framework: Dict[int, str],
+                     scf_controls: Dict[str, str]) -> Dict[str, Dict[str, List[str]]]:
+    """Return scf_control_id -> framework_id -> refs for every SCF row in the sheet."""
+    columns = [SCF_ID_COL - 1] + [col_idx - 1 for col_idx in col_to_framework]
+    scf_db_ids: List[str] = []
+    cells: Dict[int, List[Any]] = {col_idx: [] for col_idx in col_to_framework}
+    for row in sheet.iter_rows(min_row=2, values_only=True, columns=columns):
+        scf_id = row[SCF_ID_COL - 1] if len(row) >= SCF_ID_COL else None
+        scf_id = scf_id.strip() if isinstance(scf_id, str) else scf_id
+        scf_db_id = scf_controls.get(scf_id) if scf_id else None
+        if not scf_db_id:
+            continue
+        scf_db_ids.append(scf_db_id)
+        for col_idx, column in cells.items():
+            column.append(row[col_idx - 1] if col_idx - 1 < len(row) else None)
+
+    rows: Dict[str, Dict[str, List[str]]] = {scf_db_id: {} for scf_db_id in scf_db_ids}
+    for col_idx, framework_id in col_to_framework.items():
+        # Whole column at a time: (row position, ref) pairs
+        positions, refs = split_column(cells[col_idx])
+        for position, ref in zip(positions, refs):
+            rows[scf_db_ids[position]].setdefault(framework_id, []).append(ref)
+    return rows
+
+
+def row_digest(refs_by_framework: Dict[str, List[str]]) -> str:
+    """Hash a row's parsed refs, independent of cell formatting and ref order."""
+    h = hashlib.sha256()
+    for framework_id in sorted(refs_by_framework):
+        h.update(framework_id.encode())
+        for ref in sorted(set(refs_by_framework[framework_id])):
+            h.update(b"\x1f" + ref.encode())
+        h.update(b"\x1e")
+    return h.hexdigest()
+
+
+def load_row_digests(conn) -> Dict[str, str]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT scf_control_id, digest FROM scf_row_digests;")
+        return dict(cur.fetchall())
+
+
+def diff_rows(current: Dict[str, str], stored: Dict[str, str]) -> Tuple[Set[str], Set[str], Set[str]]:
+    """Three-way diff of row digests: (added, changed, removed) scf_control_ids."""
+    added = set(current) - set(stored)
+    removed = set(stored) - set(current)
+    changed = {scf_id for scf_id in set(current) & set(stored) if current[scf_id] != stored[scf_id]}
+    return added, changed, removed
+
+
+def sync_mappings(cur, row_refs: Dict[str, Dict[str, List[str]]], touched: Set[str],
+                  framework_ids: List[str], created: Optional[Set[str]] = None) -> Tuple[int, int, Set[str]]:
+    """Make the touched SCF rows' mappings match their refs; returns (inserted, deleted, orphan candidates).
+
+    Ids of external controls created along the way are added to created.
+
+    Set-based: one SELECT of the existing mappings, one DELETE of stale ones,
+    one batch external control resolve and one COPY-staged mapping merge.
+    """
+    cur.execute(
+        """
+        SELECT m.id, m.scf_control_id, m.framework_id, ec.ref_code, ec.id
+        FROM scf_control_mappings m
+        JOIN external_controls ec ON ec.id = m.external_control_id
+        WHERE m.scf_control_id = ANY(%s::uuid[]) AND m.framework_id = ANY(%s::uuid[])
+        """,
+        (list(touched), framework_ids),
+    )
+    existing = {(scf_db_id, framework_id, ref): (mapping_id, ext_id)
+                for mapping_id, scf_db_id, framework_id, ref, ext_id in cur.fetchall()}
+    wanted = {
+        (scf_db_id, framework_id, ref)
+        for scf_db_id in touched
+        for framework_id, refs in row_refs.get(scf_db_id, {}).items()
+        for ref in refs
+    }
+
+    stale = [existing[key] for key in existing.keys() - wanted]
+    if stale:
+        cur.execute("DELETE FROM scf_control_mappings WHERE id = ANY(%s::uuid[])", ([m for m, _ in stale],))
+
+    new = sorted(wanted - existing.keys())
+    if not new:
+        return 0, len(stale), {ext_id for _, ext_id in stale}
+
+    external_ids = resolve_external_controls(
+        cur, ((framework_id, ref, None, None) for _, framework_id, ref in new), created=created
+    )
+    inserted = merge_rows(
+        cur, "scf_control_mappings", ["scf_control_id", "external_control_id", "framework_id"],
+        ((scf_db_id, external_ids[(framework_id, ref)], framework_id) for scf_db_id, framework_id, ref in new),
+        on_conflict="(scf_control_id, external_control_id, framework_id) DO NOTHING",
+    )
+    return inserted, len(stale), {ext_id for _, ext_id in stale}
+
+
+def prune_orphan_external_controls(cur, candidates: Iterable[str]) -> int:
+    """Delete external controls that lost their last mapping, unless they anchor a hierarchy."""
+    candidates = list(candidates)
+    if not candidates:
+        return 0
+    cur.execute(
+        """
+        DELETE FROM external_controls ec
+        WHERE ec.id = ANY(%s::uuid[])
+          AND NOT COALESCE(ec.is_group, false)
+          AND NOT EXISTS (SELECT 1 FROM scf_control_mappings m WHERE m.external_control_id = ec.id)
+          AND NOT EXISTS (SELECT 1 FROM external_controls c WHERE c.parent_id = ec.id)
+        """,
+        (candidates,),
+    )
+    return cur.rowcount
+
+
+def create_shadow_tables(cur, framework_ids: List[str]) -> None:
+    """Create external_controls_next (a copy) and scf_control_mappings_next (other frameworks only)."""
+    grc_db.create_shadow(cur, "external_controls", copy_rows=True)
+    mapping_shadow = grc_db.create_shadow(cur, "scf_control_mappings")
+    cur.execute(
+        f"INSERT INTO {mapping_shadow} SELECT * FROM scf_control_mappings WHERE NOT (framework_id = ANY(%s::uuid[]))",
+        (framework_ids,),
+    )
+
+
+def load_shadow_batch(cur, row_refs: Dict[str, Dict[str, List[str]]], scf_db_ids: Iterable[str]) -> int:
+    """Load the given SCF rows' mappings into the shadow tables; returns mappings inserted."""
+    wanted = sorted(
+        (scf_db_id, framework_id, ref)
+        for scf_db_id in scf_db_ids
+        for framework_id, refs in row_refs[scf_db_id].items()
+        for ref in set(refs)
+    )
+    external_ids = resolve_external_controls(
+        cur, ((framework_id, ref, None, None) for _, framework_id, ref in wanted),
+        table=grc_db.shadow_name("external_controls"),
+    )
+    return merge_rows(
+        cur, grc_db.shadow_name("scf_control_mappings"), ["scf_control_id", "external_control_id", "framework_id"],
+        ((scf_db_id, external_ids[(framework_id, ref)], framework_id) for scf_db_id, framework_id, ref in wanted),
+        on_conflict="(scf_control_id, external_control_id, framework_id) DO NOTHING",
+    )
+
+
+def store_row_digests(cur, current: Dict[str, str], control_ids: Dict[str, str],
+                      removed: Set[str], workbook_sha256: str, only: Set[str]) -> None:
+    if removed:
+        cur.execute("DELETE FROM scf_row_digests WHERE scf_control_id = ANY(%s::uuid[])", (list(removed),))
+    merge_rows(
+        cur, "scf_row_digests", ["scf_control_id", "control_id", "digest", "workbook_sha256"],
+        ((scf_db_id, control_ids[scf_db_id], current[scf_db_id], workbook_sha256) for scf_db_id in only),
+        on_conflict="""(scf_control_id) DO UPDATE
+            SET control_id = EXCLUDED.control_id,
+                digest = EXCLUDED.digest,
+                workbook_sha256 = EXCLUDED.workbook_sha256,
+                updated_at = NOW()""",
+    )
+
+
+def rebuild_full(conn, run, row_refs: Dict[str, Dict[str, List[str]]], framework_ids: List[str],
+                 current: Dict[str, str], control_ids: Dict[str, str], workbook_sha256: str) -> None:
+    """Load shadow tables in checkpointed batches, then swap them in."""
+    if not run.done("shadow_create"):
+        print("Creating shadow tables...")
+        with conn.cursor() as cur:
+            create_shadow_tables(cur, framework_ids)
+        run.complete("shadow_create")
+
+    print("Loading shadow tables...")
+    loaded = 0
+    for batch in run.batches("shadow_load", sorted(row_refs), BATCH_ROWS):
+        with conn.cursor() as cur:
+            loaded += load_shadow_batch(cur, row_refs, batch)
+        print(f"  ... through {control_ids[batch[-1]]} ({loaded} mappings)")
+
+    if not run.done("shadow_index"):
+        with conn.cursor() as cur:
+            for table in SWAP_TABLES:
+                grc_db.build_shadow_indexes(cur, table)
+        run.complete("shadow_index")
+
+    pending = None
+    if not run.done("swap"):
+        print("Swapping shadow tables in...")
+        with conn.cursor() as cur:
+            pending = grc_db.swap_shadows(cur, SWAP_TABLES)
+            cur.execute("DELETE FROM scf_row_digests;")
+            store_row_digests(cur, current, control_ids, set(), workbook_sha256, set(current))
+        run.complete("swap")
+
+    if not run.done("finish"):
+        with conn.cursor() as cur:
+            # Controls mapped before the swap but not after it
+            cur.execute(f"""
+                SELECT external_control_id FROM {old_name("scf_control_mappings")}
+                EXCEPT
+                SELECT external_control_id FROM scf_control_mappings
+            """)
+            orphan_candidates = {row[0] for row in cur.fetchall()}
+            # Controls the load created
+            cur.execute(f"SELECT id FROM external_controls EXCEPT SELECT id FROM {old_name('external_controls')}")
+            new_controls = {row[0] for row in cur.fetchall()}
+            if pending is None:
+                pending = grc_db.pending_validations(cur, SWAP_TABLES)
+            grc_db.finish_swap(cur, pending, SWAP_TABLES)
+            pruned = prune_orphan_external_controls(cur, orphan_candidates)
+            # Rows loaded into the shadow bypassed the path and sort_key triggers
+            control_tree.refresh_paths(cur, framework_ids)
+            control_tree.refresh_sort_keys(conn, framework_ids)
+            control_tree.rebuild_closure(conn, framework_ids)
+            placed = maintain_hierarchy(conn, new_controls)["controls"]
+        run.complete("finish")
+        print(f"Full rebuild complete. {loaded} mappings loaded this attempt, "
+              f"{pruned} orphaned external controls pruned, {placed} new ones placed in their hierarchy "
+              f"({len(current)} SCF rows).")
+
+
+def rebuild_incremental(conn, run, row_refs: Dict[str, Dict[str, List[str]]], framework_ids: List[str],
+                        current: Dict[str, str], control_ids: Dict[str, str], workbook_sha256: str) -> None:
+    """Sync the rows whose digests changed, committing digests with each batch."""
+    stored = load_row_digests(conn)
+    added, changed, removed = diff_rows(current, stored)
+    print(f"Row digests: {len(added)} added, {len(changed)} changed, "
+          f"{len(removed)} removed, {len(current) - len(added) - len(changed)} unchanged.")
+
+    total_inserted = total_deleted = pruned = placed = 0
+    for batch in run.batches("sync", sorted(added | changed | removed), BATCH_ROWS):
+        touched = set(batch)
+        new_controls: Set[str] = set()
+        with conn.cursor() as cur:
+            inserted, deleted, orphan_candidates = sync_mappings(cur, row_refs, touched, framework_ids, new_controls)
+            # A ref may move to a row in a later batch; candidates are pruned once all batches are in
+            merge_rows(
+                cur, "import_run_prune_candidates", ["run_id", "external_control_id"],
+                ((run.id, ext_id) for ext_id in orphan_candidates),
+                on_conflict="(run_id, external_control_id) DO NOTHING",
+            )
+            # New controls join their hierarchy in the same commit as their mappings;
+            # display_order/lft/rgt are renumbered once in the finish stage
+            placed += maintain_hierarchy(conn, new_controls, reorder=False)["controls"]
+            store_row_digests(cur, current, control_ids, removed & touched, workbook_sha256,
+                              (added | changed) & touched)
+        total_inserted += inserted
+        total_deleted += deleted
+
+    if not run.done("finish"):
+        with conn.cursor() as cur:
+            # Recorded with each sync batch, so also complete after a resume
+            cur.execute("SELECT external_control_id FROM import_run_prune_candidates WHERE run_id = %s", (run.id,))
+            pruned = prune_orphan_external_controls(cur, [row[0] for row in cur.fetchall()])
+            cur.execute("DELETE FROM import_run_prune_candidates WHERE run_id = %s", (run.id,))
+            # Controls placed by the sync are not numbered yet
+            cur.execute("""
+                SELECT f.id FROM unnest(%s::uuid[]) AS f(id)
+                WHERE EXISTS (SELECT 1 FROM external_controls ec WHERE ec.framework_id = f.id AND ec.lft IS NULL)
+            """, (framework_ids,))
+            control_tree.renumber(conn, [row[0] for row in cur.fetchall()])
+        run.complete("finish")
+
+    print(f"Rebuild complete. {total_inserted} mappings inserted, {total_deleted} removed, "
+          f"{pruned} orphaned external controls pruned, {placed} new ones placed in their hierarchy "
+          f"({len(added) + len(changed) + len(removed)} of {len(current)} SCF rows touched).")
+
+
 def main():
+    full = "--full" in sys.argv[1:]
+    restart = "--restart" in sys.argv[1:]
     print("Connecting to database...")
-    conn = get_db_connection()
+    conn = grc_db.connect()
     conn.autocommit = False
+    run = None
     try:
-        print("Deleting all scf_control_mappings and external_controls...")
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM scf_control_mappings;")
-            cur.execute("DELETE FROM external_controls;")
-        print("All mappings and external controls deleted.")
-
         print("Loading SCF controls...")
         scf_controls = load_scf_controls(conn)
+        control_ids = {scf_db_id: control_id for control_id, scf_db_id in scf_controls.items()}
         print(f"Loaded {len(scf_controls)} SCF controls.")
 
         print("Loading frameworks by mapping_column_header...")
@@ -101,76 +367,44 @@ def main():
         print(f"Loaded {len(frameworks)} frameworks with mapping_column_header.")
 
         print("Loading Excel workbook...")
-        wb = openpyxl.load_workbook(EXCEL_PATH, read_only=True, data_only=True)
+        wb = scf_snapshot.load_workbook(EXCEL_PATH)
         sheet = wb[SCF_SHEET_NAME]
 
-        # Map Excel column index to framework_id
-        col_to_framework: Dict[int, str] = {}
-        for col_idx in range(MAPPING_COL_START, MAPPING_COL_END):
-            cell = sheet.cell(row=1, column=col_idx)
-            norm = normalize_header(cell.value)
-            fw = frameworks.get(norm)
-            if fw:
-                col_to_framework[col_idx] = fw["id"]
+        # Map Excel column index to framework_id via the cached header index
+        header_index = load_header_index(EXCEL_PATH, SCF_SHEET_NAME, MAPPING_COL_START, MAPPING_COL_END)
+        matched, unmatched_headers, unmatched_columns = header_index.match(frameworks)
+        col_to_framework: Dict[int, str] = {col_idx: fw["id"] for col_idx, fw in matched.items()}
 
         print(f"Found {len(col_to_framework)} mapping columns with framework linkage.")
+        for header in unmatched_headers:
+            candidate = header_index.resolve(header)
+            closest = f" (closest: column {candidate} '{header_index.header(candidate)}')" if candidate else ""
+            print(f"  Unmatched framework header (no Excel column): {header}{closest}")
+        if unmatched_columns:
+            print(f"  {len(unmatched_columns)} Excel mapping columns have no framework row.")
 
-        total_mappings = 0
-        total_controls = 0
-        external_control_cache: Dict[tuple, str] = {}
-        with conn.cursor() as cur:
-            for row_idx in range(2, sheet.max_row + 1):
-                if row_idx % 100 == 0:
-                    print(f"Processed {row_idx} SCF rows...")
-                scf_id_cell = sheet.cell(row=row_idx, column=SCF_ID_COL)
-                scf_id = (scf_id_cell.value or "").strip() if isinstance(scf_id_cell.value, str) else scf_id_cell.value
-                if not scf_id:
-                    continue
-                scf_db_id = scf_controls.get(scf_id)
-                if not scf_db_id:
-                    continue
-                for col_idx, framework_id in col_to_framework.items():
-                    cell = sheet.cell(row=row_idx, column=col_idx)
-                    refs = parse_refs(cell.value)
-                    for ref in refs:
-                        cache_key = (framework_id, ref)
-                        external_id = external_control_cache.get(cache_key)
-                        if not external_id:
-                            cur.execute(
-                                """
-                                INSERT INTO external_controls (framework_id, ref_code, description)
-                                VALUES (%s, %s, %s)
-                                ON CONFLICT (framework_id, ref_code) DO NOTHING
-                                RETURNING id
-                                """,
-                                (framework_id, ref, f"External control {ref}"),
-                            )
-                            ext_row = cur.fetchone()
-                            if ext_row:
-                                external_id = ext_row[0]
-                            else:
-                                cur.execute(
-                                    "SELECT id FROM external_controls WHERE framework_id = %s AND ref_code = %s;",
-                                    (framework_id, ref),
-                                )
-                                external_id = cur.fetchone()[0]
-                            external_control_cache[cache_key] = external_id
-                        cur.execute(
-                            """
-                            INSERT INTO scf_control_mappings (scf_control_id, external_control_id, framework_id)
-                            VALUES (%s, %s, %s)
-                            ON CONFLICT (scf_control_id, external_control_id, framework_id) DO NOTHING
-                            """,
-                            (scf_db_id, external_id, framework_id),
-                        )
-                        total_mappings += 1
-                total_controls += 1
+        row_refs = collect_row_refs(sheet, col_to_framework, scf_controls)
+        workbook_sha256 = wb.sha256
         wb.close()
-        conn.commit()
-        print(f"Rebuild complete. Imported {total_mappings} mappings for {total_controls} SCF controls.")
+
+        current = {scf_db_id: row_digest(refs) for scf_db_id, refs in row_refs.items()}
+        framework_ids = sorted(set(col_to_framework.values()))
+
+        importer = "rebuild_all_framework_mappings:" + ("full" if full else "incremental")
+        run = grc_db.ImportRun.start(conn, importer, workbook_sha256, restart=restart)
+        print(run.describe())
+
+        if full:
+            rebuild_full(conn, run, row_refs, framework_ids, current, control_ids, workbook_sha256)
+        else:
+            rebuild_incremental(conn, run, row_refs, framework_ids, current, control_ids, workbook_sha256)
+        run.finish()
     except Exception as exc:
-        print("Error during rebuild, rolling back:", exc)
-        conn.rollback()
+        print("Error during rebuild, rolling back to the last checkpoint:", exc)
+        if run is not None:
+            run.fail(exc)
+        else:
+            conn.rollback()
         raise
     finally:
         conn.close()
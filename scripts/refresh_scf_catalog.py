@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Full SCF catalog refresh with process-parallel sheet extraction.
+
+Stage 1 (extract): every catalog sheet is parsed in its own worker process
+into the columnar snapshot cache (see scf_snapshot.py). Workers return only
+their manifest entries, so extraction time is bounded by the largest sheet
+instead of the sum of all sheets. Already-cached sheets are skipped.
+
+Stage 2 (load): a single loader process reads the memory-mapped sheets and
+runs the existing importers over one database connection, in dependency
+order (frameworks and catalogs before the mappings that reference them).
+
+Usage:
+    python scripts/refresh_scf_catalog.py [--workers N] [--extract-only]
+"""
+
+import os
+import sys
+import time
+
+import grc_db
+
+import scf_snapshot
+import import_assessment_objectives_complete
+import import_authoritative_sources
+import import_evidence_templates
+import import_threats_risks_complete
+
+EXCEL_PATH = scf_snapshot.DEFAULT_EXCEL_PATH
+
+CATALOG_SHEETS = [
+    'SCF 2025.3.1',
+    'Assessment Objectives 2025.3.1',
+    'Threat Catalog',
+    'Risk Catalog',
+    'Evidence Request List 2025.3.1',
+    'Authoritative Sources',
+]
+
+
+def extract_sheets(excel_path, workers):
+    """Parse every catalog sheet into the snapshot cache, one process per sheet"""
+    print("\n" + "=" * 80)
+    print("STAGE 1: EXTRACTING SHEETS")
+    print("=" * 80)
+
+    started = time.perf_counter()
+    wb = scf_snapshot.load_workbook(excel_path)
+    converted = wb.convert(CATALOG_SHEETS, workers=workers)
+    elapsed = time.perf_counter() - started
+
+    for name in CATALOG_SHEETS:
+        status = "parsed" if name in converted else "cached"
+        print(f"  {name:40s} {status}")
+    print(f"✓ Extracted {len(converted)} sheets with {workers} workers in {elapsed:.1f}s")
+    return wb
+
+
+def load_catalog(conn, wb, excel_path):
+    """Run the importers in dependency order against one connection"""
+    print("\n" + "=" * 80)
+    print("STAGE 2: LOADING")
+    print("=" * 80)
+
+    results = {}
+
+    frameworks = import_authoritative_sources.extract_frameworks(wb['Authoritative Sources'])
+    inserted, updated = import_authoritative_sources.upsert_frameworks(conn, frameworks)
+    results['Frameworks inserted/updated'] = f"{inserted}/{updated}"
+
+    results['Threats'] = import_threats_risks_complete.import_threat_catalog(conn, wb)
+    results['Risks'] = import_threats_risks_complete.import_risk_catalog(conn, wb)
+    results['Risk-control mappings'] = import_threats_risks_complete.import_risk_control_mappings(conn, wb)
+    results['Threat-control mappings'] = import_threats_risks_complete.import_threat_control_mappings(conn, wb)
+
+    aos = import_assessment_objectives_complete.extract_assessment_objectives(excel_path)
+    if aos:
+        import_assessment_objectives_complete.insert_aos(conn, aos)
+    results['Assessment objectives'] = len(aos)
+
+    erl_items = import_evidence_templates.extract_erl_items(excel_path)
+    if erl_items:
+        import_evidence_templates.create_erl_reference_table(conn)
+        import_evidence_templates.insert_erl_items(conn, erl_items)
+    results['Evidence templates'] = len(erl_items)
+
+    return results
+
+
+def main():
+    args = sys.argv[1:]
+    workers = os.cpu_count() or 1
+    if "--workers" in args:
+        workers = int(args[args.index("--workers") + 1])
+    extract_only = "--extract-only" in args
+
+    print("=" * 80)
+    print("SCF CATALOG REFRESH")
+    print("=" * 80)
+    print(f"\nExcel file: {EXCEL_PATH}")
+
+    if not os.path.exists(EXCEL_PATH):
+        print(f"\n✗ ERROR: Excel file not found at {EXCEL_PATH}")
+        sys.exit(1)
+
+    wb = extract_sheets(EXCEL_PATH, workers)
+    if extract_only:
+        wb.close()
+        return
+
+    print("\nConnecting to database...")
+    conn = grc_db.connect()
+    try:
+        results = load_catalog(conn, wb, EXCEL_PATH)
+    finally:
+        conn.close()
+        wb.close()
+
+    print("\n" + "=" * 80)
+    print("REFRESH COMPLETE")
+    print("=" * 80)
+    for label, value in results.items():
+        print(f"{label + ':':30s} {value}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(f"\n✗ ERROR: {e}", file=sys.stderr)
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
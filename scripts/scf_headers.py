@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Header -> column index for the SCF workbook.
+
+Framework mapping columns used to be located by rescanning row 1 with
+sheet.cell() in every script (each with its own copy of normalize_header),
+or by hardcoded column numbers that silently break when SCF inserts a
+column. HeaderIndex is built once per workbook hash (persisted next to the
+snapshot cache) and resolves a header to its 1-based column number by:
+
+    exact       raw header text
+    normalized  whitespace-collapsed, case-folded text (normalize_header)
+    fuzzy       token-set similarity, only when a single best column wins
+
+Exact and normalized lookups are dict hits; fuzzy lookups only score the
+columns that share at least one token with the query. match(), which the
+importers use, only returns fuzzy matches when asked: a fuzzy match is a
+candidate to report, not a column to import into.
+
+Usage:
+    from scf_headers import load_header_index
+    index = load_header_index(EXCEL_PATH)
+    col = index.resolve(framework["mapping_column_header"])
+    matched, unmatched_headers, unmatched_columns = index.match(frameworks_by_header)
+"""
+
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import scf_snapshot
+
+SCF_SHEET_NAME = "SCF 2025.3.1"
+HEADER_INDEX_NAME = "header_index.json"
+
+# Framework mapping columns in the SCF sheet, scanned as range(29, 274)
+MAPPING_COL_START = 29
+MAPPING_COL_END = 274
+
+FUZZY_THRESHOLD = 0.8
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_header(value: Any) -> str:
+    """Normalize an Excel header to match frameworks.mapping_column_header style.
+
+    - Convert None to empty string.
+    - Replace newlines and tabs with spaces.
+    - Collapse multiple spaces.
+    - Trim leading/trailing whitespace.
+    """
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        value = str(value)
+    value = value.replace("\n", " ").replace("\r", " ").replace("\t", " ")
+    value = " ".join(value.split())
+    return value.strip()
+
+
+def header_tokens(value: Any) -> Set[str]:
+    return set(TOKEN_RE.findall(normalize_header(value).casefold()))
+
+
+def token_set_similarity(a: Set[str], b: Set[str]) -> float:
+    """Jaccard similarity of two token sets (1.0 = same tokens, any order)."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class HeaderIndex:
+    """Resolve header text to a 1-based column number."""
+
+    def __init__(self, headers: Dict[int, str]):
+        self.headers = {col: raw for col, raw in headers.items() if normalize_header(raw)}
+        self._exact: Dict[str, int] = {}
+        self._normalized: Dict[str, int] = {}
+        self._tokens: Dict[int, Set[str]] = {}
+        self._by_token: Dict[str, List[int]] = {}
+        for col in sorted(self.headers):
+            raw = self.headers[col]
+            self._exact.setdefault(raw, col)
+            self._normalized.setdefault(normalize_header(raw).casefold(), col)
+            tokens = header_tokens(raw)
+            self._tokens[col] = tokens
+            for token in tokens:
+                self._by_token.setdefault(token, []).append(col)
+
+    def header(self, col: int) -> str:
+        return normalize_header(self.headers.get(col))
+
+    def columns(self) -> List[int]:
+        return sorted(self.headers)
+
+    def lookup(self, header: Any, fuzzy: bool = True,
+               threshold: float = FUZZY_THRESHOLD) -> Tuple[Optional[int], Optional[str]]:
+        """Return (column, method) where method is exact/normalized/fuzzy, or (None, None)."""
+        if header is None:
+            return None, None
+        if header in self._exact:
+            return self._exact[header], "exact"
+        key = normalize_header(header).casefold()
+        if key in self._normalized:
+            return self._normalized[key], "normalized"
+        if not fuzzy:
+            return None, None
+
+        wanted = header_tokens(header)
+        candidates = {col for token in wanted for col in self._by_token.get(token, ())}
+        scored = sorted(((token_set_similarity(wanted, self._tokens[col]), col) for col in candidates), reverse=True)
+        if not scored or scored[0][0] < threshold:
+            return None, None
+        if len(scored) > 1 and scored[1][0] == scored[0][0]:
+            return None, None  # Ambiguous: two columns equally similar
+        return scored[0][1], "fuzzy"
+
+    def resolve(self, header: Any, fuzzy: bool = True) -> Optional[int]:
+        return self.lookup(header, fuzzy)[0]
+
+    def match(self, wanted: Dict[str, Any], fuzzy: bool = False,
+              columns: Optional[Iterable[int]] = None) -> Tuple[Dict[int, Any], List[str], List[int]]:
+        """Match header -> value pairs (e.g. frameworks by mapping_column_header) to columns.
+
+        Returns (column -> value, wanted headers with no column, columns with no match).
+        Only exact/normalized matches unless fuzzy is set: a near-miss header
+        (CMMC Level 1 vs Level 2) usually names a sibling framework's column,
+        so importers report fuzzy candidates instead of writing them. With
+        fuzzy, exact/normalized matches are assigned first so a fuzzy match
+        never steals a column that another header names precisely.
+        """
+        allowed = set(columns) if columns is not None else set(self.headers)
+        matched: Dict[int, Any] = {}
+        pending: List[str] = []
+        for header, value in wanted.items():
+            col, _ = self.lookup(header, fuzzy=False)
+            if col in allowed and col not in matched:
+                matched[col] = value
+            else:
+                pending.append(header)
+
+        unmatched_headers: List[str] = []
+        for header in pending:
+            col = self.resolve(header, fuzzy) if fuzzy else None
+            if col in allowed and col not in matched:
+                matched[col] = wanted[header]
+            else:
+                unmatched_headers.append(header)
+
+        unmatched_columns = sorted(col for col in allowed if col in self.headers and col not in matched)
+        return matched, unmatched_headers, unmatched_columns
+
+
+def load_header_index(excel_path: str = scf_snapshot.DEFAULT_EXCEL_PATH, sheet_name: str = SCF_SHEET_NAME,
+                      min_col: int = MAPPING_COL_START, max_col: int = MAPPING_COL_END,
+                      cache_dir: str = scf_snapshot.CACHE_DIR) -> HeaderIndex:
+    """Build (or load the cached) header index for row 1, columns min_col <= col < max_col."""
+    wb = scf_snapshot.load_workbook(excel_path, cache_dir)
+    path = os.path.join(wb.directory, HEADER_INDEX_NAME)
+    cache: Dict[str, Dict[str, str]] = {}
+    if os.path.exists(path):
+        with open(path) as fh:
+            cache = json.load(fh)
+
+    key = f"{sheet_name}:{min_col}:{max_col}"
+    if key not in cache:
+        sheet = wb[sheet_name]
+        header_row = next(sheet.iter_rows(min_row=1, max_row=1, columns=range(min_col - 1, max_col - 1)), ())
+        cache[key] = {
+            str(col): header_row[col - 1]
+            for col in range(min_col, max_col)
+            if col - 1 < len(header_row) and header_row[col - 1] is not None
+        }
+        with open(path + ".tmp", "w") as fh:
+            json.dump(cache, fh, indent=2)
+        os.replace(path + ".tmp", path)
+    wb.close()
+
+    return HeaderIndex({int(col): str(raw) for col, raw in cache[key].items()})
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Columnar, memory-mapped snapshot cache of the SCF workbook.
+
+Parsing the SCF xlsx with openpyxl costs tens of seconds and every importer
+used to pay it again (some two or three times per run). This module converts
+each sheet once into a columnar file under a directory keyed by the
+workbook's SHA-256 and serves later reads straight from mmap.
+
+On-disk layout (one directory per workbook hash):
+
+    <cache>/<sha256>/manifest.json   sheet names, dimensions, column offsets
+    <cache>/<sha256>/<n>.col         one file per converted sheet
+
+Each column in a .col file is stored as three contiguous regions:
+    offsets  uint64[max_row + 1]   byte offsets into the data region
+    tags     uint8[max_row]        value type (None/str/int/float/bool/datetime)
+    data     utf-8 bytes           encoded cell values, back to back
+
+Sheets are parsed with xlsx_reader (no openpyxl cell objects). Usage
+(drop-in for openpyxl.load_workbook(..., read_only=True, data_only=True)):
+
+    from scf_snapshot import load_workbook
+    wb = load_workbook(EXCEL_PATH)
+    ws = wb['SCF 2025.3.1']
+    for row in ws.iter_rows(min_row=2, values_only=True):
+        ...
+
+Pre-build every sheet for a new SCF release (one worker process per sheet):
+
+    python scripts/scf_snapshot.py [path/to/workbook.xlsx] [--workers N]
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import xlsx_reader
+
+DEFAULT_EXCEL_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "reference_material",
+    "secure-controls-framework-scf-2025-3-1 (1).xlsx",
+)
+CACHE_DIR = os.getenv(
+    "SCF_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "reference_material", ".scf_cache"),
+)
+
+MANIFEST_NAME = "manifest.json"
+FORMAT_VERSION = 1
+
+TAG_NONE = 0
+TAG_STR = 1
+TAG_INT = 2
+TAG_FLOAT = 3
+TAG_BOOL = 4
+TAG_DATETIME = 5
+
+
+def workbook_sha256(path: str) -> str:
+    """Return the hex SHA-256 of the workbook file (the cache key)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode(value: Any) -> Tuple[int, bytes]:
+    if value is None:
+        return TAG_NONE, b""
+    if isinstance(value, bool):
+        return TAG_BOOL, b"1" if value else b"0"
+    if isinstance(value, int):
+        return TAG_INT, str(value).encode()
+    if isinstance(value, float):
+        return TAG_FLOAT, repr(value).encode()
+    if isinstance(value, datetime):
+        return TAG_DATETIME, value.isoformat().encode()
+    return TAG_STR, str(value).encode("utf-8")
+
+
+def _decode(tag: int, raw: bytes) -> Any:
+    if tag == TAG_NONE:
+        return None
+    if tag == TAG_STR:
+        return raw.decode("utf-8")
+    if tag == TAG_INT:
+        return int(raw)
+    if tag == TAG_FLOAT:
+        return float(raw)
+    if tag == TAG_BOOL:
+        return raw == b"1"
+    if tag == TAG_DATETIME:
+        return datetime.fromisoformat(raw.decode())
+    raise ValueError(f"Unknown snapshot value tag {tag}")
+
+
+def _pad8(fh) -> None:
+    remainder = fh.tell() % 8
+    if remainder:
+        fh.write(b"\0" * (8 - remainder))
+
+
+def write_sheet(rows: List[tuple], path: str) -> Dict[str, Any]:
+    """Write rows (values_only tuples) column by column.
+
+    Returns the manifest entry describing the file.
+    """
+    max_row = len(rows)
+    max_column = max((len(r) for r in rows), default=0)
+    columns: List[List[int]] = []
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as fh:
+        for col_idx in range(max_column):
+            offsets = array("Q", [0])
+            tags = bytearray(max_row)
+            chunks: List[bytes] = []
+            position = 0
+            for row_idx, row in enumerate(rows):
+                tag, raw = _encode(row[col_idx] if col_idx < len(row) else None)
+                tags[row_idx] = tag
+                chunks.append(raw)
+                position += len(raw)
+                offsets.append(position)
+
+            _pad8(fh)
+            offsets_pos = fh.tell()
+            fh.write(offsets.tobytes())
+            tags_pos = fh.tell()
+            fh.write(bytes(tags))
+            data_pos = fh.tell()
+            fh.write(b"".join(chunks))
+            columns.append([offsets_pos, tags_pos, data_pos])
+    os.replace(tmp_path, path)
+
+    return {
+        "file": os.path.basename(path),
+        "max_row": max_row,
+        "max_column": max_column,
+        "columns": columns,
+    }
+
+
+def _convert_sheet(excel_path: str, directory: str, index: int, sheet_name: str) -> Tuple[str, Dict[str, Any]]:
+    """Parse one sheet and write its columnar file (runs in a worker process)."""
+    wb = xlsx_reader.open_workbook(excel_path)
+    try:
+        rows = list(wb[sheet_name].iter_rows(values_only=True))
+    finally:
+        wb.close()
+    return sheet_name, write_sheet(rows, os.path.join(directory, f"{index}.col"))
+
+
+class SnapshotCell:
+    """Minimal stand-in for an openpyxl cell (only .value is used by the importers)."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+class SheetSnapshot:
+    """Read-only, memory-mapped view of one converted sheet.
+
+    Mirrors the subset of openpyxl's worksheet API used by the scripts
+    (iter_rows, cell, max_row, max_column) and adds column() for
+    columnar access. Row and column numbers are 1-based like openpyxl.
+    """
+
+    def __init__(self, title: str, path: str, entry: Dict[str, Any]):
+        self.title = title
+        self.max_row: int = entry["max_row"]
+        self.max_column: int = entry["max_column"]
+        self._fh = open(path, "rb")
+        size = os.fstat(self._fh.fileno()).st_size
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        view = memoryview(self._mm) if self._mm is not None else memoryview(b"")
+        self._columns = []
+        for offsets_pos, tags_pos, data_pos in entry["columns"]:
+            offsets = view[offsets_pos:offsets_pos + 8 * (self.max_row + 1)].cast("Q")
+            tags = view[tags_pos:tags_pos + self.max_row]
+            self._columns.append((offsets, tags, data_pos))
+
+    def _value(self, col_idx: int, row_idx: int) -> Any:
+        """Decode a single value by 0-based column and row index."""
+        if col_idx >= self.max_column or row_idx >= self.max_row:
+            return None
+        offsets, tags, data_pos = self._columns[col_idx]
+        tag = tags[row_idx]
+        if tag == TAG_NONE:
+            return None
+        start = data_pos + offsets[row_idx]
+        end = data_pos + offsets[row_idx + 1]
+        return _decode(tag, self._mm[start:end])
+
+    def column(self, column: int, min_row: int = 1, max_row: Optional[int] = None) -> List[Any]:
+        """Return the decoded values of one column (1-based) as a list."""
+        last = min(max_row or self.max_row, self.max_row)
+        return [self._value(column - 1, row_idx) for row_idx in range(min_row - 1, last)]
+
+    def cell(self, row: int, column: int) -> SnapshotCell:
+        return SnapshotCell(self._value(column - 1, row - 1))
+
+    def iter_rows(self, min_row: int = 1, max_row: Optional[int] = None,
+                  values_only: bool = True, columns: Optional[Iterable[int]] = None) -> Iterator[tuple]:
+        """Yield rows as tuples, decoding only the projected columns.
+
+        columns holds 0-based tuple offsets (same convention as
+        xlsx_reader); unprojected positions are None.
+        """
+        if not values_only:
+            raise ValueError("SheetSnapshot only supports values_only=True")
+        last = min(max_row or self.max_row, self.max_row)
+        if columns is None:
+            width = self.max_column
+            projection = range(width)
+        else:
+            projection = sorted(set(columns))
+            width = projection[-1] + 1 if projection else 0
+        for row_idx in range(min_row - 1, last):
+            if columns is None:
+                yield tuple(self._value(col_idx, row_idx) for col_idx in projection)
+            else:
+                values = [None] * width
+                for col_idx in projection:
+                    values[col_idx] = self._value(col_idx, row_idx)
+                yield tuple(values)
+
+    def close(self) -> None:
+        self._columns = []
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._fh.close()
+
+
+class WorkbookSnapshot:
+    """Workbook-like accessor that converts sheets on first use."""
+
+    def __init__(self, excel_path: str, cache_dir: str = CACHE_DIR):
+        self.excel_path = excel_path
+        self.sha256 = workbook_sha256(excel_path)
+        self.directory = os.path.join(cache_dir, self.sha256)
+        os.makedirs(self.directory, exist_ok=True)
+        self._manifest = self._read_manifest()
+        self._open: Dict[str, SheetSnapshot] = {}
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        path = os.path.join(self.directory, MANIFEST_NAME)
+        if os.path.exists(path):
+            with open(path) as fh:
+                manifest = json.load(fh)
+            if manifest.get("format") == FORMAT_VERSION:
+                return manifest
+        return {"format": FORMAT_VERSION, "sha256": self.sha256, "sheetnames": None, "sheets": {}}
+
+    def _write_manifest(self) -> None:
+        path = os.path.join(self.directory, MANIFEST_NAME)
+        with open(path + ".tmp", "w") as fh:
+            json.dump(self._manifest, fh, indent=2)
+        os.replace(path + ".tmp", path)
+
+    @property
+    def sheetnames(self) -> List[str]:
+        if self._manifest["sheetnames"] is None:
+            wb = xlsx_reader.open_workbook(self.excel_path)
+            self._manifest["sheetnames"] = wb.sheetnames
+            wb.close()
+            self._write_manifest()
+        return self._manifest["sheetnames"]
+
+    def convert(self, sheet_names: Optional[List[str]] = None, workers: int = 1) -> List[str]:
+        """Convert the given (or all missing) sheets.
+
+        With workers > 1 each sheet is parsed in its own process and the
+        workers hand back only their manifest entries, so a full conversion
+        takes as long as the largest sheet rather than the sum of all.
+        """
+        sheetnames = self.sheetnames
+        wanted = [name for name in (sheet_names or sheetnames)
+                  if name not in self._manifest["sheets"]]
+        if not wanted:
+            return []
+        for name in wanted:
+            if name not in sheetnames:
+                raise KeyError(f"Worksheet {name} does not exist.")
+        jobs = [(self.excel_path, self.directory, sheetnames.index(name), name) for name in wanted]
+
+        if workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                results = list(pool.map(_convert_sheet, *zip(*jobs)))
+        else:
+            results = [_convert_sheet(*job) for job in jobs]
+
+        for name, entry in results:
+            self._manifest["sheets"][name] = entry
+        self._write_manifest()
+        return wanted
+
+    def __getitem__(self, sheet_name: str) -> SheetSnapshot:
+        if sheet_name not in self._open:
+            if sheet_name not in self._manifest["sheets"]:
+                if sheet_name not in self.sheetnames:
+                    raise KeyError(f"Worksheet {sheet_name} does not exist.")
+                self.convert([sheet_name])
+            entry = self._manifest["sheets"][sheet_name]
+            path = os.path.join(self.directory, entry["file"])
+            self._open[sheet_name] = SheetSnapshot(sheet_name, path, entry)
+        return self._open[sheet_name]
+
+    def close(self) -> None:
+        for sheet in self._open.values():
+            sheet.close()
+        self._open = {}
+
+
+def load_workbook(excel_path: str = DEFAULT_EXCEL_PATH, cache_dir: str = CACHE_DIR) -> WorkbookSnapshot:
+    """Open the snapshot for a workbook, converting sheets lazily on first access."""
+    return WorkbookSnapshot(excel_path, cache_dir)
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    workers = os.cpu_count() or 1
+    if "--workers" in args:
+        position = args.index("--workers")
+        workers = int(args[position + 1])
+        del args[position:position + 2]
+    excel_path = args[0] if args else DEFAULT_EXCEL_PATH
+    if not os.path.exists(excel_path):
+        print(f"✗ ERROR: Excel file not found at {excel_path}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Snapshotting workbook: {excel_path}")
+    wb = load_workbook(excel_path)
+    print(f"SHA-256: {wb.sha256}")
+    converted = wb.convert(workers=workers)
+    if converted:
+        for name in converted:
+            entry = wb._manifest["sheets"][name]
+            print(f"  ✓ {name}: {entry['max_row']} rows x {entry['max_column']} columns")
+    else:
+        print("  All sheets already cached")
+    print(f"Cache directory: {wb.directory}")
+
+
+if __name__ == "__main__":
+    main()
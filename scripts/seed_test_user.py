@@ -4,7 +4,7 @@ Seed a test user and organization for development
 USES SUPABASE AUTH API - DOES NOT DIRECTLY INSERT INTO auth.users
 """
 import requests
-import psycopg2
+import grc_db
 from psycopg2.extras import RealDictCursor
 import uuid
 
@@ -59,13 +59,7 @@ else:
         exit(1)
 
 # Now add to public schema tables
-conn = psycopg2.connect(
-    host="127.0.0.1",
-    port="54322",
-    database="postgres",
-    user="postgres",
-    password="postgres"
-)
+conn = grc_db.connect()
 
 conn.autocommit = True
 
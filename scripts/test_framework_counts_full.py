@@ -2,17 +2,11 @@
 """
 Test framework counts with detailed statistics
 """
-import psycopg2
+import grc_db
 from psycopg2.extras import RealDictCursor
 
 # Connect to database
-conn = psycopg2.connect(
-    host="127.0.0.1",
-    port="54322",
-    database="postgres",
-    user="postgres",
-    password="postgres"
-)
+conn = grc_db.connect()
 
 # Test the RPC function
 query = "SELECT * FROM get_frameworks_with_counts() ORDER BY mapping_count DESC LIMIT 20;"
@@ -1,58 +1,18 @@
 import os
 from typing import List, Dict, Any
 
-import psycopg2
-import openpyxl
+import grc_db
+
+from scf_headers import HeaderIndex, load_header_index, normalize_header
 
 
 EXCEL_PATH = os.path.join(os.path.dirname(__file__), "..", "reference_material", "secure-controls-framework-scf-2025-3-1 (1).xlsx")
 SCF_SHEET_NAME = "SCF 2025.3.1"
 
 
-def normalize_header(value: Any) -> str:
-    """Normalize an Excel header to match frameworks.mapping_column_header style.
-
-    - Convert None to empty string.
-    - Replace newlines and tabs with spaces.
-    - Collapse multiple spaces.
-    - Trim leading/trailing whitespace.
-    """
-    if value is None:
-        return ""
-    if not isinstance(value, str):
-        value = str(value)
-    # Replace newlines/tabs with spaces
-    value = value.replace("\n", " ").replace("\r", " ").replace("\t", " ")
-    # Collapse multiple spaces
-    value = " ".join(value.split())
-    return value.strip()
-
-
-def load_excel_mapping_headers() -> List[str]:
-    wb = openpyxl.load_workbook(EXCEL_PATH, read_only=True, data_only=True)
-    sheet = wb[SCF_SHEET_NAME]
+def load_excel_mapping_headers() -> HeaderIndex:
     # Columns AC (29) through NJ (273) are the framework mapping columns in the SCF sheet
-    headers: List[str] = []
-    for col_idx in range(29, 274):
-        cell = sheet.cell(row=1, column=col_idx)
-        raw_value = cell.value
-        norm = normalize_header(raw_value)
-        if norm:
-            headers.append(norm)
-    wb.close()
-    return headers
-
-
-def get_db_connection():
-    # Uses Supabase local defaults; adjust via env vars if needed.
-    # Note: Supabase local exposes Postgres on 54322 by default.
-    return psycopg2.connect(
-        dbname=os.getenv("SUPABASE_DB_NAME", "postgres"),
-        user=os.getenv("SUPABASE_DB_USER", "postgres"),
-        password=os.getenv("SUPABASE_DB_PASSWORD", "postgres"),
-        host=os.getenv("SUPABASE_DB_HOST", "127.0.0.1"),
-        port=int(os.getenv("SUPABASE_DB_PORT", "54322")),
-    )
+    return load_header_index(EXCEL_PATH, SCF_SHEET_NAME)
 
 
 def load_frameworks_with_counts(conn) -> List[Dict[str, Any]]:
@@ -90,10 +50,10 @@ def load_frameworks_by_header(conn) -> Dict[str, Dict[str, Any]]:
 
 def main() -> None:
     print("Loading Excel mapping headers...")
-    excel_headers = load_excel_mapping_headers()
-    print(f"Excel mapping columns (non-empty headers): {len(excel_headers)}")
+    header_index = load_excel_mapping_headers()
+    print(f"Excel mapping columns (non-empty headers): {len(header_index.columns())}")
 
-    conn = get_db_connection()
+    conn = grc_db.connect()
     try:
         print("Loading frameworks with counts from database...")
         fw_counts = load_frameworks_with_counts(conn)
@@ -102,17 +62,21 @@ def main() -> None:
         print("Loading frameworks by mapping_column_header from database...")
         fw_by_header = load_frameworks_by_header(conn)
 
-        excel_set = set(excel_headers)
-        db_header_set = set(fw_by_header.keys())
+        matched_columns, unmatched_headers, unmatched_columns = header_index.match(fw_by_header, fuzzy=True)
+        fuzzy_matches = [
+            (fw["mapping_column_header"], col)
+            for col, fw in matched_columns.items()
+            if header_index.lookup(fw["mapping_column_header"], fuzzy=False)[0] != col
+        ]
 
-        missing_in_db = sorted(excel_set - db_header_set)
-        extra_in_db = sorted(db_header_set - excel_set)
-        matched = sorted(excel_set & db_header_set)
+        missing_in_db = sorted({header_index.header(col) for col in unmatched_columns})
+        extra_in_db = sorted(unmatched_headers)
+        matched = sorted(fw["mapping_column_header"] for fw in matched_columns.values())
 
         print("\n=== Summary ===")
-        print(f"Excel headers: {len(excel_headers)}")
-        print(f"Frameworks with mapping_column_header in DB: {len(db_header_set)}")
-        print(f"Matched headers: {len(matched)}")
+        print(f"Excel headers: {len(header_index.columns())}")
+        print(f"Frameworks with mapping_column_header in DB: {len(fw_by_header)}")
+        print(f"Matched headers: {len(matched)} ({len(fuzzy_matches)} fuzzy)")
         print(f"Missing in DB (Excel column has no framework row): {len(missing_in_db)}")
         print(f"Extra in DB (framework has header not present as Excel column): {len(extra_in_db)}")
 
@@ -131,6 +95,10 @@ def main() -> None:
                 f"{code:20s} | {header[:40]:40s} | controls={control_count:5d} | mappings={mapping_count:5d} | {status}"
             )
 
+        print("\n=== Fuzzy header matches (verify these) ===")
+        for header, col in fuzzy_matches:
+            print(f"FUZZY_MATCH       | {header} -> column {col}: {header_index.header(col)}")
+
         print("\n=== Excel headers missing a DB framework (first 50) ===")
         for h in missing_in_db[:50]:
             print(f"MISSING_DB_HEADER | {h}")
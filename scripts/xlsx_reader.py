@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Projection-pushdown xlsx sheet reader.
+
+openpyxl builds a cell object for every one of the SCF sheet's ~375
+columns even though each importer only needs a handful of them. This
+reader streams the sheet XML with ElementTree.iterparse, decodes only the
+<c> elements whose column is in the requested projection, and resolves
+shared strings lazily (the shared-string table is streamed only as far as
+the highest index actually referenced).
+
+Rows come back as tuples indexed like openpyxl's values_only rows, so
+`row[COL_CONTROL_ID]` keeps working; columns outside the projection are
+None. Column numbers in the projection are 0-based tuple offsets.
+
+Usage:
+
+    from xlsx_reader import open_workbook
+    wb = open_workbook(EXCEL_PATH)
+    ws = wb['SCF 2025.3.1']
+    for row in ws.iter_rows(min_row=2, columns=[COL_CONTROL_ID, COL_ERRATA]):
+        ...
+    wb.close()
+"""
+
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+TAG_ROW = NS_MAIN + "row"
+TAG_CELL = NS_MAIN + "c"
+TAG_VALUE = NS_MAIN + "v"
+TAG_INLINE = NS_MAIN + "is"
+TAG_TEXT = NS_MAIN + "t"
+TAG_RUN_PHONETIC = NS_MAIN + "rPh"
+TAG_SI = NS_MAIN + "si"
+TAG_SHEET_DATA = NS_MAIN + "sheetData"
+TAG_DIMENSION = NS_MAIN + "dimension"
+
+# Built-in number formats that Excel renders as dates/times
+BUILTIN_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}
+DATE_FORMAT_RE = re.compile(r"[dmyhs]", re.IGNORECASE)
+QUOTED_OR_BRACKETED_RE = re.compile(r'"[^"]*"|\[[^\]]*\]')
+CELL_REF_RE = re.compile(r"^([A-Z]+)(\d+)$")
+DIMENSION_END_RE = re.compile(r"([A-Z]+)\d*$")
+INT_RE = re.compile(r"^-?\d+$")
+
+EPOCH_1900 = datetime(1899, 12, 30)
+EPOCH_1904 = datetime(1904, 1, 1)
+
+
+def column_index(letters: str) -> int:
+    """Convert column letters to a 0-based index (A -> 0, AC -> 28)."""
+    index = 0
+    for ch in letters:
+        index = index * 26 + (ord(ch) - 64)
+    return index - 1
+
+
+class SharedStrings:
+    """Shared-string table that is parsed only as far as it is indexed."""
+
+    def __init__(self, archive: zipfile.ZipFile, path: Optional[str]):
+        self._strings: List[str] = []
+        self._stream = archive.open(path) if path else None
+        self._events = ET.iterparse(self._stream, events=("end",)) if self._stream else iter(())
+
+    def __getitem__(self, index: int) -> str:
+        while index >= len(self._strings):
+            if not self._advance():
+                raise IndexError(f"Shared string {index} out of range")
+        return self._strings[index]
+
+    def _advance(self) -> bool:
+        for _, elem in self._events:
+            if elem.tag != TAG_SI:
+                continue
+            # Concatenate rich-text runs, ignoring phonetic (rPh) hints
+            parts = []
+            for child in elem:
+                if child.tag == TAG_TEXT:
+                    parts.append(child.text or "")
+                elif child.tag != TAG_RUN_PHONETIC:
+                    parts.extend(t.text or "" for t in child.iter(TAG_TEXT))
+            self._strings.append("".join(parts))
+            elem.clear()
+            return True
+        self.close()
+        return False
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+        self._events = iter(())
+
+
+class ProjectedSheet:
+    """One worksheet, read by streaming its XML part."""
+
+    def __init__(self, workbook: "XlsxWorkbook", title: str, path: str):
+        self._workbook = workbook
+        self.title = title
+        self._path = path
+
+    def iter_rows(self, min_row: int = 1, max_row: Optional[int] = None,
+                  values_only: bool = True, columns: Optional[Iterable[int]] = None) -> Iterator[tuple]:
+        """Yield rows as tuples; only columns in the projection are decoded.
+
+        With columns=None every cell is decoded. Gaps between <row>
+        elements are yielded as empty rows, like openpyxl does.
+        """
+        if not values_only:
+            raise ValueError("ProjectedSheet only supports values_only=True")
+        projection: Optional[Set[int]] = set(columns) if columns is not None else None
+        width = max(projection) + 1 if projection else 0
+
+        workbook = self._workbook
+        next_row = min_row
+        with workbook.archive.open(self._path) as stream:
+            sheet_data = None
+            for event, elem in ET.iterparse(stream, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == TAG_SHEET_DATA:
+                        sheet_data = elem
+                    continue
+                if elem.tag == TAG_DIMENSION and projection is None:
+                    # Pad full-width rows to the sheet dimension, as openpyxl does
+                    match = DIMENSION_END_RE.search(elem.get("ref", ""))
+                    width = column_index(match.group(1)) + 1 if match else 0
+                    continue
+                if elem.tag != TAG_ROW:
+                    continue
+
+                row_number = int(elem.get("r", next_row))
+                if max_row is not None and row_number > max_row:
+                    break
+                if row_number < min_row:
+                    sheet_data.clear()
+                    continue
+
+                values: Dict[int, Any] = {}
+                position = 0
+                for cell in elem.iter(TAG_CELL):
+                    ref = cell.get("r")
+                    if ref:
+                        match = CELL_REF_RE.match(ref)
+                        position = column_index(match.group(1)) if match else position
+                    if projection is None or position in projection:
+                        value = workbook.cell_value(cell)
+                        if value is not None:
+                            values[position] = value
+                    position += 1
+                sheet_data.clear()
+
+                row_width = max(width, max(values, default=-1) + 1)
+                while next_row < row_number:
+                    yield (None,) * width
+                    next_row += 1
+                yield tuple(values.get(i) for i in range(row_width))
+                next_row = row_number + 1
+
+
+class XlsxWorkbook:
+    """Minimal read-only workbook over the xlsx zip package."""
+
+    def __init__(self, path: str):
+        self.archive = zipfile.ZipFile(path)
+        self._sheet_paths = self._read_sheet_paths()
+        self._date_styles = self._read_date_styles()
+        self._epoch = EPOCH_1904 if self._date1904 else EPOCH_1900
+        self.shared_strings = SharedStrings(self.archive, self._find_part("sharedStrings"))
+
+    @property
+    def sheetnames(self) -> List[str]:
+        return list(self._sheet_paths)
+
+    def __getitem__(self, sheet_name: str) -> ProjectedSheet:
+        if sheet_name not in self._sheet_paths:
+            raise KeyError(f"Worksheet {sheet_name} does not exist.")
+        return ProjectedSheet(self, sheet_name, self._sheet_paths[sheet_name])
+
+    def close(self) -> None:
+        self.shared_strings.close()
+        self.archive.close()
+
+    def _rels(self) -> Dict[str, Dict[str, str]]:
+        rels: Dict[str, Dict[str, str]] = {}
+        root = ET.fromstring(self.archive.read("xl/_rels/workbook.xml.rels"))
+        for rel in root.iter(NS_PKG_REL + "Relationship"):
+            target = rel.get("Target")
+            target = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+            rels[rel.get("Id")] = {"target": target, "type": rel.get("Type", "")}
+        return rels
+
+    def _read_sheet_paths(self) -> Dict[str, str]:
+        rels = self._rels()
+        self._part_by_type = {info["type"].rsplit("/", 1)[-1]: info["target"] for info in rels.values()}
+        root = ET.fromstring(self.archive.read("xl/workbook.xml"))
+        pr = root.find(NS_MAIN + "workbookPr")
+        self._date1904 = pr is not None and pr.get("date1904") in ("1", "true")
+        paths: Dict[str, str] = {}
+        for sheet in root.iter(NS_MAIN + "sheet"):
+            paths[sheet.get("name")] = rels[sheet.get(NS_REL + "id")]["target"]
+        return paths
+
+    def _find_part(self, rel_type: str) -> Optional[str]:
+        path = self._part_by_type.get(rel_type)
+        return path if path in self.archive.namelist() else None
+
+    def _read_date_styles(self) -> Set[int]:
+        """Return the cellXfs indices whose number format is a date/time."""
+        path = self._find_part("styles")
+        if not path:
+            return set()
+        root = ET.fromstring(self.archive.read(path))
+        custom_dates = set()
+        for fmt in root.iter(NS_MAIN + "numFmt"):
+            code = QUOTED_OR_BRACKETED_RE.sub("", fmt.get("formatCode", ""))
+            if DATE_FORMAT_RE.search(code):
+                custom_dates.add(int(fmt.get("numFmtId")))
+        date_styles = set()
+        cell_xfs = root.find(NS_MAIN + "cellXfs")
+        if cell_xfs is not None:
+            for index, xf in enumerate(cell_xfs.iter(NS_MAIN + "xf")):
+                fmt_id = int(xf.get("numFmtId", 0))
+                if fmt_id in BUILTIN_DATE_FORMATS or fmt_id in custom_dates:
+                    date_styles.add(index)
+        return date_styles
+
+    def cell_value(self, cell: ET.Element) -> Any:
+        """Decode one <c> element to the value openpyxl would return (data_only)."""
+        cell_type = cell.get("t", "n")
+        if cell_type == "inlineStr":
+            inline = cell.find(TAG_INLINE)
+            return "".join(t.text or "" for t in inline.iter(TAG_TEXT)) if inline is not None else None
+
+        v = cell.find(TAG_VALUE)
+        if v is None or v.text is None:
+            return None
+        text = v.text
+        if cell_type == "s":
+            return self.shared_strings[int(text)]
+        if cell_type in ("str", "e"):
+            return text
+        if cell_type == "b":
+            return text == "1"
+        if cell_type == "d":
+            return datetime.fromisoformat(text)
+
+        number = int(text) if INT_RE.match(text) else float(text)
+        style = cell.get("s")
+        if style is not None and int(style) in self._date_styles:
+            return self._epoch + timedelta(days=number)
+        return number
+
+
+def open_workbook(path: str) -> XlsxWorkbook:
+    return XlsxWorkbook(path)
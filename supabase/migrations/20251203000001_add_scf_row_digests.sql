@@ -0,0 +1,25 @@
+-- Migration: Add scf_row_digests table
+-- Purpose: Per-SCF-row content hash of the framework mapping columns, so a
+-- workbook re-import can diff (added/changed/removed) and only touch the
+-- scf_control_mappings / external_controls of rows that actually changed.
+-- Date: 2025-12-03
+
+CREATE TABLE IF NOT EXISTS scf_row_digests (
+    scf_control_id UUID PRIMARY KEY REFERENCES scf_controls(id) ON DELETE CASCADE,
+    control_id TEXT NOT NULL,          -- SCF # (e.g., "GOV-01") as it appears in the workbook
+    digest TEXT NOT NULL,              -- sha256 over the row's parsed refs per framework
+    workbook_sha256 TEXT,              -- Workbook the digest was computed from
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+COMMENT ON TABLE scf_row_digests IS 'Content hash of each SCF row''s framework mapping cells, used by rebuild_all_framework_mappings.py for incremental re-imports.';
+COMMENT ON COLUMN scf_row_digests.digest IS 'sha256 of the (framework_id, refs) pairs parsed from the row; formatting-only cell edits do not change it.';
+
+ALTER TABLE scf_row_digests ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow authenticated users to read scf_row_digests"
+ON scf_row_digests FOR SELECT
+TO authenticated
+USING (true);
+
+GRANT SELECT ON scf_row_digests TO authenticated;
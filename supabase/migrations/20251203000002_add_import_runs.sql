@@ -0,0 +1,65 @@
+-- Migration: Add import_runs journal table
+-- Purpose: Checkpoints for long-running importers. Each run records the
+-- stage it is in, the last batch key committed in that stage and the
+-- workbook it was reading, in the same transaction as the batch itself, so
+-- a failed run can resume from its last durable checkpoint instead of
+-- starting over.
+--
+-- import_run_prune_candidates holds the external controls whose mappings a
+-- run's batches deleted. A ref that moves from an early SCF row to a later
+-- one loses its mapping in one batch and regains it in another, so the
+-- incremental rebuild only prunes once every batch is in. The candidates
+-- are written in the same transaction as their batch, read back by the
+-- final stage (also after a resume) and moved to the replacing run when a
+-- run is abandoned.
+-- Date: 2025-12-03
+
+CREATE TABLE IF NOT EXISTS import_runs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    importer TEXT NOT NULL,                          -- Script (and mode), e.g. "rebuild_all_framework_mappings:full"
+    workbook_sha256 TEXT,                            -- Source workbook; a different hash starts a new run
+    status TEXT NOT NULL DEFAULT 'running'
+        CHECK (status IN ('running', 'failed', 'completed', 'abandoned')),
+    stage TEXT,                                      -- Stage of the last checkpoint
+    batch_cursor TEXT,                               -- Last key committed within that stage
+    completed_stages TEXT[] NOT NULL DEFAULT '{}',
+    attempts INTEGER NOT NULL DEFAULT 1,
+    error TEXT,
+    started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_import_runs_open
+ON import_runs (importer, started_at DESC)
+WHERE status IN ('running', 'failed');
+
+COMMENT ON TABLE import_runs IS 'Progress journal for resumable imports (scripts/grc_db/journal.py).';
+COMMENT ON COLUMN import_runs.batch_cursor IS 'Keys are processed in ascending order; everything up to and including this key in `stage` is committed.';
+
+ALTER TABLE import_runs ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow authenticated users to read import_runs"
+ON import_runs FOR SELECT
+TO authenticated
+USING (true);
+
+GRANT SELECT ON import_runs TO authenticated;
+
+CREATE TABLE IF NOT EXISTS import_run_prune_candidates (
+    run_id UUID NOT NULL REFERENCES import_runs(id) ON DELETE CASCADE,
+    external_control_id UUID NOT NULL,               -- No FK: the control may be pruned or deleted meanwhile
+    PRIMARY KEY (run_id, external_control_id)
+);
+
+COMMENT ON TABLE import_run_prune_candidates IS
+'External controls that lost a mapping during an import run; checked for pruning when the run''s sync stage is complete.';
+
+ALTER TABLE import_run_prune_candidates ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow authenticated users to read import_run_prune_candidates"
+ON import_run_prune_candidates FOR SELECT
+TO authenticated
+USING (true);
+
+GRANT SELECT ON import_run_prune_candidates TO authenticated;
@@ -0,0 +1,187 @@
+-- Migration: Populate and maintain external_controls.path
+-- Purpose: 20251119000003_add_ltree.sql added external_controls.path (ltree,
+-- GIST-indexed) but nothing wrote it. This fills it from parent_id and keeps
+-- it current, so subtree queries can use `path <@` instead of recursive
+-- parent_id walks.
+--
+-- Labels are control ids without dashes (ref codes contain characters ltree
+-- labels cannot), so a path reads root_id.child_id...self_id.
+--
+-- Maintenance:
+--   - Row triggers set path on INSERT and on parent_id changes, and move the
+--     subtree when a control is re-parented.
+--   - Bulk hierarchy jobs set grc.defer_paths = 'on' for their transaction,
+--     which skips the row triggers, and call refresh_external_control_paths()
+--     once at the end.
+-- Date: 2025-12-03
+
+CREATE OR REPLACE FUNCTION external_control_label(p_id uuid)
+RETURNS ltree
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT text2ltree(replace(p_id::text, '-', ''));
+$$;
+
+-- Recompute path for every control of the given frameworks (NULL = all)
+CREATE OR REPLACE FUNCTION refresh_external_control_paths(p_framework_ids uuid[] DEFAULT NULL)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  updated_count integer;
+BEGIN
+  WITH RECURSIVE tree AS (
+    SELECT ec.id, external_control_label(ec.id) AS path, 1 AS depth
+    FROM external_controls ec
+    WHERE ec.parent_id IS NULL
+      AND (p_framework_ids IS NULL OR ec.framework_id = ANY(p_framework_ids))
+    UNION ALL
+    SELECT c.id, t.path || external_control_label(c.id), t.depth + 1
+    FROM external_controls c
+    JOIN tree t ON c.parent_id = t.id
+    WHERE t.depth < 64
+  )
+  UPDATE external_controls ec
+  SET path = tree.path
+  FROM tree
+  WHERE ec.id = tree.id
+    AND ec.path IS DISTINCT FROM tree.path;
+
+  GET DIAGNOSTICS updated_count = ROW_COUNT;
+
+  -- Controls on a parent_id cycle are unreachable from a root
+  UPDATE external_controls ec
+  SET path = NULL
+  WHERE ec.path IS NOT NULL
+    AND (p_framework_ids IS NULL OR ec.framework_id = ANY(p_framework_ids))
+    AND ec.path <> external_control_label(ec.id)
+    AND NOT EXISTS (
+      SELECT 1 FROM external_controls p
+      WHERE p.id = ec.parent_id AND p.path = subpath(ec.path, 0, nlevel(ec.path) - 1)
+    );
+
+  RETURN updated_count;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION external_controls_set_path()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  parent_path ltree;
+BEGIN
+  IF current_setting('grc.defer_paths', true) = 'on' THEN
+    RETURN NEW;
+  END IF;
+
+  IF NEW.parent_id IS NULL THEN
+    NEW.path := external_control_label(NEW.id);
+    RETURN NEW;
+  END IF;
+
+  SELECT path INTO parent_path FROM external_controls WHERE id = NEW.parent_id;
+  IF parent_path IS NULL THEN
+    -- Parent not placed yet; refresh_external_control_paths() will fill it in
+    NEW.path := NULL;
+  ELSIF index(parent_path, external_control_label(NEW.id)) >= 0 THEN
+    RAISE EXCEPTION 'parent_id % would make external control % its own ancestor', NEW.parent_id, NEW.id;
+  ELSE
+    NEW.path := parent_path || external_control_label(NEW.id);
+  END IF;
+  RETURN NEW;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION external_controls_move_subtree()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF current_setting('grc.defer_paths', true) = 'on' OR OLD.path IS NULL THEN
+    RETURN NULL;
+  END IF;
+
+  UPDATE external_controls
+  SET path = CASE WHEN NEW.path IS NULL THEN NULL ELSE NEW.path || subpath(path, nlevel(OLD.path)) END
+  WHERE path <@ OLD.path
+    AND id <> NEW.id;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS external_controls_set_path ON external_controls;
+CREATE TRIGGER external_controls_set_path
+BEFORE INSERT OR UPDATE OF parent_id ON external_controls
+FOR EACH ROW
+EXECUTE FUNCTION external_controls_set_path();
+
+DROP TRIGGER IF EXISTS external_controls_move_subtree ON external_controls;
+CREATE TRIGGER external_controls_move_subtree
+AFTER UPDATE OF parent_id ON external_controls
+FOR EACH ROW
+WHEN (OLD.path IS DISTINCT FROM NEW.path)
+EXECUTE FUNCTION external_controls_move_subtree();
+
+-- A control and everything below it, parents before children
+CREATE OR REPLACE FUNCTION get_control_subtree(p_control_id uuid)
+RETURNS TABLE (
+  id uuid,
+  framework_id uuid,
+  ref_code text,
+  title text,
+  description text,
+  parent_id uuid,
+  hierarchy_level text,
+  is_group boolean,
+  display_order integer,
+  depth integer
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    ec.id,
+    ec.framework_id,
+    ec.ref_code,
+    ec.title,
+    ec.description,
+    ec.parent_id,
+    ec.hierarchy_level,
+    ec.is_group,
+    ec.display_order,
+    nlevel(ec.path) - nlevel(root.path) AS depth
+  FROM external_controls root
+  JOIN external_controls ec ON ec.path <@ root.path
+  WHERE root.id = p_control_id
+  ORDER BY ec.path;
+$$;
+
+-- Number of descendants (all depths) of every control in a framework
+CREATE OR REPLACE FUNCTION get_control_descendant_counts(p_framework_id uuid)
+RETURNS TABLE (
+  control_id uuid,
+  descendant_count bigint
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT c.id, COUNT(d.id)
+  FROM external_controls c
+  LEFT JOIN external_controls d ON d.path <@ c.path AND d.id <> c.id
+  WHERE c.framework_id = p_framework_id
+  GROUP BY c.id;
+$$;
+
+SELECT refresh_external_control_paths();
+
+GRANT EXECUTE ON FUNCTION get_control_subtree(uuid) TO authenticated;
+GRANT EXECUTE ON FUNCTION get_control_descendant_counts(uuid) TO authenticated;
+
+COMMENT ON FUNCTION refresh_external_control_paths(uuid[]) IS
+'Recompute external_controls.path from parent_id for the given frameworks (NULL = all). Returns rows changed.';
+COMMENT ON FUNCTION get_control_subtree(uuid) IS
+'A control and all of its descendants via path <@, ordered parents-first, with depth relative to the control.';
+COMMENT ON FUNCTION get_control_descendant_counts(uuid) IS
+'Descendant count (all depths) for every control in a framework via path <@.';
@@ -0,0 +1,92 @@
+-- Migration: Ancestor closure table for external_controls
+-- Purpose: Rolling counts or status up from leaf controls to their domain and
+-- clause groups used to need a recursive parent_id walk per query. The
+-- closure table holds one row per (ancestor, descendant) pair, including the
+-- depth-0 self pair, so any subtree aggregate is a single indexed join:
+--
+--   SELECT c.ancestor_id, SUM(ec.risk_count)
+--   FROM external_control_closure c
+--   JOIN external_controls ec ON ec.id = c.descendant_id
+--   WHERE c.framework_id = $1
+--   GROUP BY c.ancestor_id;
+--
+-- Rows are written by the Python hierarchy pipeline (control_tree.rebuild_closure)
+-- one framework at a time, after parent_id assignment.
+-- Date: 2025-12-03
+
+CREATE TABLE IF NOT EXISTS external_control_closure (
+  ancestor_id uuid NOT NULL REFERENCES external_controls(id) ON DELETE CASCADE,
+  descendant_id uuid NOT NULL REFERENCES external_controls(id) ON DELETE CASCADE,
+  depth integer NOT NULL CHECK (depth >= 0),
+  framework_id uuid NOT NULL REFERENCES frameworks(id) ON DELETE CASCADE,
+  PRIMARY KEY (ancestor_id, descendant_id)
+);
+
+-- Upward lookups (all ancestors of a control) and per-framework rebuilds
+CREATE INDEX IF NOT EXISTS idx_external_control_closure_descendant
+ON external_control_closure(descendant_id, depth);
+
+CREATE INDEX IF NOT EXISTS idx_external_control_closure_framework
+ON external_control_closure(framework_id, ancestor_id);
+
+ALTER TABLE external_control_closure ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow authenticated users to read external_control_closure"
+ON external_control_closure FOR SELECT
+TO authenticated
+USING (true);
+
+GRANT SELECT ON external_control_closure TO authenticated;
+
+-- Seed from parent_id; the Python pipeline keeps it current afterwards
+INSERT INTO external_control_closure (ancestor_id, descendant_id, depth, framework_id)
+WITH RECURSIVE closure AS (
+  SELECT id AS ancestor_id, id AS descendant_id, 0 AS depth, framework_id
+  FROM external_controls
+  UNION ALL
+  SELECT c.ancestor_id, ec.id, c.depth + 1, c.framework_id
+  FROM closure c
+  JOIN external_controls ec ON ec.parent_id = c.descendant_id
+  WHERE c.depth < 64
+)
+SELECT ancestor_id, descendant_id, MIN(depth), framework_id
+FROM closure
+GROUP BY ancestor_id, descendant_id, framework_id
+ON CONFLICT DO NOTHING;
+
+-- Subtree totals for every control in a framework (the control itself included)
+CREATE OR REPLACE FUNCTION get_control_rollups(p_framework_id uuid)
+RETURNS TABLE (
+  control_id uuid,
+  descendant_count bigint,
+  mapping_count bigint,
+  risk_count bigint,
+  threat_count bigint
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    c.ancestor_id,
+    COUNT(*) - 1,
+    COALESCE(SUM(m.mappings), 0),
+    COALESCE(SUM(ec.risk_count), 0),
+    COALESCE(SUM(ec.threat_count), 0)
+  FROM external_control_closure c
+  JOIN external_controls ec ON ec.id = c.descendant_id
+  LEFT JOIN (
+    SELECT fc.target_control_id, COUNT(*) AS mappings
+    FROM framework_crosswalks fc
+    WHERE fc.target_framework_id = p_framework_id
+    GROUP BY fc.target_control_id
+  ) m ON m.target_control_id = c.descendant_id
+  WHERE c.framework_id = p_framework_id
+  GROUP BY c.ancestor_id;
+$$;
+
+GRANT EXECUTE ON FUNCTION get_control_rollups(uuid) TO authenticated;
+
+COMMENT ON TABLE external_control_closure IS
+'Ancestor/descendant pairs of external_controls (depth 0 = self). Rebuilt per framework by the Python hierarchy pipeline.';
+COMMENT ON FUNCTION get_control_rollups(uuid) IS
+'Per-control subtree totals for a framework: descendants, crosswalk mappings, risk_count and threat_count, via external_control_closure.';
@@ -0,0 +1,30 @@
+-- Migration: Pre-order subtree intervals on external_controls
+-- Purpose: display_order only gave a flat order. lft/rgt number each control
+-- on entry and exit of a depth-first walk (children in natural ref_code
+-- order), so a control's descendants are exactly the controls of the same
+-- framework with lft between its lft and rgt:
+--
+--   SELECT d.*
+--   FROM external_controls x
+--   JOIN external_controls d
+--     ON d.framework_id = x.framework_id AND d.lft > x.lft AND d.lft < x.rgt
+--   WHERE x.id = $1
+--   ORDER BY d.lft;
+--
+-- display_order, lft and rgt are assigned together by
+-- control_tree.renumber (scripts/fix_all_framework_display_order.py).
+-- Date: 2025-12-03
+
+ALTER TABLE external_controls
+ADD COLUMN IF NOT EXISTS lft integer,
+ADD COLUMN IF NOT EXISTS rgt integer;
+
+CREATE INDEX IF NOT EXISTS idx_external_controls_framework_lft
+ON external_controls(framework_id, lft)
+INCLUDE (rgt);
+
+COMMENT ON COLUMN external_controls.lft IS
+'Pre-order entry number within the framework tree; descendants have lft in (lft, rgt). NULL until the framework is renumbered.';
+
+COMMENT ON COLUMN external_controls.rgt IS
+'Pre-order exit number within the framework tree; (rgt - lft - 1) / 2 is the descendant count.';
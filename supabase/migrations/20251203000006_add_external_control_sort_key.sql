@@ -0,0 +1,68 @@
+-- Migration: Persisted natural sort key on external_controls
+-- Purpose: Natural ref_code order (AC-2 before AC-10, 1.2 before 1.10) was
+-- only available through display_order, which goes stale whenever a control
+-- is inserted after the last reorder pass. sort_key encodes the ref_code so
+-- that plain byte comparison gives natural order, and the
+-- (framework_id, sort_key) index turns ordered framework listings into index
+-- scans:
+--
+--   SELECT ... FROM external_controls WHERE framework_id = $1 ORDER BY sort_key;
+--
+-- Encoding (must match control_tree.sort_key in scripts/control_tree.py):
+-- the lower-cased ref_code is split into digit and non-digit runs;
+--   digit run      -> 0x01, length without leading zeros (1 byte), the digits
+--   non-digit run  -> 0x02, the UTF-8 text
+-- so numbers sort before text and shorter numbers before longer ones.
+--
+-- A trigger keys new and renamed rows; bulk loads that bypass it (shadow
+-- tables) are keyed by control_tree.refresh_sort_keys.
+-- Date: 2025-12-03
+
+ALTER TABLE external_controls
+ADD COLUMN IF NOT EXISTS sort_key bytea;
+
+CREATE OR REPLACE FUNCTION external_control_sort_key(p_ref_code text)
+RETURNS bytea
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT COALESCE(string_agg(
+    CASE
+      WHEN t.run[1] ~ '^[0-9]' THEN
+        '\x01'::bytea
+        || set_byte('\x00'::bytea, 0, least(length(ltrim(t.run[1], '0')), 255))
+        || convert_to(ltrim(t.run[1], '0'), 'UTF8')
+      ELSE
+        '\x02'::bytea || convert_to(t.run[1], 'UTF8')
+    END,
+    ''::bytea ORDER BY t.ord), ''::bytea)
+  FROM regexp_matches(lower(p_ref_code), '[0-9]+|[^0-9]+', 'g') WITH ORDINALITY AS t(run, ord);
+$$;
+
+CREATE OR REPLACE FUNCTION external_controls_set_sort_key()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  NEW.sort_key := external_control_sort_key(NEW.ref_code);
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS external_controls_set_sort_key ON external_controls;
+CREATE TRIGGER external_controls_set_sort_key
+BEFORE INSERT OR UPDATE OF ref_code ON external_controls
+FOR EACH ROW
+EXECUTE FUNCTION external_controls_set_sort_key();
+
+UPDATE external_controls
+SET sort_key = external_control_sort_key(ref_code)
+WHERE sort_key IS DISTINCT FROM external_control_sort_key(ref_code);
+
+CREATE INDEX IF NOT EXISTS idx_external_controls_framework_sort_key
+ON external_controls(framework_id, sort_key);
+
+COMMENT ON COLUMN external_controls.sort_key IS
+'Byte-comparable natural sort key of ref_code (see external_control_sort_key). ORDER BY sort_key gives natural order.';
+COMMENT ON FUNCTION external_control_sort_key(text) IS
+'Natural sort key for a ref_code; identical to control_tree.sort_key in the Python pipeline.';
@@ -0,0 +1,90 @@
+-- Migration: Derived (transitive) crosswalks through the SCF pivot
+-- Purpose: framework_crosswalks only stores SCF -> framework edges
+-- (mapping_origin = 'SCF'). Direct ISO -> NIST 800-53 or HIPAA -> CSF
+-- mappings were assembled in the browser by fetching both sides and joining
+-- them. derived_crosswalks holds the composed two-hop mappings for a framework
+-- pair, materialized on demand by scripts/crosswalk_resolver.py, so a
+-- cross-framework lookup is one indexed read.
+--
+-- Per pair: mapping_strength is the best path's weakest link
+-- (exact > partial > related), confidence the best path's product of the two
+-- hop confidences, via_scf_count the number of SCF controls linking the two.
+-- derived_crosswalk_pairs records which pairs are materialized and the
+-- fingerprint of the crosswalks they were built from; a changed fingerprint
+-- means the pair is rebuilt on its next request.
+-- Date: 2025-12-03
+
+CREATE TABLE IF NOT EXISTS derived_crosswalks (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    source_framework_id UUID NOT NULL REFERENCES frameworks(id) ON DELETE CASCADE,
+    source_control_id UUID NOT NULL REFERENCES external_controls(id) ON DELETE CASCADE,
+    source_ref TEXT NOT NULL,
+    target_framework_id UUID NOT NULL REFERENCES frameworks(id) ON DELETE CASCADE,
+    target_control_id UUID NOT NULL REFERENCES external_controls(id) ON DELETE CASCADE,
+    target_ref TEXT NOT NULL,
+    mapping_origin TEXT NOT NULL DEFAULT 'derived' CHECK (mapping_origin = 'derived'),
+    mapping_strength TEXT NOT NULL,
+    confidence INTEGER CHECK (confidence >= 0 AND confidence <= 100),
+    via_scf_count INTEGER NOT NULL,
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    UNIQUE (source_framework_id, target_framework_id, source_control_id, target_control_id)
+);
+
+-- "What does this control map to in framework X"
+CREATE INDEX IF NOT EXISTS idx_derived_crosswalks_source_control
+ON derived_crosswalks (source_control_id, target_framework_id);
+
+CREATE TABLE IF NOT EXISTS derived_crosswalk_pairs (
+    source_framework_id UUID NOT NULL REFERENCES frameworks(id) ON DELETE CASCADE,
+    target_framework_id UUID NOT NULL REFERENCES frameworks(id) ON DELETE CASCADE,
+    fingerprint TEXT NOT NULL,                       -- Digest of the SCF crosswalks of both frameworks
+    crosswalk_count INTEGER NOT NULL,
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (source_framework_id, target_framework_id)
+);
+
+ALTER TABLE derived_crosswalks ENABLE ROW LEVEL SECURITY;
+ALTER TABLE derived_crosswalk_pairs ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow authenticated users to read derived_crosswalks"
+ON derived_crosswalks FOR SELECT
+TO authenticated
+USING (true);
+
+CREATE POLICY "Allow authenticated users to read derived_crosswalk_pairs"
+ON derived_crosswalk_pairs FOR SELECT
+TO authenticated
+USING (true);
+
+GRANT SELECT ON derived_crosswalks TO authenticated;
+GRANT SELECT ON derived_crosswalk_pairs TO authenticated;
+
+CREATE OR REPLACE FUNCTION get_derived_crosswalks(p_source_framework_id uuid, p_target_framework_id uuid)
+RETURNS TABLE (
+  source_control_id uuid,
+  source_ref text,
+  target_control_id uuid,
+  target_ref text,
+  mapping_strength text,
+  confidence integer,
+  via_scf_count integer
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT dc.source_control_id, dc.source_ref, dc.target_control_id, dc.target_ref,
+         dc.mapping_strength, dc.confidence, dc.via_scf_count
+  FROM derived_crosswalks dc
+  WHERE dc.source_framework_id = p_source_framework_id
+    AND dc.target_framework_id = p_target_framework_id
+  ORDER BY dc.source_ref, dc.target_ref;
+$$;
+
+GRANT EXECUTE ON FUNCTION get_derived_crosswalks(uuid, uuid) TO authenticated;
+
+COMMENT ON TABLE derived_crosswalks IS
+'Two-hop framework -> framework mappings composed through SCF (mapping_origin = derived). Materialized per pair by scripts/crosswalk_resolver.py.';
+COMMENT ON TABLE derived_crosswalk_pairs IS
+'Framework pairs materialized in derived_crosswalks, with the crosswalk fingerprint they were built from.';
+COMMENT ON FUNCTION get_derived_crosswalks(uuid, uuid) IS
+'Derived crosswalks for one ordered framework pair. Empty until the pair is materialized.';
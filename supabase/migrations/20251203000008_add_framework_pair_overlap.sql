@@ -0,0 +1,110 @@
+-- Migration: Materialized framework-pair overlap
+-- Purpose: The mapping explorer compared a primary framework against
+-- compareToFramework / additionalFrameworks by pulling tens of thousands of
+-- raw crosswalks into the browser. framework_pair_overlap holds the
+-- comparison per ordered pair (source -> target), computed through SCF by
+-- scripts/framework_overlap.py:
+--
+--   shared_scf_count          SCF controls both frameworks map to
+--   jaccard                   shared / SCF controls either maps to
+--   coverage                  shared / source_scf_count (how much of the
+--                             source's SCF footprint the target also covers)
+--   covered_target_controls   target controls reachable from the source via SCF
+--   domains                   {"<SCF domain>": {"shared": n, "source": n, "target": n}}
+--
+-- Only pairs sharing at least one SCF control are stored. The importers
+-- refresh it incrementally: framework_overlap_state keeps a fingerprint of
+-- each framework's crosswalks, and only pairs involving a framework whose
+-- fingerprint changed are recomputed.
+-- Date: 2025-12-03
+
+CREATE TABLE IF NOT EXISTS framework_pair_overlap (
+    source_framework_id UUID NOT NULL REFERENCES frameworks(id) ON DELETE CASCADE,
+    target_framework_id UUID NOT NULL REFERENCES frameworks(id) ON DELETE CASCADE,
+    shared_scf_count INTEGER NOT NULL,
+    source_scf_count INTEGER NOT NULL,
+    target_scf_count INTEGER NOT NULL,
+    jaccard DOUBLE PRECISION NOT NULL,
+    coverage DOUBLE PRECISION NOT NULL,
+    covered_target_controls INTEGER NOT NULL,
+    target_mapped_controls INTEGER NOT NULL,
+    domains JSONB NOT NULL DEFAULT '{}'::jsonb,
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (source_framework_id, target_framework_id)
+);
+
+-- Reverse lookups ("which frameworks cover this one")
+CREATE INDEX IF NOT EXISTS idx_framework_pair_overlap_target
+ON framework_pair_overlap (target_framework_id);
+
+CREATE TABLE IF NOT EXISTS framework_overlap_state (
+    framework_id UUID PRIMARY KEY REFERENCES frameworks(id) ON DELETE CASCADE,
+    fingerprint TEXT NOT NULL,                       -- Digest of the framework's SCF crosswalks
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE framework_pair_overlap ENABLE ROW LEVEL SECURITY;
+ALTER TABLE framework_overlap_state ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow authenticated users to read framework_pair_overlap"
+ON framework_pair_overlap FOR SELECT
+TO authenticated
+USING (true);
+
+CREATE POLICY "Allow authenticated users to read framework_overlap_state"
+ON framework_overlap_state FOR SELECT
+TO authenticated
+USING (true);
+
+GRANT SELECT ON framework_pair_overlap TO authenticated;
+GRANT SELECT ON framework_overlap_state TO authenticated;
+
+-- Overlap of one framework against the given frameworks (NULL = all)
+CREATE OR REPLACE FUNCTION get_framework_overlaps(p_framework_id uuid, p_target_framework_ids uuid[] DEFAULT NULL)
+RETURNS TABLE (
+  target_framework_id uuid,
+  target_code text,
+  target_name text,
+  target_version text,
+  shared_scf_count integer,
+  source_scf_count integer,
+  target_scf_count integer,
+  jaccard double precision,
+  coverage double precision,
+  reverse_coverage double precision,
+  covered_target_controls integer,
+  target_mapped_controls integer,
+  domains jsonb
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    o.target_framework_id,
+    f.code,
+    f.name,
+    f.version,
+    o.shared_scf_count,
+    o.source_scf_count,
+    o.target_scf_count,
+    o.jaccard,
+    o.coverage,
+    CASE WHEN o.target_scf_count > 0 THEN o.shared_scf_count::double precision / o.target_scf_count ELSE 0 END,
+    o.covered_target_controls,
+    o.target_mapped_controls,
+    o.domains
+  FROM framework_pair_overlap o
+  JOIN frameworks f ON f.id = o.target_framework_id
+  WHERE o.source_framework_id = p_framework_id
+    AND (p_target_framework_ids IS NULL OR o.target_framework_id = ANY(p_target_framework_ids))
+  ORDER BY o.jaccard DESC;
+$$;
+
+GRANT EXECUTE ON FUNCTION get_framework_overlaps(uuid, uuid[]) TO authenticated;
+
+COMMENT ON TABLE framework_pair_overlap IS
+'Precomputed SCF-based overlap per ordered framework pair (scripts/framework_overlap.py), refreshed after imports.';
+COMMENT ON TABLE framework_overlap_state IS
+'Per-framework crosswalk fingerprints from the last framework_pair_overlap refresh.';
+COMMENT ON FUNCTION get_framework_overlaps(uuid, uuid[]) IS
+'framework_pair_overlap rows for one source framework, with framework labels and reverse coverage.';